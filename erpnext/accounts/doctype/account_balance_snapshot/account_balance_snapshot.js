@@ -0,0 +1,8 @@
+// Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Account Balance Snapshot', {
+	// refresh: function(frm) {
+
+	// }
+});
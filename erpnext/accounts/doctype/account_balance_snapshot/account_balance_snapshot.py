@@ -0,0 +1,198 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import (
+	add_days,
+	add_months,
+	cint,
+	cstr,
+	flt,
+	get_first_day,
+	get_last_day,
+	getdate,
+)
+
+KEY_FIELDS = ("company", "account", "party_type", "party", "cost_center", "period_start_date",
+	"is_period_closing")
+AMOUNT_FIELDS = ("debit", "credit", "debit_in_account_currency", "credit_in_account_currency")
+
+
+class AccountBalanceSnapshot(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Account Balance Snapshot", ["account", "period_start_date"])
+	frappe.db.add_index("Account Balance Snapshot", ["party_type", "party"])
+
+def update_account_balance_snapshot(gl_entries, cancel=False):
+	"""Add the amounts of posted GL Entries to the snapshot, or remove them on cancellation"""
+	deltas = {}
+	for gle in gl_entries:
+		if cint(gle.get("is_cancelled")):
+			continue
+
+		amounts = deltas.setdefault(get_snapshot_key(gle), [0.0] * len(AMOUNT_FIELDS))
+		for i, fieldname in enumerate(AMOUNT_FIELDS):
+			amounts[i] += flt(gle.get(fieldname))
+
+	sign = -1 if cancel else 1
+	for key, amounts in deltas.items():
+		values = frappe._dict(zip(KEY_FIELDS, key))
+		values.update({fieldname: sign * amount for fieldname, amount in zip(AMOUNT_FIELDS, amounts)})
+		apply_snapshot_delta(values)
+
+def remove_voucher_from_account_balance_snapshot(voucher_type, voucher_no):
+	"""Remove the active GL Entries of a voucher, before they are cancelled or deleted"""
+	gl_entries = frappe.db.sql("""
+		select
+			company, account, party_type, party, cost_center, posting_date, voucher_type,
+			debit, credit, debit_in_account_currency, credit_in_account_currency
+		from `tabGL Entry`
+		where voucher_type = %s and voucher_no = %s and is_cancelled = 0
+	""", (voucher_type, voucher_no), as_dict=1)
+
+	update_account_balance_snapshot(gl_entries, cancel=True)
+
+def get_snapshot_key(gle):
+	return (
+		gle.get("company"),
+		gle.get("account"),
+		cstr(gle.get("party_type")),
+		cstr(gle.get("party")),
+		cstr(gle.get("cost_center")),
+		get_first_day(gle.get("posting_date")),
+		cint(gle.get("voucher_type") == "Period Closing Voucher"),
+	)
+
+def apply_snapshot_delta(values):
+	key_condition = " and ".join("{0} = %({0})s".format(fieldname) for fieldname in KEY_FIELDS)
+
+	name = frappe.db.sql("""
+		select name from `tabAccount Balance Snapshot`
+		where {0}
+		limit 1
+		for update
+	""".format(key_condition), values)
+
+	if name:
+		values.name = name[0][0]
+		frappe.db.sql("""
+			update `tabAccount Balance Snapshot`
+			set {0}
+			where name = %(name)s
+		""".format(", ".join("{0} = {0} + %({0})s".format(fieldname) for fieldname in AMOUNT_FIELDS)),
+			values)
+	else:
+		doc = frappe.new_doc("Account Balance Snapshot")
+		doc.update(values)
+		doc.db_insert()
+
+def rebuild_account_balance_snapshot(company=None):
+	"""Recreate the snapshot from GL Entries, e.g. after GL Entries were changed directly in the database"""
+	company_condition = "and company = %(company)s" if company else ""
+
+	if company:
+		frappe.db.delete("Account Balance Snapshot", {"company": company})
+	else:
+		frappe.db.delete("Account Balance Snapshot")
+
+	period_closing = "case when voucher_type = 'Period Closing Voucher' then 1 else 0 end"
+	balances = frappe.db.sql("""
+		select
+			company, account, party_type, party, cost_center,
+			extract(year from posting_date) as year, extract(month from posting_date) as month,
+			{period_closing} as is_period_closing,
+			sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
+		where is_cancelled = 0 {company_condition}
+		group by company, account, party_type, party, cost_center,
+			extract(year from posting_date), extract(month from posting_date), {period_closing}
+	""".format(period_closing=period_closing, company_condition=company_condition),
+		{"company": company}, as_dict=1)
+
+	for d in balances:
+		doc = frappe.new_doc("Account Balance Snapshot")
+		doc.update({
+			"company": d.company,
+			"account": d.account,
+			"party_type": cstr(d.party_type),
+			"party": cstr(d.party),
+			"cost_center": cstr(d.cost_center),
+			"period_start_date": getdate("{0:04d}-{1:02d}-01".format(cint(d.year), cint(d.month))),
+			"is_period_closing": cint(d.is_period_closing),
+		})
+		doc.update({fieldname: d.get(fieldname) for fieldname in AMOUNT_FIELDS})
+		doc.db_insert()
+
+def get_balance(conditions, balance_fields, from_date=None, to_date=None, exclude_period_closing=False):
+	"""
+		Balance of GL Entries matching `conditions` posted between `from_date` and `to_date`.
+
+		Whole months are read from the snapshot, only the days before the first whole month
+		and after the last one are summed from GL Entry.
+
+		:param conditions: list of sql conditions on `gle`, valid for both GL Entry and the snapshot
+		:param balance_fields: (debit fieldname, credit fieldname)
+	"""
+	from_date = getdate(from_date) if from_date else None
+	to_date = getdate(to_date) if to_date else None
+
+	snapshot_from = get_first_day(from_date) if from_date else None
+	if snapshot_from and snapshot_from < from_date:
+		snapshot_from = add_months(snapshot_from, 1)
+
+	snapshot_to = None
+	if to_date:
+		snapshot_to = get_first_day(to_date)
+		if to_date == get_last_day(to_date):
+			snapshot_to = add_months(snapshot_to, 1)
+
+	if snapshot_from and snapshot_to and snapshot_from >= snapshot_to:
+		return get_gl_balance(conditions, balance_fields, from_date, to_date, exclude_period_closing)
+
+	balance = get_snapshot_balance(conditions, balance_fields, snapshot_from, snapshot_to,
+		exclude_period_closing)
+
+	if from_date and snapshot_from > from_date:
+		balance += get_gl_balance(conditions, balance_fields, from_date, add_days(snapshot_from, -1),
+			exclude_period_closing)
+
+	if to_date and snapshot_to <= to_date:
+		balance += get_gl_balance(conditions, balance_fields, snapshot_to, to_date, exclude_period_closing)
+
+	return balance
+
+def get_snapshot_balance(conditions, balance_fields, from_period=None, to_period=None,
+	exclude_period_closing=False):
+	conditions = list(conditions)
+	if from_period:
+		conditions.append("gle.period_start_date >= %s" % frappe.db.escape(cstr(from_period)))
+	if to_period:
+		conditions.append("gle.period_start_date < %s" % frappe.db.escape(cstr(to_period)))
+	if exclude_period_closing:
+		conditions.append("gle.is_period_closing = 0")
+
+	return flt(frappe.db.sql("""
+		select sum({0}) - sum({1})
+		from `tabAccount Balance Snapshot` gle
+		where {2}
+	""".format(balance_fields[0], balance_fields[1], " and ".join(conditions) or "1=1"))[0][0])
+
+def get_gl_balance(conditions, balance_fields, from_date=None, to_date=None, exclude_period_closing=False):
+	conditions = list(conditions) + ["gle.is_cancelled = 0"]
+	if from_date:
+		conditions.append("gle.posting_date >= %s" % frappe.db.escape(cstr(from_date)))
+	if to_date:
+		conditions.append("gle.posting_date <= %s" % frappe.db.escape(cstr(to_date)))
+	if exclude_period_closing:
+		conditions.append("gle.voucher_type != 'Period Closing Voucher'")
+
+	return flt(frappe.db.sql("""
+		select sum({0}) - sum({1})
+		from `tabGL Entry` gle
+		where {2}
+	""".format(balance_fields[0], balance_fields[1], " and ".join(conditions)))[0][0])
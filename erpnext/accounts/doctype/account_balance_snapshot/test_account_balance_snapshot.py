@@ -0,0 +1,42 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+from frappe.utils import add_days, add_months, flt, nowdate
+
+from erpnext.accounts.doctype.account_balance_snapshot.account_balance_snapshot import (
+	rebuild_account_balance_snapshot,
+)
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.utils import get_balance_on
+
+
+class TestAccountBalanceSnapshot(unittest.TestCase):
+	def test_balance_from_snapshot(self):
+		account = "_Test Bank - _TC"
+		dates = [add_months(nowdate(), -2), add_days(nowdate(), -3), nowdate()]
+
+		jvs = [make_journal_entry(account, "_Test Cash - _TC", 100 * (i + 1), posting_date=date,
+			submit=True) for i, date in enumerate(dates)]
+
+		for date in dates + [None]:
+			self.assertEqual(get_balance_on(account, date), get_balance_from_gl(account, date))
+
+		jvs[0].cancel()
+		self.assertEqual(get_balance_on(account), get_balance_from_gl(account))
+
+		# rebuilding gives the same balances as incremental updates
+		rebuild_account_balance_snapshot("_Test Company")
+		self.assertEqual(get_balance_on(account), get_balance_from_gl(account))
+
+
+def get_balance_from_gl(account, date=None):
+	date_condition = "and posting_date <= %(date)s" if date else ""
+
+	return flt(frappe.db.sql("""
+		select sum(debit_in_account_currency) - sum(credit_in_account_currency)
+		from `tabGL Entry`
+		where account = %(account)s and is_cancelled = 0 {0}
+	""".format(date_condition), {"account": account, "date": date})[0][0])
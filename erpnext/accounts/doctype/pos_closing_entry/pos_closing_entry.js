@@ -52,7 +52,9 @@ frappe.ui.form.on('POS Closing Entry', {
 					30
 				);
 			});
+		}
 
+		if (frm.doc.docstatus == 1 && ['Failed', 'Queued'].includes(frm.doc.status)) {
 			frm.add_custom_button(__('Retry'), function () {
 				frm.call('retry', {}, () => {
 					frm.reload_doc();
@@ -8,6 +8,7 @@ from frappe.utils import flt, get_datetime
 
 from erpnext.accounts.doctype.pos_invoice_merge_log.pos_invoice_merge_log import (
 	consolidate_pos_invoices,
+	get_enqueued_shards,
 	unconsolidate_pos_invoices,
 )
 from erpnext.controllers.status_updater import StatusUpdater
@@ -64,6 +65,10 @@ class POSClosingEntry(StatusUpdater):
 
 	@frappe.whitelist()
 	def retry(self):
+		# a closing entry left Queued by killed shard jobs can be retried once none of them runs
+		if self.status == 'Queued' and get_enqueued_shards(self.name):
+			frappe.throw(_("POS Invoices of this closing entry are still being consolidated"))
+
 		consolidate_pos_invoices(closing_entry=self)
 
 	def update_opening_entry(self, for_cancel=False):
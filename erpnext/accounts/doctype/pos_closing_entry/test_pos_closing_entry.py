@@ -99,6 +99,48 @@ class TestPOSClosingEntry(unittest.TestCase):
 		pos_inv1.load_from_db()
 		self.assertEqual(pos_inv1.status, 'Paid')
 
+	def test_sharded_consolidation(self):
+		make_stock_entry(target="_Test Warehouse - _TC", qty=10, basic_rate=100)
+		test_user, pos_profile = init_user_and_profile()
+		opening_entry = create_opening_entry(pos_profile, test_user.name)
+
+		invoices = []
+		for i in range(10):
+			pos_inv = create_pos_invoice(customer="_Test Customer 2" if i % 2 else "_Test Customer",
+				rate=100, do_not_submit=1)
+			pos_inv.append('payments', {
+				'mode_of_payment': 'Cash', 'account': 'Cash - _TC', 'amount': 100
+			})
+			pos_inv.submit()
+			invoices.append(pos_inv)
+
+		pcv_doc = make_closing_entry_from_opening(opening_entry)
+		for d in pcv_doc.payment_reconciliation:
+			if d.mode_of_payment == 'Cash':
+				d.closing_amount = 1000
+
+		pcv_doc.submit()
+
+		self.assertEqual(frappe.db.get_value("POS Closing Entry", pcv_doc.name, "status"), "Submitted")
+		self.assertEqual(frappe.db.count("POS Invoice Merge Log", {"pos_closing_entry": pcv_doc.name, "docstatus": 1}), 2)
+
+		consolidated_invoices = set()
+		for pos_inv in invoices:
+			pos_inv.load_from_db()
+			self.assertEqual(pos_inv.status, "Consolidated")
+			consolidated_invoices.add(pos_inv.consolidated_invoice)
+
+		self.assertEqual(len(consolidated_invoices), 2)
+		shards = frappe.get_all("POS Closing Entry Shard", filters={"parent": pcv_doc.name},
+			fields=["customer", "status"], order_by="idx")
+		self.assertEqual([(d.customer, d.status) for d in shards],
+			[("_Test Customer", "Completed"), ("_Test Customer 2", "Completed")])
+
+		# a retry skips the shards already consolidated
+		pcv_doc.reload()
+		pcv_doc.retry()
+		self.assertEqual(frappe.db.count("POS Invoice Merge Log", {"pos_closing_entry": pcv_doc.name, "docstatus": 1}), 2)
+
 
 def init_user_and_profile(**args):
 	user = 'test@example.com'
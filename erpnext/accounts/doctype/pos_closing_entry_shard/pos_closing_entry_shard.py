@@ -0,0 +1,9 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+
+from frappe.model.document import Document
+
+
+class POSClosingEntryShard(Document):
+	pass
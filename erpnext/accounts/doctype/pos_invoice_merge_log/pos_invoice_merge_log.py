@@ -9,10 +9,13 @@ from frappe import _
 from frappe.core.page.background_jobs.background_jobs import get_info
 from frappe.model.document import Document
 from frappe.model.mapper import map_child_doc, map_doc
-from frappe.utils import flt, getdate, nowdate
+from frappe.utils import cstr, flt, getdate, nowdate
 from frappe.utils.background_jobs import enqueue
 from frappe.utils.scheduler import is_scheduler_inactive
 
+# POS Invoices read per query while validating and merging
+POS_INVOICE_CHUNK_SIZE = 500
+
 
 class POSInvoiceMergeLog(Document):
 	def validate(self):
@@ -28,9 +31,9 @@ class POSInvoiceMergeLog(Document):
 				frappe.throw(_("Row #{}: POS Invoice {} is not against customer {}").format(d.idx, d.pos_invoice, self.customer))
 
 	def validate_pos_invoice_status(self):
+		invoice_details = get_pos_invoice_details([d.pos_invoice for d in self.pos_invoices])
 		for d in self.pos_invoices:
-			status, docstatus, is_return, return_against = frappe.db.get_value(
-				'POS Invoice', d.pos_invoice, ['status', 'docstatus', 'is_return', 'return_against'])
+			status, docstatus, is_return, return_against = invoice_details.get(d.pos_invoice, (None, 0, 0, None))
 
 			bold_pos_invoice = frappe.bold(d.pos_invoice)
 			bold_status = frappe.bold(status)
@@ -38,7 +41,7 @@ class POSInvoiceMergeLog(Document):
 				frappe.throw(_("Row #{}: POS Invoice {} is not submitted yet").format(d.idx, bold_pos_invoice))
 			if status == "Consolidated":
 				frappe.throw(_("Row #{}: POS Invoice {} has been {}").format(d.idx, bold_pos_invoice, bold_status))
-			if is_return and return_against and return_against not in [d.pos_invoice for d in self.pos_invoices]:
+			if is_return and return_against and return_against not in invoice_details:
 				bold_return_against = frappe.bold(return_against)
 				return_against_status = frappe.db.get_value('POS Invoice', return_against, "status")
 				if return_against_status != "Consolidated":
@@ -53,26 +56,25 @@ class POSInvoiceMergeLog(Document):
 					frappe.throw(msg)
 
 	def on_submit(self):
-		pos_invoice_docs = [frappe.get_doc("POS Invoice", d.pos_invoice) for d in self.pos_invoices]
+		pos_invoices = [d.pos_invoice for d in self.pos_invoices]
+		invoice_details = get_pos_invoice_details(pos_invoices)
 
-		returns = [d for d in pos_invoice_docs if d.get('is_return') == 1]
-		sales = [d for d in pos_invoice_docs if d.get('is_return') == 0]
+		returns = [name for name in pos_invoices if invoice_details[name][2] == 1]
+		sales = [name for name in pos_invoices if invoice_details[name][2] == 0]
 
 		sales_invoice, credit_note = "", ""
 		if returns:
-			credit_note = self.process_merging_into_credit_note(returns)
+			credit_note = self.process_merging_into_credit_note(iter_pos_invoice_docs(returns))
 
 		if sales:
-			sales_invoice = self.process_merging_into_sales_invoice(sales)
+			sales_invoice = self.process_merging_into_sales_invoice(iter_pos_invoice_docs(sales))
 
 		self.save() # save consolidated_sales_invoice & consolidated_credit_note ref in merge log
 
-		self.update_pos_invoices(pos_invoice_docs, sales_invoice, credit_note)
+		self.update_pos_invoices(pos_invoices, sales_invoice, credit_note)
 
 	def on_cancel(self):
-		pos_invoice_docs = [frappe.get_doc("POS Invoice", d.pos_invoice) for d in self.pos_invoices]
-
-		self.update_pos_invoices(pos_invoice_docs)
+		self.update_pos_invoices([d.pos_invoice for d in self.pos_invoices])
 		self.cancel_linked_invoices()
 
 	def process_merging_into_sales_invoice(self, data):
@@ -109,16 +111,20 @@ class POSInvoiceMergeLog(Document):
 		return credit_note.name
 
 	def merge_pos_invoice_into(self, invoice, data):
-		items, payments, taxes = [], [], []
+		"""
+			Merge the rows of the POS Invoices in `data`, an iterable of documents, into `invoice`.
 
-		loyalty_amount_sum, loyalty_points_sum = 0, 0
+			Rows are consolidated through dicts keyed by item, uom, net rate and warehouse for items,
+			account and cost center for taxes and account and mode of payment for payments.
+		"""
+		items, payments, taxes = [], [], []
+		items_by_key, taxes_by_key, payments_by_key = {}, {}, {}
 
 		rounding_adjustment, base_rounding_adjustment = 0, 0
 		rounded_total, base_rounded_total = 0, 0
 
 		loyalty_amount_sum, loyalty_points_sum, idx = 0, 0, 1
 
-
 		for doc in data:
 			map_doc(doc, invoice, table_map={ "doctype": invoice.doctype })
 
@@ -129,18 +135,15 @@ class POSInvoiceMergeLog(Document):
 				loyalty_amount_sum += doc.loyalty_amount
 
 			for item in doc.get('items'):
-				found = False
-				for i in items:
-					if (i.item_code == item.item_code and not i.serial_no and not i.batch_no and
-						i.uom == item.uom and i.net_rate == item.net_rate and i.warehouse == item.warehouse):
-						found = True
-						i.qty = i.qty + item.qty
-						i.amount = i.amount + item.net_amount
-						i.net_amount = i.amount
-						i.base_amount = i.base_amount + item.base_net_amount
-						i.base_net_amount = i.base_amount
-
-				if not found:
+				key = (item.item_code, item.uom, item.net_rate, item.warehouse)
+				i = items_by_key.get(key)
+				if i:
+					i.qty = i.qty + item.qty
+					i.amount = i.amount + item.net_amount
+					i.net_amount = i.amount
+					i.base_amount = i.base_amount + item.base_net_amount
+					i.base_net_amount = i.base_amount
+				else:
 					item.rate = item.net_rate
 					item.amount = item.net_amount
 					item.base_amount = item.base_net_amount
@@ -148,15 +151,17 @@ class POSInvoiceMergeLog(Document):
 					si_item = map_child_doc(item, invoice, {"doctype": "Sales Invoice Item"})
 					items.append(si_item)
 
+					# rows with serial nos or batches are never merged into
+					if not si_item.serial_no and not si_item.batch_no:
+						items_by_key[key] = si_item
+
 			for tax in doc.get('taxes'):
-				found = False
-				for t in taxes:
-					if t.account_head == tax.account_head and t.cost_center == tax.cost_center:
-						t.tax_amount = flt(t.tax_amount) + flt(tax.tax_amount_after_discount_amount)
-						t.base_tax_amount = flt(t.base_tax_amount) + flt(tax.base_tax_amount_after_discount_amount)
-						update_item_wise_tax_detail(t, tax)
-						found = True
-				if not found:
+				t = taxes_by_key.get((tax.account_head, tax.cost_center))
+				if t:
+					t.tax_amount = flt(t.tax_amount) + flt(tax.tax_amount_after_discount_amount)
+					t.base_tax_amount = flt(t.base_tax_amount) + flt(tax.base_tax_amount_after_discount_amount)
+					update_item_wise_tax_detail(t, tax)
+				else:
 					tax.charge_type = 'Actual'
 					tax.idx = idx
 					idx += 1
@@ -165,23 +170,22 @@ class POSInvoiceMergeLog(Document):
 					tax.base_tax_amount = tax.base_tax_amount_after_discount_amount
 					tax.item_wise_tax_detail = tax.item_wise_tax_detail
 					taxes.append(tax)
+					taxes_by_key[(tax.account_head, tax.cost_center)] = tax
 
 			for payment in doc.get('payments'):
-				found = False
-				for pay in payments:
-					if pay.account == payment.account and pay.mode_of_payment == payment.mode_of_payment:
-						pay.amount = flt(pay.amount) + flt(payment.amount)
-						pay.base_amount = flt(pay.base_amount) + flt(payment.base_amount)
-						found = True
-				if not found:
+				pay = payments_by_key.get((payment.account, payment.mode_of_payment))
+				if pay:
+					pay.amount = flt(pay.amount) + flt(payment.amount)
+					pay.base_amount = flt(pay.base_amount) + flt(payment.base_amount)
+				else:
 					payments.append(payment)
+					payments_by_key[(payment.account, payment.mode_of_payment)] = payment
 
 			rounding_adjustment += doc.rounding_adjustment
 			rounded_total += doc.rounded_total
 			base_rounding_adjustment += doc.base_rounding_adjustment
 			base_rounded_total += doc.base_rounded_total
 
-
 		if loyalty_points_sum:
 			invoice.redeem_loyalty_points = 1
 			invoice.loyalty_points = loyalty_points_sum
@@ -213,9 +217,8 @@ class POSInvoiceMergeLog(Document):
 
 		return sales_invoice
 
-	def update_pos_invoices(self, invoice_docs, sales_invoice='', credit_note=''):
-		for doc in invoice_docs:
-			doc.load_from_db()
+	def update_pos_invoices(self, pos_invoices, sales_invoice='', credit_note=''):
+		for doc in iter_pos_invoice_docs(pos_invoices):
 			doc.update({ 'consolidated_invoice': None if self.docstatus==2 else (credit_note if doc.is_return else sales_invoice) })
 			doc.set_status(update=True)
 			doc.save()
@@ -247,6 +250,22 @@ def update_item_wise_tax_detail(consolidate_tax_row, tax_row):
 
 	consolidate_tax_row.item_wise_tax_detail = json.dumps(consolidated_tax_detail, separators=(',', ':'))
 
+def get_pos_invoice_details(pos_invoices):
+	"""Returns {pos_invoice: (status, docstatus, is_return, return_against)}, read in chunks"""
+	invoice_details = {}
+	for i in range(0, len(pos_invoices), POS_INVOICE_CHUNK_SIZE):
+		for d in frappe.get_all('POS Invoice',
+			filters={'name': ('in', pos_invoices[i:i + POS_INVOICE_CHUNK_SIZE])},
+			fields=['name', 'status', 'docstatus', 'is_return', 'return_against']):
+			invoice_details[d.name] = (d.status, d.docstatus, d.is_return, d.return_against)
+
+	return invoice_details
+
+def iter_pos_invoice_docs(pos_invoices):
+	"""Yields the POS Invoices one by one, so that a large closing never holds all of them in memory"""
+	for name in pos_invoices:
+		yield frappe.get_doc("POS Invoice", name)
+
 def get_all_unconsolidated_invoices():
 	filters = {
 		'consolidated_invoice': [ 'in', [ '', None ]],
@@ -273,11 +292,16 @@ def consolidate_pos_invoices(pos_invoices=None, closing_entry=None):
 	if frappe.flags.in_test and not invoices:
 		invoices = get_all_unconsolidated_invoices()
 
+	if closing_entry:
+		# customers consolidated by an earlier, partly failed run are not processed again
+		invoice_details = get_pos_invoice_details([d.get('pos_invoice') for d in invoices])
+		invoices = [d for d in invoices
+			if invoice_details.get(d.get('pos_invoice'), [None])[0] != 'Consolidated']
+
 	invoice_by_customer = get_invoice_customer_map(invoices)
 
 	if len(invoices) >= 10 and closing_entry:
-		closing_entry.set_status(update=True, status='Queued')
-		enqueue_job(create_merge_logs, invoice_by_customer=invoice_by_customer, closing_entry=closing_entry)
+		enqueue_merge_log_shards(invoice_by_customer, closing_entry)
 	else:
 		create_merge_logs(invoice_by_customer, closing_entry)
 
@@ -297,14 +321,7 @@ def unconsolidate_pos_invoices(closing_entry):
 def create_merge_logs(invoice_by_customer, closing_entry=None):
 	try:
 		for customer, invoices in invoice_by_customer.items():
-			merge_log = frappe.new_doc('POS Invoice Merge Log')
-			merge_log.posting_date = getdate(closing_entry.get('posting_date')) if closing_entry else nowdate()
-			merge_log.customer = customer
-			merge_log.pos_closing_entry = closing_entry.get('name') if closing_entry else None
-
-			merge_log.set('pos_invoices', invoices)
-			merge_log.save(ignore_permissions=True)
-			merge_log.submit()
+			create_merge_log(customer, invoices, closing_entry)
 
 		if closing_entry:
 			closing_entry.set_status(update=True, status='Submitted')
@@ -325,6 +342,116 @@ def create_merge_logs(invoice_by_customer, closing_entry=None):
 		frappe.db.commit()
 		frappe.publish_realtime('closing_process_complete', {'user': frappe.session.user})
 
+def create_merge_log(customer, invoices, closing_entry=None):
+	merge_log = frappe.new_doc('POS Invoice Merge Log')
+	merge_log.posting_date = getdate(closing_entry.get('posting_date')) if closing_entry else nowdate()
+	merge_log.customer = customer
+	merge_log.pos_closing_entry = closing_entry.get('name') if closing_entry else None
+
+	merge_log.set('pos_invoices', invoices)
+	merge_log.save(ignore_permissions=True)
+	merge_log.submit()
+
+def enqueue_merge_log_shards(invoice_by_customer, closing_entry):
+	"""
+		Consolidate each customer of the closing entry, a shard, in its own job. The shards run in
+		parallel on the long queue and commit independently, so a retry only processes the failed ones.
+
+		The state of every shard is kept in the Consolidation Shards table of the closing entry,
+		the closing entry status is derived from it once no shard is queued.
+	"""
+	check_scheduler_status()
+
+	if job_already_enqueued(closing_entry.name) or get_enqueued_shards(closing_entry.name):
+		return
+
+	closing_entry.set_status(update=True, status='Queued')
+	closing_entry.db_set('error_message', '')
+
+	frappe.db.delete('POS Closing Entry Shard', {'parent': closing_entry.name, 'parenttype': 'POS Closing Entry'})
+	for idx, customer in enumerate(invoice_by_customer, 1):
+		frappe.get_doc({
+			'doctype': 'POS Closing Entry Shard',
+			'parent': closing_entry.name,
+			'parenttype': 'POS Closing Entry',
+			'parentfield': 'consolidation_shards',
+			'idx': idx,
+			'customer': customer,
+			'status': 'Queued'
+		}).db_insert()
+
+	for customer, invoices in invoice_by_customer.items():
+		enqueue(
+			create_merge_log_shard,
+			queue="long",
+			timeout=10000,
+			event="processing_merge_logs",
+			job_name=get_shard_job_name(closing_entry.name, customer),
+			enqueue_after_commit=True,
+			now=frappe.conf.developer_mode or frappe.flags.in_test,
+			customer=customer,
+			invoices=invoices,
+			closing_entry=closing_entry.name
+		)
+
+	frappe.msgprint(_('POS Invoices will be consolidated in a background process'), alert=1)
+
+def create_merge_log_shard(customer, invoices, closing_entry):
+	"""Background job: merge the POS Invoices of one customer, the last shard to finish updates the closing entry"""
+	closing_entry = frappe.get_doc('POS Closing Entry', closing_entry)
+	shard_filters = {'parent': closing_entry.name, 'parenttype': 'POS Closing Entry', 'customer': customer}
+
+	try:
+		create_merge_log(customer, invoices, closing_entry)
+		frappe.db.set_value('POS Closing Entry Shard', shard_filters, 'status', 'Completed')
+		frappe.db.commit()
+
+	except Exception as e:
+		frappe.db.rollback()
+		message_log = frappe.message_log.pop() if frappe.message_log else str(e)
+		frappe.db.set_value('POS Closing Entry Shard', shard_filters, {
+			'status': 'Failed',
+			'error_message': safe_load_json(message_log)
+		})
+		frappe.log_error(frappe.get_traceback(), _("POS Invoice consolidation failed for {0}").format(customer))
+		frappe.db.commit()
+
+	finish_merge_log_shards(closing_entry)
+
+def finish_merge_log_shards(closing_entry):
+	"""Set the closing entry status from its shards, once none of them is queued"""
+	# the shards finishing last wait here, only one of them sees the closing entry as Queued
+	status = frappe.db.sql("select status from `tabPOS Closing Entry` where name = %s for update",
+		closing_entry.name)[0][0]
+
+	shards = frappe.get_all('POS Closing Entry Shard',
+		filters={'parent': closing_entry.name, 'parenttype': 'POS Closing Entry'},
+		fields=['customer', 'status', 'error_message'], order_by='idx')
+
+	if status != 'Queued' or any(d.status == 'Queued' for d in shards):
+		frappe.db.commit()
+		return
+
+	failed = [d for d in shards if d.status == 'Failed']
+	if failed:
+		closing_entry.set_status(update=True, status='Failed')
+		closing_entry.db_set('error_message', "<br>".join("{0}: {1}".format(frappe.bold(d.customer), d.error_message)
+			for d in failed))
+	else:
+		closing_entry.set_status(update=True, status='Submitted')
+		closing_entry.db_set('error_message', '')
+		closing_entry.update_opening_entry()
+
+	frappe.db.commit()
+	frappe.publish_realtime('closing_process_complete', {'user': frappe.session.user})
+
+def get_shard_job_name(closing_entry, customer):
+	return "{0}::{1}".format(closing_entry, customer)
+
+def get_enqueued_shards(closing_entry):
+	prefix = get_shard_job_name(closing_entry, "")
+	return [d.get("job_name") for d in get_info() if cstr(d.get("job_name")).startswith(prefix)]
+
 def cancel_merge_logs(merge_logs, closing_entry=None):
 	try:
 		for log in merge_logs:
@@ -368,12 +495,7 @@ def enqueue_job(job, **kwargs):
 			now=frappe.conf.developer_mode or frappe.flags.in_test
 		)
 
-		if job == create_merge_logs:
-			msg = _('POS Invoices will be consolidated in a background process')
-		else:
-			msg = _('POS Invoices will be unconsolidated in a background process')
-
-		frappe.msgprint(msg, alert=1)
+		frappe.msgprint(_('POS Invoices will be unconsolidated in a background process'), alert=1)
 
 def check_scheduler_status():
 	if is_scheduler_inactive() and not frappe.flags.in_test:
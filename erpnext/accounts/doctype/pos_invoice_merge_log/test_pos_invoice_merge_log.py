@@ -377,4 +377,43 @@ class TestPOSInvoiceMergeLog(unittest.TestCase):
 		finally:
 			frappe.set_user("Administrator")
 			frappe.db.sql("delete from `tabPOS Profile`")
-			frappe.db.sql("delete from `tabPOS Invoice`")
\ No newline at end of file
+			frappe.db.sql("delete from `tabPOS Invoice`")
+
+	def test_consolidation_merges_matching_rows(self):
+		frappe.db.sql("delete from `tabPOS Invoice`")
+
+		try:
+			make_stock_entry(
+				to_warehouse="_Test Warehouse - _TC",
+				item_code="_Test Item",
+				rate=100,
+				qty=10,
+			)
+
+			init_user_and_profile()
+
+			for rate in (300, 300, 250):
+				inv = create_pos_invoice(qty=1, rate=rate, do_not_save=True)
+				inv.append('payments', {
+					'mode_of_payment': 'Cash', 'account': 'Cash - _TC', 'amount': rate
+				})
+				inv.insert()
+				inv.submit()
+
+			consolidate_pos_invoices()
+
+			inv.load_from_db()
+			consolidated_invoice = frappe.get_doc('Sales Invoice', inv.consolidated_invoice)
+
+			self.assertEqual(
+				sorted([(d.item_code, d.net_rate, d.qty) for d in consolidated_invoice.items]),
+				[("_Test Item", 250, 1), ("_Test Item", 300, 2)])
+
+			cash_payments = [d for d in consolidated_invoice.payments if d.mode_of_payment == 'Cash']
+			self.assertEqual(len(cash_payments), 1)
+			self.assertEqual(cash_payments[0].amount, 850)
+
+		finally:
+			frappe.set_user("Administrator")
+			frappe.db.sql("delete from `tabPOS Profile`")
+			frappe.db.sql("delete from `tabPOS Invoice`")
@@ -3,7 +3,6 @@
 # For license information, please see license.txt
 
 
-import copy
 import json
 import re
 
@@ -153,6 +152,14 @@ class PricingRule(Document):
 		if self.condition and ("=" in self.condition) and re.match(r'[\w\.:_]+\s*={1}\s*[\w\.@\'"]+', self.condition):
 			frappe.throw(_("Invalid condition expression"))
 
+	def on_update(self):
+		from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index
+		clear_pricing_rule_index()
+
+	def on_trash(self):
+		from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index
+		clear_pricing_rule_index()
+
 #--------------------------------------------------------------------------------
 
 @frappe.whitelist()
@@ -177,6 +184,11 @@ def apply_pricing_rule(args, doc=None):
 		}
 	"""
 
+	from erpnext.accounts.doctype.pricing_rule.utils import (
+		end_pricing_rule_batch,
+		start_pricing_rule_batch,
+	)
+
 	if isinstance(args, str):
 		args = json.loads(args)
 
@@ -202,14 +214,27 @@ def apply_pricing_rule(args, doc=None):
 	for item_code, val in query_items:
 		serialized_items.setdefault(item_code, val)
 
-	for item in item_list:
-		args_copy = copy.deepcopy(args)
-		args_copy.update(item)
-		data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc)
-		out.append(data)
+	# party details and the parent document are the same for every row, resolve them once
+	set_party_details_for_pricing_rule(args)
+
+	if isinstance(doc, str):
+		doc = json.loads(doc)
 
-		if serialized_items.get(item.get('item_code')) and not item.get("serial_no") and set_serial_nos_based_on_fifo and not args.get('is_return'):
-			out[0].update(get_serial_no_for_item(args_copy))
+	if doc:
+		doc = frappe.get_doc(doc)
+
+	start_pricing_rule_batch()
+	try:
+		for item in item_list:
+			args_copy = args.copy()
+			args_copy.update(item)
+			data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc)
+			out.append(data)
+
+			if serialized_items.get(item.get('item_code')) and not item.get("serial_no") and set_serial_nos_based_on_fifo and not args.get('is_return'):
+				out[0].update(get_serial_no_for_item(args_copy))
+	finally:
+		end_pricing_rule_batch()
 
 	return out
 
@@ -330,6 +355,9 @@ def update_args_for_pricing_rule(args):
 		if not args.item_group:
 			frappe.throw(_("Item Group not mentioned in item master for item {0}").format(args.item_code))
 
+	set_party_details_for_pricing_rule(args)
+
+def set_party_details_for_pricing_rule(args):
 	if args.transaction_type=="selling":
 		if args.customer and not (args.customer_group and args.territory):
 
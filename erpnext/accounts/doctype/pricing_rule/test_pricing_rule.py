@@ -4,9 +4,17 @@
 
 
 import unittest
+from unittest.mock import patch
 
 import frappe
 
+from erpnext.accounts.doctype.pricing_rule import utils as pricing_rule_utils
+from erpnext.accounts.doctype.pricing_rule.pricing_rule import apply_pricing_rule
+from erpnext.accounts.doctype.pricing_rule.utils import (
+	PRICING_RULE_INDEX,
+	clear_pricing_rule_index,
+	get_pricing_rules,
+)
 from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
 from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order
 from erpnext.stock.doctype.item.test_item import make_item
@@ -97,6 +105,7 @@ class TestPricingRule(unittest.TestCase):
 		self.assertEqual(details.get("discount_percentage"), 5)
 
 		frappe.db.sql("update `tabPricing Rule` set priority=NULL where campaign='_Test Campaign'")
+		clear_pricing_rule_index()
 		from erpnext.accounts.doctype.pricing_rule.utils import MultiplePricingRuleConflict
 		self.assertRaises(MultiplePricingRuleConflict, get_item_details, args)
 
@@ -688,6 +697,82 @@ class TestPricingRule(unittest.TestCase):
 		frappe.delete_doc_if_exists("Pricing Rule", "_Test Pricing Rule with Min Qty - 1")
 		frappe.delete_doc_if_exists("Pricing Rule", "_Test Pricing Rule with Min Qty - 2")
 
+	def test_pricing_rule_index(self):
+		rule = make_pricing_rule(discount_percentage=10, selling=1, title="_Test Pricing Rule Index")
+		frappe.get_doc({
+			"doctype": "Pricing Rule",
+			"title": "_Test Pricing Rule Index for Item Group",
+			"apply_on": "Item Group",
+			"item_groups": [{"item_group": "All Item Groups"}],
+			"company": "_Test Company",
+			"selling": 1,
+			"rate_or_discount": "Discount Percentage",
+			"discount_percentage": 20
+		}).insert()
+
+		args = frappe._dict({
+			"item_code": "_Test Item",
+			"item_group": "_Test Item Group",
+			"company": "_Test Company",
+			"transaction_type": "selling",
+			"customer": "_Test Customer",
+			"qty": 1,
+			"stock_qty": 1
+		})
+
+		rules = get_pricing_rules(args.copy())
+		index = PRICING_RULE_INDEX.get(frappe.local.site)
+		self.assertEqual([d.name for d in rules], [rule.name])
+
+		# unchanged rules are read from the same index
+		get_pricing_rules(args.copy())
+		self.assertIs(PRICING_RULE_INDEX.get(frappe.local.site), index)
+
+		rule.disable = 1
+		rule.save()
+
+		rules = get_pricing_rules(args.copy())
+		self.assertIsNot(PRICING_RULE_INDEX.get(frappe.local.site), index)
+		self.assertEqual([d.discount_percentage for d in rules], [20])
+
+		args.transaction_type = "buying"
+		self.assertFalse(get_pricing_rules(args.copy()))
+
+	def test_apply_pricing_rule_for_document(self):
+		make_pricing_rule(discount_percentage=17.5, selling=1, title="_Test Cumulative Batch Pricing Rule")
+		frappe.db.set_value("Pricing Rule", "_Test Cumulative Batch Pricing Rule", {
+			"is_cumulative": 1,
+			"valid_from": frappe.utils.nowdate(),
+			"valid_upto": frappe.utils.nowdate()
+		})
+
+		args = {
+			"items": [{
+				"doctype": "Sales Invoice Item",
+				"name": "row-{0}".format(i),
+				"item_code": "_Test Item",
+				"parenttype": "Sales Invoice",
+				"qty": 1,
+				"stock_qty": 1,
+				"price_list_rate": 100
+			} for i in range(3)],
+			"customer": "_Test Customer",
+			"company": "_Test Company",
+			"currency": "USD",
+			"price_list": "_Test Price List",
+			"transaction_date": frappe.utils.nowdate(),
+			"transaction_type": "selling",
+			"doctype": "Sales Invoice"
+		}
+
+		with patch.object(pricing_rule_utils, "_get_qty_amount_data_for_cumulative",
+			wraps=pricing_rule_utils._get_qty_amount_data_for_cumulative) as cumulative_data:
+			out = apply_pricing_rule(args)
+
+		self.assertEqual(cumulative_data.call_count, 1)
+		self.assertEqual([d.discount_percentage for d in out], [17.5] * 3)
+		self.assertFalse(frappe.flags.pricing_rule_batch)
+
 
 test_dependencies = ["Campaign"]
 
@@ -753,6 +838,7 @@ def delete_existing_pricing_rules():
 
 		frappe.db.sql("delete from `tab{0}`".format(doctype))
 
+	clear_pricing_rule_index()
 
 def make_item_price(item, price_list_name, item_price):
 	frappe.get_doc({
@@ -9,7 +9,7 @@ import json
 
 import frappe
 from frappe import _, bold
-from frappe.utils import cint, flt, fmt_money, get_link_to_form, getdate, today
+from frappe.utils import cint, cstr, flt, fmt_money, get_link_to_form, getdate, today
 
 from erpnext.setup.doctype.item_group.item_group import get_child_item_groups
 from erpnext.stock.doctype.warehouse.warehouse import get_child_warehouses
@@ -24,15 +24,18 @@ apply_on_table = {
 	'Brand': 'brands'
 }
 
+# active Pricing Rules indexed per site, see `get_pricing_rule_index`
+PRICING_RULE_INDEX = {}
+
 def get_pricing_rules(args, doc=None):
 	pricing_rules = []
-	values =  {}
 
-	if not frappe.db.exists('Pricing Rule', {'disable': 0, args.transaction_type: 1}):
+	index = get_pricing_rule_index(args.transaction_type)
+	if not index:
 		return
 
 	for apply_on in ['Item Code', 'Item Group', 'Brand']:
-		pricing_rules.extend(_get_pricing_rules(apply_on, args, values))
+		pricing_rules.extend(_get_pricing_rules(apply_on, args, index))
 		if pricing_rules and not apply_multiple_pricing_rules(pricing_rules):
 			break
 
@@ -92,59 +95,136 @@ def filter_pricing_rule_based_on_condition(pricing_rules, doc=None):
 
 	return filtered_pricing_rules
 
-def _get_pricing_rules(apply_on, args, values):
+def get_pricing_rule_index(transaction_type):
+	"""
+		Returns the in-process index of active Pricing Rules, None if no rule applies to `transaction_type`.
+
+		The index is rebuilt when the count or the last modified time of Pricing Rules changes,
+		so rules saved in other processes are picked up as well. Within a document batch
+		(see `pricing_rule_batch`) this is checked only once.
+	"""
+	batch = frappe.flags.pricing_rule_batch
+	if batch and transaction_type in batch.index:
+		return batch.index[transaction_type]
+
+	total, modified, applicable = frappe.db.sql("""
+		select count(*), max(modified), sum(disable = 0 and {0} = 1)
+		from `tabPricing Rule`
+	""".format(transaction_type))[0]
+
+	index = None
+	if cint(applicable):
+		index = PRICING_RULE_INDEX.get(frappe.local.site)
+		if not index or index.stamp != (total, modified):
+			index = build_pricing_rule_index()
+			index.stamp = (total, modified)
+			PRICING_RULE_INDEX[frappe.local.site] = index
+
+	if batch:
+		batch.index[transaction_type] = index
+
+	return index
+
+def build_pricing_rule_index():
+	"""Map every apply on value (and other item value) to the active Pricing Rule rows for it"""
+	index = frappe._dict(rules={}, other={})
+
+	for apply_on in apply_on_table:
+		apply_on_field = frappe.scrub(apply_on)
+		other_field = "other_{0}".format(apply_on_field)
+		rules = index.rules.setdefault(apply_on, {})
+		other_rules = index.other.setdefault(apply_on, {})
+
+		for row in frappe.db.sql("""select `tabPricing Rule`.*,
+				{child_doc}.{apply_on_field}, {child_doc}.uom
+			from `tabPricing Rule`, {child_doc}
+			where {child_doc}.parent = `tabPricing Rule`.name
+				and `tabPricing Rule`.disable = 0""".format(
+				child_doc='`tabPricing Rule {0}`'.format(apply_on), apply_on_field=apply_on_field), as_dict=1):
+
+			rules.setdefault(cstr(row.get(apply_on_field)), []).append(row)
+			if row.apply_rule_on_other is not None and row.get(other_field):
+				other_rules.setdefault(row.get(other_field), []).append(row)
+
+	return index
+
+def clear_pricing_rule_index():
+	PRICING_RULE_INDEX.pop(frappe.local.site, None)
+
+def start_pricing_rule_batch():
+	"""
+		Evaluate the rows of one document against the same rule set. Until `end_pricing_rule_batch`,
+		the rule index, the items of each rule and cumulative totals are looked up only once.
+	"""
+	frappe.flags.pricing_rule_batch = frappe._dict(index={}, rule_items={}, cumulative_data={})
+
+def end_pricing_rule_batch():
+	frappe.flags.pricing_rule_batch = None
+
+def _get_pricing_rules(apply_on, args, index):
 	apply_on_field = frappe.scrub(apply_on)
 
 	if not args.get(apply_on_field): return []
 
-	child_doc = '`tabPricing Rule {0}`'.format(apply_on)
-
-	conditions = item_variant_condition = item_conditions = ""
-	values[apply_on_field] = args.get(apply_on_field)
-	if apply_on_field in ['item_code', 'brand']:
-		item_conditions = "{child_doc}.{apply_on_field}= %({apply_on_field})s".format(child_doc=child_doc,
-			apply_on_field = apply_on_field)
+	if apply_on_field == 'item_group':
+		values = get_tree_ancestors("Item Group", args.get(apply_on_field))
+	else:
+		values = [args.get(apply_on_field)]
 
 		if apply_on_field == 'item_code':
 			if "variant_of" not in args:
 				args.variant_of = frappe.get_cached_value("Item", args.item_code, "variant_of")
 
 			if args.variant_of:
-				item_variant_condition = ' or {child_doc}.item_code=%(variant_of)s '.format(child_doc=child_doc)
-				values['variant_of'] = args.variant_of
-	elif apply_on_field == 'item_group':
-		item_conditions = _get_tree_conditions(args, "Item Group", child_doc, False)
-
-	conditions += get_other_conditions(conditions, values, args)
-	warehouse_conditions = _get_tree_conditions(args, "Warehouse", '`tabPricing Rule`')
-	if warehouse_conditions:
-		warehouse_conditions = " and {0}".format(warehouse_conditions)
+				values.append(args.variant_of)
 
 	if not args.price_list: args.price_list = None
 
-	conditions += " and ifnull(`tabPricing Rule`.for_price_list, '') in (%(price_list)s, '')"
-	values["price_list"] = args.get("price_list")
-
-	pricing_rules = frappe.db.sql("""select `tabPricing Rule`.*,
-			{child_doc}.{apply_on_field}, {child_doc}.uom
-		from `tabPricing Rule`, {child_doc}
-		where ({item_conditions} or (`tabPricing Rule`.apply_rule_on_other is not null
-			and `tabPricing Rule`.{apply_on_other_field}=%({apply_on_field})s) {item_variant_condition})
-			and {child_doc}.parent = `tabPricing Rule`.name
-			and `tabPricing Rule`.disable = 0 and
-			`tabPricing Rule`.{transaction_type} = 1 {warehouse_cond} {conditions}
-		order by `tabPricing Rule`.priority desc,
-			`tabPricing Rule`.name desc""".format(
-			child_doc = child_doc,
-			apply_on_field = apply_on_field,
-			item_conditions = item_conditions,
-			item_variant_condition = item_variant_condition,
-			transaction_type = args.transaction_type,
-			warehouse_cond = warehouse_conditions,
-			apply_on_other_field = "other_{0}".format(apply_on_field),
-			conditions = conditions), values, as_dict=1) or []
-
-	return pricing_rules
+	# rows matched on the child table, or on the other item for apply_rule_on_other rules
+	rows = {}
+	for value in values:
+		for row in index.rules[apply_on].get(value, []):
+			rows[id(row)] = row
+
+	for row in index.other[apply_on].get(args.get(apply_on_field), []):
+		rows[id(row)] = row
+
+	tree_filters = get_tree_filters(args)
+	pricing_rules = [frappe._dict(row) for row in rows.values()
+		if is_pricing_rule_applicable(row, args, tree_filters)]
+
+	return sorted(pricing_rules, key=lambda d: (cstr(d.priority), d.name), reverse=True)
+
+def get_tree_filters(args):
+	tree_filters = {}
+	for parenttype in ["Warehouse", "Customer Group", "Territory", "Supplier Group"]:
+		field = frappe.scrub(parenttype)
+		if args.get(field):
+			ancestors = get_tree_ancestors(parenttype, args.get(field))
+			if ancestors:
+				tree_filters[field] = set(ancestors + [''])
+
+	return tree_filters
+
+def is_pricing_rule_applicable(pricing_rule, args, tree_filters):
+	if not cint(pricing_rule.get(args.transaction_type)):
+		return False
+
+	for field in ["company", "customer", "supplier", "campaign", "sales_partner"]:
+		if pricing_rule.get(field) and pricing_rule.get(field) != args.get(field):
+			return False
+
+	for field, values in tree_filters.items():
+		if cstr(pricing_rule.get(field)) not in values:
+			return False
+
+	if args.get("transaction_date"):
+		transaction_date = getdate(args.get("transaction_date"))
+		if ((pricing_rule.valid_from and transaction_date < getdate(pricing_rule.valid_from))
+			or (pricing_rule.valid_upto and transaction_date > getdate(pricing_rule.valid_upto))):
+			return False
+
+	return cstr(pricing_rule.for_price_list) in ('', cstr(args.price_list))
 
 def apply_multiple_pricing_rules(pricing_rules):
 	apply_multiple_rule = [d.apply_multiple_pricing_rules
@@ -164,10 +244,30 @@ def _get_tree_conditions(args, parenttype, table, allow_blank=True):
 		if key in frappe.flags.tree_conditions:
 			return frappe.flags.tree_conditions[key]
 
+		parent_groups = get_tree_ancestors(parenttype, args.get(field))
+
+		if parent_groups:
+			if allow_blank: parent_groups.append('')
+			condition = "ifnull({table}.{field}, '') in ({parent_groups})".format(
+				table=table,
+				field=field,
+				parent_groups=", ".join(frappe.db.escape(d) for d in parent_groups)
+			)
+
+			frappe.flags.tree_conditions[key] = condition
+	return condition
+
+def get_tree_ancestors(parenttype, name):
+	"""Returns `name` with its ancestors, and the root for group trees"""
+	if not frappe.flags.tree_ancestors:
+		frappe.flags.tree_ancestors = {}
+
+	key = (parenttype, name)
+	if key not in frappe.flags.tree_ancestors:
 		try:
-			lft, rgt = frappe.db.get_value(parenttype, args.get(field), ["lft", "rgt"])
+			lft, rgt = frappe.db.get_value(parenttype, name, ["lft", "rgt"])
 		except TypeError:
-			frappe.throw(_("Invalid {0}").format(args.get(field)))
+			frappe.throw(_("Invalid {0}").format(name))
 
 		parent_groups = frappe.db.sql_list("""select name from `tab%s`
 			where lft<=%s and rgt>=%s""" % (parenttype, '%s', '%s'), (lft, rgt))
@@ -180,16 +280,9 @@ def _get_tree_conditions(args, parenttype, table, allow_blank=True):
 			if root_name and root_name[0][0]:
 				parent_groups.append(root_name[0][0])
 
-		if parent_groups:
-			if allow_blank: parent_groups.append('')
-			condition = "ifnull({table}.{field}, '') in ({parent_groups})".format(
-				table=table,
-				field=field,
-				parent_groups=", ".join(frappe.db.escape(d) for d in parent_groups)
-			)
+		frappe.flags.tree_ancestors[key] = parent_groups
 
-			frappe.flags.tree_conditions[key] = condition
-	return condition
+	return list(frappe.flags.tree_ancestors[key])
 
 def get_other_conditions(conditions, values, args):
 	for field in ["company", "customer", "supplier", "campaign", "sales_partner"]:
@@ -408,9 +501,21 @@ def get_qty_and_rate_for_other_item(doc, pr_doc, pricing_rules):
 def get_qty_amount_data_for_cumulative(pr_doc, doc, items=None):
 	if items is None:
 		items = []
-	sum_qty, sum_amt = [0, 0]
 	doctype = doc.get('parenttype') or doc.doctype
 
+	batch = frappe.flags.pricing_rule_batch
+	if not batch:
+		return _get_qty_amount_data_for_cumulative(pr_doc, doctype, items)
+
+	key = (pr_doc.name, doctype, frozenset(items))
+	if key not in batch.cumulative_data:
+		batch.cumulative_data[key] = _get_qty_amount_data_for_cumulative(pr_doc, doctype, items)
+
+	return list(batch.cumulative_data[key])
+
+def _get_qty_amount_data_for_cumulative(pr_doc, doctype, items):
+	sum_qty, sum_amt = [0, 0]
+
 	date_field = 'transaction_date' if frappe.get_meta(doctype).has_field('transaction_date') else 'posting_date'
 
 	child_doctype = '{0} Item'.format(doctype)
@@ -570,6 +675,16 @@ def apply_pricing_rule_for_free_items(doc, pricing_rule_args, set_missing_values
 				doc.append('items', args)
 
 def get_pricing_rule_items(pr_doc):
+	batch = frappe.flags.pricing_rule_batch
+	if not batch:
+		return _get_pricing_rule_items(pr_doc)
+
+	if pr_doc.name not in batch.rule_items:
+		batch.rule_items[pr_doc.name] = _get_pricing_rule_items(pr_doc)
+
+	return list(batch.rule_items[pr_doc.name])
+
+def _get_pricing_rule_items(pr_doc):
 	apply_on_data = []
 	apply_on = frappe.scrub(pr_doc.get('apply_on'))
 
@@ -0,0 +1,49 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import unittest
+
+import frappe
+from frappe.utils import flt
+
+from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.doctype.voucher_outstanding.voucher_outstanding import (
+	rebuild_voucher_outstanding,
+)
+from erpnext.accounts.utils import get_outstanding_invoices
+
+
+class TestVoucherOutstanding(unittest.TestCase):
+	def test_outstanding_from_ledger(self):
+		si = create_sales_invoice(qty=1, rate=500)
+		self.assertEqual(get_outstanding(si), 500)
+
+		pe = get_payment_entry("Sales Invoice", si.name, party_amount=200, bank_account="_Test Cash - _TC")
+		pe.reference_no = "1"
+		pe.reference_date = si.posting_date
+		pe.submit()
+		self.assertEqual(get_outstanding(si), 300)
+
+		# filtered like the Payment Reconciliation tool
+		condition = " and company = '{0}' and posting_date <= '{1}'".format(si.company, si.posting_date)
+		self.assertEqual(get_outstanding(si, condition), 300)
+
+		# rebuilding gives the same amounts as incremental updates
+		rebuild_voucher_outstanding("_Test Company")
+		self.assertEqual(get_outstanding(si), 300)
+
+		pe.cancel()
+		self.assertEqual(get_outstanding(si), 500)
+
+		si.reload()
+		si.cancel()
+		self.assertIsNone(get_outstanding(si))
+		self.assertFalse(frappe.db.get_value("Voucher Outstanding",
+			{"voucher_type": "Sales Invoice", "voucher_no": si.name, "outstanding_amount": (">", 0)}))
+
+
+def get_outstanding(si, condition=None):
+	for d in get_outstanding_invoices("Customer", si.customer, si.debit_to, condition=condition):
+		if d.voucher_type == "Sales Invoice" and d.voucher_no == si.name:
+			return flt(d.outstanding_amount)
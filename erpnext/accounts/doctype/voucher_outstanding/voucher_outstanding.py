@@ -0,0 +1,223 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, flt, now
+
+KEY_FIELDS = ("party_type", "party", "account", "voucher_type", "voucher_no")
+
+# open vouchers whose invoice amount is recomputed from GL Entries per query
+VOUCHER_CHUNK_SIZE = 500
+
+
+class VoucherOutstanding(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_unique("Voucher Outstanding", list(KEY_FIELDS), constraint_name="unique_party_account_voucher")
+	frappe.db.add_index("Voucher Outstanding", ["party_type", "party", "account", "outstanding_amount"])
+	frappe.db.add_index("Voucher Outstanding", ["voucher_type", "voucher_no"])
+
+def update_voucher_outstanding(gl_entries, cancel=False):
+	"""
+		Add the invoice and payment amounts of posted GL Entries to the ledger, or remove them on cancellation.
+
+		Like `get_outstanding_invoices`, an entry is an invoice amount of its own voucher when it increases
+		the party balance and is not a payment, and a payment amount of its against voucher when it decreases it.
+	"""
+	deltas = {}
+	for gle in gl_entries:
+		if cint(gle.get("is_cancelled")) or not (gle.get("party_type") and gle.get("party")):
+			continue
+
+		amount = flt(gle.get("debit_in_account_currency")) - flt(gle.get("credit_in_account_currency"))
+		if get_party_account_type(gle.get("account")) != "Receivable":
+			amount = -amount
+
+		if amount > 0 and is_invoice_entry(gle):
+			delta = get_delta(deltas, gle, gle.get("voucher_type"), gle.get("voucher_no"))
+			delta.invoice_amount += amount
+			delta.posting_date = delta.posting_date or gle.get("posting_date")
+			delta.due_date = delta.due_date or gle.get("due_date")
+			delta.currency = delta.currency or gle.get("account_currency")
+
+		elif amount < 0 and gle.get("against_voucher"):
+			delta = get_delta(deltas, gle, gle.get("against_voucher_type"), gle.get("against_voucher"))
+			delta.payment_amount -= amount
+
+	sign = -1 if cancel else 1
+	for key, delta in deltas.items():
+		values = frappe._dict(zip(KEY_FIELDS, key))
+		values.update(delta)
+		values.invoice_amount *= sign
+		values.payment_amount *= sign
+		apply_outstanding_delta(values)
+
+def remove_voucher_from_voucher_outstanding(voucher_type, voucher_no):
+	"""Remove the active GL Entries of a voucher, before they are cancelled or deleted"""
+	update_voucher_outstanding(get_active_gl_entries("voucher_type = %s and voucher_no = %s",
+		(voucher_type, voucher_no)), cancel=True)
+
+def get_active_gl_entries(condition, values):
+	return frappe.db.sql("""
+		select
+			company, party_type, party, account, account_currency, voucher_type, voucher_no,
+			against_voucher_type, against_voucher, posting_date, due_date,
+			debit_in_account_currency, credit_in_account_currency
+		from `tabGL Entry`
+		where {0} and is_cancelled = 0 and party is not null and party != ''
+	""".format(condition), values, as_dict=1)
+
+def is_invoice_entry(gle):
+	if gle.get("voucher_type") == "Journal Entry":
+		return not gle.get("against_voucher")
+
+	return gle.get("voucher_type") != "Payment Entry"
+
+def get_party_account_type(account):
+	root_type, account_type = frappe.get_cached_value("Account", account, ["root_type", "account_type"])
+	return account_type or ("Receivable" if root_type == "Asset" else "Payable")
+
+def get_delta(deltas, gle, voucher_type, voucher_no):
+	key = (gle.get("party_type"), gle.get("party"), gle.get("account"), voucher_type, voucher_no)
+	if key not in deltas:
+		deltas[key] = frappe._dict(company=gle.get("company"), posting_date=None, due_date=None,
+			currency=None, invoice_amount=0.0, payment_amount=0.0)
+
+	return deltas[key]
+
+def apply_outstanding_delta(values):
+	"""Insert the ledger row of the key in `values`, or add the amounts to it if it exists"""
+	values = frappe._dict(values, name=frappe.generate_hash(length=10), timestamp=now(),
+		user=frappe.session.user)
+
+	frappe.db.sql("""
+		insert into `tabVoucher Outstanding`
+			(name, creation, modified, owner, modified_by, docstatus, idx,
+			company, party_type, party, account, voucher_type, voucher_no, posting_date, due_date,
+			currency, invoice_amount, payment_amount, outstanding_amount)
+		values
+			(%(name)s, %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0, 0,
+			%(company)s, %(party_type)s, %(party)s, %(account)s, %(voucher_type)s, %(voucher_no)s,
+			%(posting_date)s, %(due_date)s, %(currency)s, %(invoice_amount)s, %(payment_amount)s,
+			%(invoice_amount)s - %(payment_amount)s)
+		on duplicate key update
+			invoice_amount = invoice_amount + %(invoice_amount)s,
+			payment_amount = payment_amount + %(payment_amount)s,
+			outstanding_amount = outstanding_amount + %(invoice_amount)s - %(payment_amount)s,
+			posting_date = coalesce(posting_date, %(posting_date)s),
+			due_date = coalesce(due_date, %(due_date)s),
+			currency = coalesce(currency, %(currency)s),
+			modified = %(timestamp)s
+	""", values)
+
+def get_open_vouchers(party_type, party, account, condition=None):
+	"""
+		Vouchers of the party and account with an outstanding amount, read through the
+		(party_type, party, account, outstanding_amount) index.
+
+		When `condition` is given, it filters the invoice GL Entries as in `get_outstanding_invoices`.
+		Conditions can only lower the invoice amount, so the invoice amounts are recomputed from the
+		GL Entries of the open vouchers only.
+	"""
+	if not account:
+		return []
+
+	vouchers = frappe.db.sql("""
+		select voucher_type, voucher_no, posting_date, due_date, invoice_amount, payment_amount, currency
+		from `tabVoucher Outstanding`
+		where party_type = %s and party = %s and account = %s and outstanding_amount > 0
+		order by posting_date, voucher_no
+	""", (party_type, party, account), as_dict=1)
+
+	if not (vouchers and condition):
+		return vouchers
+
+	if get_party_account_type(account) == "Receivable":
+		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
+	else:
+		dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
+
+	invoice_amounts = {}
+	voucher_nos = list({d.voucher_no for d in vouchers})
+	for i in range(0, len(voucher_nos), VOUCHER_CHUNK_SIZE):
+		for d in frappe.db.sql("""
+			select voucher_type, voucher_no, ifnull(sum({dr_or_cr}), 0) as invoice_amount
+			from `tabGL Entry`
+			where party_type = %(party_type)s and party = %(party)s
+				and account = %(account)s and {dr_or_cr} > 0
+				and is_cancelled = 0
+				and voucher_no in %(voucher_nos)s
+				{condition}
+				and ((voucher_type = 'Journal Entry'
+						and (against_voucher = '' or against_voucher is null))
+					or (voucher_type not in ('Journal Entry', 'Payment Entry')))
+			group by voucher_type, voucher_no
+		""".format(dr_or_cr=dr_or_cr, condition=condition), {
+			"party_type": party_type,
+			"party": party,
+			"account": account,
+			"voucher_nos": tuple(voucher_nos[i:i + VOUCHER_CHUNK_SIZE]),
+		}, as_dict=1):
+			invoice_amounts[(d.voucher_type, d.voucher_no)] = d.invoice_amount
+
+	filtered_vouchers = []
+	for d in vouchers:
+		if (d.voucher_type, d.voucher_no) in invoice_amounts:
+			d.invoice_amount = invoice_amounts[(d.voucher_type, d.voucher_no)]
+			filtered_vouchers.append(d)
+
+	return filtered_vouchers
+
+def rebuild_voucher_outstanding(company=None):
+	"""Recreate the ledger from GL Entries, e.g. after GL Entries were changed directly in the database"""
+	if company:
+		frappe.db.delete("Voucher Outstanding", {"company": company})
+	else:
+		frappe.db.delete("Voucher Outstanding")
+
+	company_condition = "and gle.company = %(company)s" if company else ""
+	amount = """(case when acc.account_type = 'Receivable'
+			or ((acc.account_type is null or acc.account_type = '') and acc.root_type = 'Asset') then 1 else -1 end)
+		* (gle.debit_in_account_currency - gle.credit_in_account_currency)"""
+
+	vouchers = {}
+	for d in frappe.db.sql("""
+		select
+			gle.party_type, gle.party, gle.account, gle.voucher_type, gle.voucher_no,
+			max(gle.company) as company, min(gle.posting_date) as posting_date, min(gle.due_date) as due_date,
+			max(gle.account_currency) as currency, sum({amount}) as invoice_amount
+		from `tabGL Entry` gle, `tabAccount` acc
+		where acc.name = gle.account and gle.is_cancelled = 0 and {amount} > 0
+			and gle.party is not null and gle.party != '' {company_condition}
+			and ((gle.voucher_type = 'Journal Entry'
+					and (gle.against_voucher = '' or gle.against_voucher is null))
+				or (gle.voucher_type not in ('Journal Entry', 'Payment Entry')))
+		group by gle.party_type, gle.party, gle.account, gle.voucher_type, gle.voucher_no
+	""".format(amount=amount, company_condition=company_condition), {"company": company}, as_dict=1):
+		d.payment_amount = 0.0
+		vouchers[tuple(d[field] for field in KEY_FIELDS)] = d
+
+	for d in frappe.db.sql("""
+		select
+			gle.party_type, gle.party, gle.account, gle.against_voucher_type as voucher_type,
+			gle.against_voucher as voucher_no, max(gle.company) as company, -sum({amount}) as payment_amount
+		from `tabGL Entry` gle, `tabAccount` acc
+		where acc.name = gle.account and gle.is_cancelled = 0 and {amount} < 0
+			and gle.party is not null and gle.party != ''
+			and gle.against_voucher is not null and gle.against_voucher != '' {company_condition}
+		group by gle.party_type, gle.party, gle.account, gle.against_voucher_type, gle.against_voucher
+	""".format(amount=amount, company_condition=company_condition), {"company": company}, as_dict=1):
+		key = tuple(d[field] for field in KEY_FIELDS)
+		if key in vouchers:
+			vouchers[key].payment_amount = d.payment_amount
+		else:
+			d.invoice_amount = 0.0
+			vouchers[key] = d
+
+	for d in vouchers.values():
+		doc = frappe.new_doc("Voucher Outstanding")
+		doc.update(d)
+		doc.outstanding_amount = flt(d.invoice_amount) - flt(d.payment_amount)
+		doc.db_insert()
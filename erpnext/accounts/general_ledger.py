@@ -10,14 +10,30 @@ from frappe.model.meta import get_field_precision
 from frappe.utils import cint, cstr, flt, formatdate, getdate, now
 
 import erpnext
+from erpnext.accounts.doctype.account_balance_snapshot.account_balance_snapshot import (
+	remove_voucher_from_account_balance_snapshot,
+	update_account_balance_snapshot,
+)
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (
 	get_accounting_dimensions,
 )
 from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
+from erpnext.accounts.doctype.gl_entry.gl_entry import (
+	update_outstanding_amt,
+	validate_balance_type,
+	validate_frozen_account,
+)
+from erpnext.accounts.doctype.voucher_outstanding.voucher_outstanding import (
+	remove_voucher_from_voucher_outstanding,
+	update_voucher_outstanding,
+)
 
 
 class ClosedAccountingPeriod(frappe.ValidationError): pass
 
+# GL maps with more rows than this are validated and inserted in bulk, see `make_entries_in_bulk`
+BULK_GL_ENTRY_THRESHOLD = 100
+
 def make_gl_entries(gl_map, cancel=False, adv_adj=False, merge_entries=True, update_outstanding='Yes', from_repost=False):
 	if gl_map:
 		if not cancel:
@@ -107,11 +123,15 @@ def get_cost_center_allocation_data(company, posting_date):
 
 def merge_similar_entries(gl_map, precision=None):
 	merged_gl_map = []
+	merged_entries_by_key = {}
 	accounting_dimensions = get_accounting_dimensions()
+	merge_fieldnames = get_merge_fieldnames(accounting_dimensions)
+
 	for entry in gl_map:
 		# if there is already an entry in this account then just add it
 		# to that entry
-		same_head = check_if_in_list(entry, merged_gl_map, accounting_dimensions)
+		key = get_merge_key(entry, merge_fieldnames)
+		same_head = merged_entries_by_key.get(key)
 		if same_head:
 			same_head.debit	= flt(same_head.debit) + flt(entry.debit)
 			same_head.debit_in_account_currency	= \
@@ -120,6 +140,7 @@ def merge_similar_entries(gl_map, precision=None):
 			same_head.credit_in_account_currency = \
 				flt(same_head.credit_in_account_currency) + flt(entry.credit_in_account_currency)
 		else:
+			merged_entries_by_key[key] = entry
 			merged_gl_map.append(entry)
 
 	company = gl_map[0].company if gl_map else erpnext.get_default_company()
@@ -134,13 +155,22 @@ def merge_similar_entries(gl_map, precision=None):
 
 	return merged_gl_map
 
-def check_if_in_list(gle, gl_map, dimensions=None):
+def get_merge_fieldnames(dimensions=None):
 	account_head_fieldnames = ['voucher_detail_no', 'party', 'against_voucher',
 			'cost_center', 'against_voucher_type', 'party_type', 'project', 'finance_book']
 
 	if dimensions:
 		account_head_fieldnames = account_head_fieldnames + dimensions
 
+	return account_head_fieldnames
+
+def get_merge_key(gle, fieldnames):
+	"""Entries with the same key are merged into one by `merge_similar_entries`"""
+	return (gle.account, ) + tuple(cstr(gle.get(fieldname)) for fieldname in fieldnames)
+
+def check_if_in_list(gle, gl_map, dimensions=None):
+	account_head_fieldnames = get_merge_fieldnames(dimensions)
+
 	for e in gl_map:
 		same_head = True
 		if e.account != gle.account:
@@ -207,8 +237,14 @@ def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 	if gl_map:
 		check_freezing_date(gl_map[0]["posting_date"], adv_adj)
 
-	for entry in gl_map:
-		make_entry(entry, adv_adj, update_outstanding, from_repost)
+	if len(gl_map) > BULK_GL_ENTRY_THRESHOLD and not has_gl_entry_hooks_of_other_apps():
+		make_entries_in_bulk(gl_map, adv_adj, update_outstanding, from_repost)
+	else:
+		for entry in gl_map:
+			make_entry(entry, adv_adj, update_outstanding, from_repost)
+
+	update_account_balance_snapshot(gl_map)
+	update_voucher_outstanding(gl_map)
 
 def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	gle = frappe.new_doc("GL Entry")
@@ -222,6 +258,106 @@ def make_entry(args, adv_adj, update_outstanding, from_repost=False):
 	if not from_repost:
 		validate_expense_against_budget(args)
 
+def make_entries_in_bulk(gl_map, adv_adj, update_outstanding, from_repost=False):
+	"""
+		Post a large GL map with multi-row inserts instead of submitting each GL Entry.
+
+		Row level validations of GL Entry run for every row, together with the checks `submit`
+		runs on every document (mandatory fields, links, select options and field lengths).
+		Checks which only depend on the account, accounting dimensions, against voucher or
+		budget head run once for each distinct value after all rows are inserted.
+
+		Only `validate` runs through `run_method`, the other GL Entry events (insert, submit, update)
+		are not triggered. Hence the bulk path is not used when other apps hook into them,
+		see `has_gl_entry_hooks_of_other_apps`.
+	"""
+	gl_entries = []
+	for args in gl_map:
+		gle = frappe.new_doc("GL Entry")
+		gle.update(args)
+		gle.flags.ignore_permissions = 1
+		gle.flags.from_repost = from_repost
+		gle.flags.adv_adj = adv_adj
+		gle.flags.update_outstanding = update_outstanding or 'Yes'
+		gle.docstatus = 1
+		gle.set_new_name()
+		gle.set_user_and_timestamp()
+		gle._validate_mandatory()
+		gle._validate_links()
+		gle._validate_selects()
+		gle._validate_length()
+		gle.run_method("validate")
+		gl_entries.append(gle)
+
+	values = [gle.get_valid_dict(convert_dates_to_str=True) for gle in gl_entries]
+	fields = list(values[0])
+	frappe.db.bulk_insert("GL Entry", fields, [[d.get(field) for field in fields] for d in values])
+
+	if not from_repost:
+		validate_posted_entries(gl_entries, adv_adj)
+		update_outstanding_for_posted_entries(gl_entries)
+		validate_budget_for_posted_entries(gl_map)
+
+def validate_posted_entries(gl_entries, adv_adj):
+	dimensions = get_accounting_dimensions()
+	validated_accounts, validated_dimensions = set(), set()
+
+	for gle in gl_entries:
+		if gle.account not in validated_accounts:
+			validated_accounts.add(gle.account)
+			gle.validate_account_details(adv_adj)
+			validate_balance_type(gle.account, adv_adj)
+			validate_frozen_account(gle.account, adv_adj)
+
+		dimension_key = (gle.account, gle.company) + tuple(cstr(gle.get(d)) for d in dimensions)
+		if dimension_key not in validated_dimensions:
+			validated_dimensions.add(dimension_key)
+			gle.validate_dimensions_for_pl_and_bs()
+			gle.validate_allowed_dimensions()
+
+def update_outstanding_for_posted_entries(gl_entries):
+	against_vouchers = set()
+	for gle in gl_entries:
+		if (gle.against_voucher_type in ['Journal Entry', 'Sales Invoice', 'Purchase Invoice', 'Fees']
+			and gle.against_voucher and gle.flags.update_outstanding == 'Yes'
+			and not frappe.flags.is_reverse_depr_entry):
+				against_vouchers.add((gle.account, gle.party_type, gle.party,
+					gle.against_voucher_type, gle.against_voucher))
+
+	for account, party_type, party, against_voucher_type, against_voucher in sorted(against_vouchers,
+		key=lambda d: tuple(cstr(v) for v in d)):
+		update_outstanding_amt(account, party_type, party, against_voucher_type, against_voucher)
+
+def has_gl_entry_hooks_of_other_apps():
+	"""Whether an app other than frappe and erpnext has GL Entry doc events besides validate"""
+	for app in frappe.get_installed_apps():
+		if app in ("frappe", "erpnext"):
+			continue
+
+		doc_events = frappe.get_hooks("doc_events", app_name=app) or {}
+		for doctype in ("GL Entry", "*"):
+			if any(event != "validate" for event in doc_events.get(doctype) or {}):
+				return True
+
+	return False
+
+def validate_budget_for_posted_entries(gl_map):
+	"""
+		Check budgets once per distinct set of the fields the budget check reads.
+
+		The rows are already inserted, so the actual expense compared with the budget
+		includes the amounts of all rows with the same budget head.
+	"""
+	budget_fields = ['company', 'posting_date', 'fiscal_year', 'account', 'expense_account', 'item_code',
+		'cost_center', 'project'] + get_accounting_dimensions()
+	validated = set()
+
+	for args in gl_map:
+		key = tuple(cstr(args.get(field)) for field in budget_fields)
+		if key not in validated:
+			validated.add(key)
+			validate_expense_against_budget(args)
+
 def validate_cwip_accounts(gl_map):
 	"""Validate that CWIP account are not used in Journal Entry"""
 	if gl_map and gl_map[0].voucher_type != "Journal Entry":
@@ -378,6 +514,8 @@ def set_as_cancel(voucher_type, voucher_no):
 	"""
 		Set is_cancelled=1 in all original gl entries for the voucher
 	"""
+	remove_voucher_from_account_balance_snapshot(voucher_type, voucher_no)
+	remove_voucher_from_voucher_outstanding(voucher_type, voucher_no)
 	frappe.db.sql("""UPDATE `tabGL Entry` SET is_cancelled = 1,
 		modified=%s, modified_by=%s
 		where voucher_type=%s and voucher_no=%s and is_cancelled = 0""",
@@ -28,6 +28,10 @@ from erpnext.accounts.utils import get_currency_precision
 #  8. Invoice details like Sales Persons, Delivery Notes are also fetched comma separated
 #  9. Report amounts are in "Party Currency" if party is selected, or company currency for multi-party
 # 10. This reports is based on all GL Entries that are made against account_type "Receivable" or "Payable"
+# 11. GL Entries are summed in the database and invoice details are only fetched for vouchers with outstanding
+
+# vouchers per query when fetching details of outstanding vouchers
+VOUCHER_CHUNK_SIZE = 1000
 
 def execute(filters=None):
 	args = {
@@ -75,15 +79,6 @@ class ReceivablePayableReport(object):
 		self.voucher_balance = OrderedDict()
 		self.init_voucher_balance() # invoiced, paid, credit_note, outstanding
 
-		# Build delivery note map against all sales invoices
-		self.build_delivery_note_map()
-
-		# Get invoice details like bill_no, due_date etc for all invoices
-		self.get_invoice_details()
-
-		# fetch future payments against invoices
-		self.get_future_payments()
-
 		# Get return entries
 		self.get_return_entries()
 
@@ -91,6 +86,20 @@ class ReceivablePayableReport(object):
 		for gle in self.gl_entries:
 			self.update_voucher_balance(gle)
 
+		self.set_outstanding()
+
+		# Build delivery note map against outstanding sales invoices
+		self.build_delivery_note_map()
+
+		# Get invoice details like bill_no, due_date etc for outstanding invoices
+		self.get_invoice_details()
+
+		# fetch future payments against outstanding invoices
+		self.get_future_payments()
+
+		self.get_payment_terms_map()
+		self.get_party_details_map()
+
 		self.build_data()
 
 	def init_voucher_balance(self):
@@ -222,9 +231,10 @@ class ReceivablePayableReport(object):
 
 		return voucher_balance
 
-	def build_data(self):
+	def set_outstanding(self):
 		# set outstanding for all the accumulated balances
 		# as we can use this to filter out invoices without outstanding
+		self.outstanding_rows = []
 		for key, row in self.voucher_balance.items():
 			row.outstanding = flt(row.invoiced - row.paid - row.credit_note, self.currency_precision)
 			row.outstanding_in_account_currency = flt(row.invoiced_in_account_currency - row.paid_in_account_currency - \
@@ -235,24 +245,33 @@ class ReceivablePayableReport(object):
 			if (abs(row.outstanding) > 1.0/10 ** self.currency_precision) and \
 				(abs(row.outstanding_in_account_currency) > 1.0/10 ** self.currency_precision):
 				# non-zero oustanding, we must consider this row
+				self.outstanding_rows.append(row)
+
+		self.invoices.intersection_update(row.voucher_no for row in self.outstanding_rows)
+
+	def get_outstanding_vouchers(self, voucher_type=None):
+		return list({row.voucher_no for row in self.outstanding_rows
+			if not voucher_type or row.voucher_type == voucher_type})
 
-				if self.is_invoice(row) and self.filters.based_on_payment_terms:
-					# is an invoice, allocate based on fifo
-					# adds a list `payment_terms` which contains new rows for each term
-					self.allocate_outstanding_based_on_payment_terms(row)
-
-					if row.payment_terms:
-						# make separate rows for each payment term
-						for d in row.payment_terms:
-							if d.outstanding > 0:
-								self.append_row(d)
-
-						# if there is overpayment, add another row
-						self.allocate_extra_payments_or_credits(row)
-					else:
-						self.append_row(row)
+	def build_data(self):
+		for row in self.outstanding_rows:
+			if self.is_invoice(row) and self.filters.based_on_payment_terms:
+				# is an invoice, allocate based on fifo
+				# adds a list `payment_terms` which contains new rows for each term
+				self.allocate_outstanding_based_on_payment_terms(row)
+
+				if row.payment_terms:
+					# make separate rows for each payment term
+					for d in row.payment_terms:
+						if d.outstanding > 0:
+							self.append_row(d)
+
+					# if there is overpayment, add another row
+					self.allocate_extra_payments_or_credits(row)
 				else:
 					self.append_row(row)
+			else:
+				self.append_row(row)
 
 		if self.filters.get('group_by_party'):
 			self.append_subtotal_row(self.previous_party)
@@ -297,61 +316,64 @@ class ReceivablePayableReport(object):
 			self.delivery_notes = frappe._dict()
 
 			# delivery note link inside sales invoice
-			si_against_dn = frappe.db.sql("""
+			si_against_dn = get_in_chunks("""
 				select parent, delivery_note
 				from `tabSales Invoice Item`
-				where docstatus=1 and parent in (%s)
-			""" % (','.join(['%s'] * len(self.invoices))), tuple(self.invoices), as_dict=1)
+				where docstatus=1 and parent in %(names)s
+			""", self.invoices)
 
 			for d in si_against_dn:
 				if d.delivery_note:
 					self.delivery_notes.setdefault(d.parent, set()).add(d.delivery_note)
 
-			dn_against_si = frappe.db.sql("""
+			dn_against_si = get_in_chunks("""
 				select distinct parent, against_sales_invoice
 				from `tabDelivery Note Item`
-				where against_sales_invoice in (%s)
-			""" % (','.join(['%s'] * len(self.invoices))), tuple(self.invoices) , as_dict=1)
+				where against_sales_invoice in %(names)s
+			""", self.invoices)
 
 			for d in dn_against_si:
 				self.delivery_notes.setdefault(d.against_sales_invoice, set()).add(d.parent)
 
 	def get_invoice_details(self):
 		self.invoice_details = frappe._dict()
+		values = {"report_date": self.filters.report_date}
+
 		if self.party_type == "Customer":
-			si_list = frappe.db.sql("""
+			sales_invoices = self.get_outstanding_vouchers("Sales Invoice")
+			si_list = get_in_chunks("""
 				select name, due_date, po_no
 				from `tabSales Invoice`
-				where posting_date <= %s
-			""",self.filters.report_date, as_dict=1)
+				where posting_date <= %(report_date)s and name in %(names)s
+			""", sales_invoices, values)
 			for d in si_list:
 				self.invoice_details.setdefault(d.name, d)
 
 			# Get Sales Team
 			if self.filters.show_sales_person:
-				sales_team = frappe.db.sql("""
+				sales_team = get_in_chunks("""
 					select parent, sales_person
 					from `tabSales Team`
-					where parenttype = 'Sales Invoice'
-				""", as_dict=1)
+					where parenttype = 'Sales Invoice' and parent in %(names)s
+				""", sales_invoices)
 				for d in sales_team:
 					self.invoice_details.setdefault(d.parent, {})\
 						.setdefault('sales_team', []).append(d.sales_person)
 
 		if self.party_type == "Supplier":
-			for pi in frappe.db.sql("""
+			for pi in get_in_chunks("""
 				select name, due_date, bill_no, bill_date
 				from `tabPurchase Invoice`
-				where posting_date <= %s
-			""", self.filters.report_date, as_dict=1):
+				where posting_date <= %(report_date)s and name in %(names)s
+			""", self.get_outstanding_vouchers("Purchase Invoice"), values):
 				self.invoice_details.setdefault(pi.name, pi)
 
 		# Invoices booked via Journal Entries
-		journal_entries = frappe.db.sql("""
+		journal_entries = get_in_chunks("""
 			select name, due_date, bill_no, bill_date
 			from `tabJournal Entry`
-			where posting_date <= %s
-		""", self.filters.report_date, as_dict=1)
+			where posting_date <= %(report_date)s and name in %(names)s
+		""", self.get_outstanding_vouchers("Journal Entry"), values)
 
 		for je in journal_entries:
 			if je.bill_no:
@@ -380,18 +402,28 @@ class ReceivablePayableReport(object):
 
 		row.payment_terms = sorted(row.payment_terms, key=lambda x: x['due_date'])
 
+	def get_payment_terms_map(self):
+		# payment schedules of outstanding invoices, per (voucher_type, voucher_no)
+		self.payment_terms_map = {}
+		if not self.filters.based_on_payment_terms:
+			return
+
+		for voucher_type in ('Sales Invoice', 'Purchase Invoice'):
+			for d in get_in_chunks("""
+				select
+					si.name, si.party_account_currency, si.currency, si.conversion_rate,
+					ps.due_date, ps.payment_term, ps.payment_amount, ps.description, ps.paid_amount, ps.discounted_amount
+				from `tab{0}` si, `tabPayment Schedule` ps
+				where
+					si.name = ps.parent and
+					si.name in %(names)s
+				order by si.name, ps.paid_amount desc, ps.due_date
+			""".format(voucher_type), self.get_outstanding_vouchers(voucher_type)):
+				self.payment_terms_map.setdefault((voucher_type, d.name), []).append(d)
+
 	def get_payment_terms(self, row):
 		# build payment_terms for row
-		payment_terms_details = frappe.db.sql("""
-			select
-				si.name, si.party_account_currency, si.currency, si.conversion_rate,
-				ps.due_date, ps.payment_term, ps.payment_amount, ps.description, ps.paid_amount, ps.discounted_amount
-			from `tab{0}` si, `tabPayment Schedule` ps
-			where
-				si.name = ps.parent and
-				si.name = %s
-			order by ps.paid_amount desc, due_date
-		""".format(row.voucher_type), row.voucher_no, as_dict = 1)
+		payment_terms_details = self.payment_terms_map.get((row.voucher_type, row.voucher_no), [])
 
 
 		original_row = frappe._dict(row)
@@ -451,15 +483,16 @@ class ReceivablePayableReport(object):
 	def get_future_payments(self):
 		if self.filters.show_future_payments:
 			self.future_payments = frappe._dict()
-			future_payments = list(self.get_future_payments_from_payment_entry())
-			future_payments += list(self.get_future_payments_from_journal_entry())
+			invoices = self.get_outstanding_vouchers()
+			future_payments = list(self.get_future_payments_from_payment_entry(invoices))
+			future_payments += list(self.get_future_payments_from_journal_entry(invoices))
 			if future_payments:
 				for d in future_payments:
 					if d.future_amount and d.invoice_no:
 						self.future_payments.setdefault((d.invoice_no, d.party), []).append(d)
 
-	def get_future_payments_from_payment_entry(self):
-		return frappe.db.sql("""
+	def get_future_payments_from_payment_entry(self, invoices):
+		return get_in_chunks("""
 			select
 				ref.reference_name as invoice_no,
 				payment_entry.party,
@@ -473,18 +506,19 @@ class ReceivablePayableReport(object):
 				(ref.parent = payment_entry.name)
 			where
 				payment_entry.docstatus < 2
-				and payment_entry.posting_date > %s
-				and payment_entry.party_type = %s
-			""", (self.filters.report_date, self.party_type), as_dict=1)
+				and payment_entry.posting_date > %(report_date)s
+				and payment_entry.party_type = %(party_type)s
+				and ref.reference_name in %(names)s
+			""", invoices, {"report_date": self.filters.report_date, "party_type": self.party_type})
 
-	def get_future_payments_from_journal_entry(self):
+	def get_future_payments_from_journal_entry(self, invoices):
 		if self.filters.get('party'):
 			amount_field = ("jea.debit_in_account_currency - jea.credit_in_account_currency"
 				if self.party_type == 'Supplier' else "jea.credit_in_account_currency - jea.debit_in_account_currency")
 		else:
 			amount_field = ("jea.debit - " if self.party_type == 'Supplier' else "jea.credit")
 
-		return frappe.db.sql("""
+		return get_in_chunks("""
 			select
 				jea.reference_name as invoice_no,
 				jea.party,
@@ -498,12 +532,12 @@ class ReceivablePayableReport(object):
 				(jea.parent = je.name)
 			where
 				je.docstatus < 2
-				and je.posting_date > %s
-				and jea.party_type = %s
-				and jea.reference_name is not null and jea.reference_name != ''
+				and je.posting_date > %(report_date)s
+				and jea.party_type = %(party_type)s
+				and jea.reference_name in %(names)s
 			group by je.name, jea.reference_name
 			having future_amount > 0
-			""".format(amount_field), (self.filters.report_date, self.party_type), as_dict=1)
+			""".format(amount_field), invoices, {"report_date": self.filters.report_date, "party_type": self.party_type})
 
 	def allocate_future_payments(self, row):
 		# future payments are captured in additional columns
@@ -539,9 +573,17 @@ class ReceivablePayableReport(object):
 		party_field = scrub(self.filters.party_type)
 		if self.filters.get(party_field):
 			filters.update({party_field: self.filters.get(party_field)})
-		self.return_entries = frappe._dict(
-			frappe.get_all(doctype, filters, ['name', 'return_against'], as_list=1)
-		)
+
+		# only the invoices that payments are made against can be remapped
+		against_vouchers = list({gle.against_voucher for gle in self.gl_entries
+			if gle.against_voucher_type == doctype})
+
+		self.return_entries = frappe._dict()
+		for i in range(0, len(against_vouchers), VOUCHER_CHUNK_SIZE):
+			filters['name'] = ('in', against_vouchers[i:i + VOUCHER_CHUNK_SIZE])
+			self.return_entries.update(
+				frappe.get_all(doctype, filters, ['name', 'return_against'], as_list=1)
+			)
 
 	def set_ageing(self, row):
 		if self.filters.ageing_based_on == "Due Date":
@@ -583,7 +625,9 @@ class ReceivablePayableReport(object):
 		row['range' + str(index+1)] = row.outstanding
 
 	def get_gl_entries(self):
-		# get all the GL entries filtered by the given filters
+		# get the GL entries filtered by the given filters, summed per voucher, party and linked voucher.
+		# debits and credits are summed separately, since each of them is a single
+		# invoiced, paid or credit note amount in `update_voucher_balance`
 
 		conditions, values = self.prepare_conditions()
 		order_by = self.get_order_by_condition()
@@ -597,27 +641,39 @@ class ReceivablePayableReport(object):
 			date_condition = "AND posting_date <=%s"
 
 		if self.filters.get(scrub(self.party_type)):
-			select_fields = "debit_in_account_currency as debit, credit_in_account_currency as credit"
+			debit, credit = "debit_in_account_currency", "credit_in_account_currency"
 		else:
-			select_fields = "debit, credit"
+			debit, credit = "debit", "credit"
+
+		select_fields = "sum({0}) as debit, sum({1}) as credit".format(debit, credit)
+		doc_currency_fields = ("sum(debit_in_account_currency) as debit_in_account_currency, "
+			"sum(credit_in_account_currency) as credit_in_account_currency")
 
-		doc_currency_fields = "debit_in_account_currency, credit_in_account_currency"
+		if self.dr_or_cr == "debit":
+			balance_sign = "case when gle.{0} > gle.{1} then 1 else 0 end".format(debit, credit)
+		else:
+			balance_sign = "case when gle.{1} > gle.{0} then 1 else 0 end".format(debit, credit)
 
-		remarks = ", remarks" if self.filters.get("show_remarks") else ""
+		remarks = ", max(remarks) as remarks" if self.filters.get("show_remarks") else ""
 
 		self.gl_entries = frappe.db.sql("""
 			select
-				name, posting_date, account, party_type, party, voucher_type, voucher_no, cost_center,
-				against_voucher_type, against_voucher, account_currency, {0}, {1} {remarks}
+				min(posting_date) as posting_date, party, voucher_type, voucher_no,
+				max(cost_center) as cost_center, against_voucher_type, against_voucher,
+				max(account_currency) as account_currency, {0}, {1} {remarks}
 			from
-				`tabGL Entry`
+				`tabGL Entry` gle
 			where
 				docstatus < 2
 				and is_cancelled = 0
 				and party_type=%s
 				and (party is not null and party != '')
-				{2} {3} {4}"""
-			.format(select_fields, doc_currency_fields, date_condition, conditions, order_by, remarks=remarks), values, as_dict=True)
+				{2} {3}
+			group by
+				party, voucher_type, voucher_no, against_voucher_type, against_voucher, {balance_sign}
+			{4}"""
+			.format(select_fields, doc_currency_fields, date_condition, conditions, order_by,
+				remarks=remarks, balance_sign=balance_sign), values, as_dict=True)
 
 	def get_sales_invoices_or_customers_based_on_sales_person(self):
 		if self.filters.get("sales_person"):
@@ -753,6 +809,19 @@ class ReceivablePayableReport(object):
 		if gle.voucher_type in ('Sales Invoice', 'Purchase Invoice'):
 			return True
 
+	def get_party_details_map(self):
+		# prefetch the details of parties with outstanding, instead of one query per party
+		if self.party_type == 'Customer':
+			fields = ['customer_name', 'territory', 'customer_group', 'customer_primary_contact']
+		else:
+			fields = ['supplier_name', 'supplier_group']
+
+		parties = list({row.party for row in self.outstanding_rows} - set(self.party_details))
+		for i in range(0, len(parties), VOUCHER_CHUNK_SIZE):
+			for d in frappe.get_all(self.party_type, filters={'name': ('in', parties[i:i + VOUCHER_CHUNK_SIZE])},
+				fields=['name'] + fields):
+				self.party_details[d.pop('name')] = d
+
 	def get_party_details(self, party):
 		if not party in self.party_details:
 			if self.party_type == 'Customer':
@@ -876,3 +945,13 @@ class ReceivablePayableReport(object):
 			},
 			"type": 'percentage'
 		}
+
+def get_in_chunks(query, names, values=None):
+	"""Run `query` for `names` in chunks of VOUCHER_CHUNK_SIZE, `query` filters on `%(names)s`"""
+	names = list(names)
+	result = []
+	for i in range(0, len(names), VOUCHER_CHUNK_SIZE):
+		chunk_values = dict(values or {}, names=tuple(names[i:i + VOUCHER_CHUNK_SIZE]))
+		result += frappe.db.sql(query, chunk_values, as_dict=1)
+
+	return result
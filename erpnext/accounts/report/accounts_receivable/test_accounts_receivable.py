@@ -54,6 +54,36 @@ class TestAccountsReceivable(unittest.TestCase):
 		self.assertEqual(expected_data_after_credit_note,
 			[row.invoice_grand_total, row.invoiced, row.paid, row.credit_note, row.outstanding])
 
+	def test_details_of_outstanding_invoices(self):
+		frappe.db.sql("delete from `tabSales Invoice` where company='_Test Company 2'")
+		frappe.db.sql("delete from `tabGL Entry` where company='_Test Company 2'")
+
+		paid_invoice = make_sales_invoice()
+		pe = get_payment_entry("Sales Invoice", paid_invoice, bank_account="Cash - _TC2")
+		pe.paid_from = "Debtors - _TC2"
+		pe.insert()
+		pe.submit()
+
+		name = make_sales_invoice()
+		frappe.db.set_value("Sales Invoice", name, "po_no", "_Test PO")
+		make_payment(name)
+
+		report = execute({
+			'company': '_Test Company 2',
+			'report_date': today(),
+			'range1': 30,
+			'range2': 60,
+			'range3': 90,
+			'range4': 120
+		})
+
+		# fully paid invoices are left out, details are fetched for the outstanding ones
+		self.assertEqual([row.voucher_no for row in report[1]], [name])
+
+		row = report[1][0]
+		self.assertEqual([row.invoiced, row.paid, row.outstanding, row.po_no, row.customer_name],
+			[100, 40, 60, "_Test PO", "_Test Customer 2"])
+
 def make_sales_invoice():
 	frappe.set_user("Administrator")
 
@@ -162,7 +162,8 @@ def get_data(
 			period_list[0]["year_start_date"] if only_current_fiscal_year else None,
 			period_list[-1]["to_date"],
 			root.lft, root.rgt, filters,
-			gl_entries_by_account, ignore_closing_entries=ignore_closing_entries
+			gl_entries_by_account, ignore_closing_entries=ignore_closing_entries,
+			period_list=period_list
 		)
 
 	calculate_values(
@@ -360,8 +361,16 @@ def sort_accounts(accounts, is_root=False, key="name"):
 	accounts.sort(key = functools.cmp_to_key(compare_accounts))
 
 def set_gl_entries_by_account(
-		company, from_date, to_date, root_lft, root_rgt, filters, gl_entries_by_account, ignore_closing_entries=False):
-	"""Returns a dict like { "account": [gl entries], ... }"""
+		company, from_date, to_date, root_lft, root_rgt, filters, gl_entries_by_account, ignore_closing_entries=False,
+		period_list=None):
+	"""
+		Returns a dict like { "account": [gl entries], ... }
+
+		Unless a presentation currency is set, GL Entries are summed in the database per account,
+		fiscal year, opening flag and period of `period_list`. Each summed row carries the earliest
+		posting date of its period, so date comparisons against the periods give the same result
+		as for the individual entries.
+	"""
 
 	additional_conditions = get_additional_conditions(from_date, ignore_closing_entries, filters)
 
@@ -389,15 +398,33 @@ def set_gl_entries_by_account(
 					key: value
 				})
 
-		gl_entries = frappe.db.sql("""
-			select posting_date, account, debit, credit, is_opening, fiscal_year,
-				debit_in_account_currency, credit_in_account_currency, account_currency from `tabGL Entry`
-			where company=%(company)s
-			{additional_conditions}
-			and posting_date <= %(to_date)s
-			and is_cancelled = 0""".format(
-			additional_conditions=additional_conditions), gl_filters, as_dict=True
-		)
+		if filters and filters.get('presentation_currency'):
+			gl_entries = frappe.db.sql("""
+				select posting_date, account, debit, credit, is_opening, fiscal_year,
+					debit_in_account_currency, credit_in_account_currency, account_currency from `tabGL Entry`
+				where company=%(company)s
+				{additional_conditions}
+				and posting_date <= %(to_date)s
+				and is_cancelled = 0""".format(
+				additional_conditions=additional_conditions), gl_filters, as_dict=True
+			)
+		else:
+			group_by = ["account", "fiscal_year", "is_opening", "account_currency"]
+			if period_list:
+				group_by.append(get_period_bucket_condition(period_list))
+
+			gl_entries = frappe.db.sql("""
+				select min(posting_date) as posting_date, account, sum(debit) as debit, sum(credit) as credit,
+					is_opening, fiscal_year, sum(debit_in_account_currency) as debit_in_account_currency,
+					sum(credit_in_account_currency) as credit_in_account_currency, account_currency
+				from `tabGL Entry`
+				where company=%(company)s
+				{additional_conditions}
+				and posting_date <= %(to_date)s
+				and is_cancelled = 0
+				group by {group_by}""".format(
+				additional_conditions=additional_conditions, group_by=", ".join(group_by)), gl_filters, as_dict=True
+			)
 
 		if filters and filters.get('presentation_currency'):
 			convert_to_presentation_currency(gl_entries, get_currency(filters), filters.get('company'))
@@ -408,6 +435,25 @@ def set_gl_entries_by_account(
 		return gl_entries_by_account
 
 
+def get_period_bucket_condition(period_list):
+	"""
+		SQL expression numbering the date ranges between period boundaries,
+		used to sum GL Entries per period in the database.
+	"""
+	boundaries = set()
+	for period in period_list:
+		boundaries.add(getdate(period.from_date))
+		boundaries.add(add_days(getdate(period.to_date), 1))
+
+		if period.get("year_start_date"):
+			boundaries.add(getdate(period.year_start_date))
+
+	return "case {0} else {1} end".format(
+		" ".join("when posting_date < {0} then {1}".format(frappe.db.escape(cstr(boundary)), idx)
+			for idx, boundary in enumerate(sorted(boundaries))),
+		len(boundaries)
+	)
+
 def get_additional_conditions(from_date, ignore_closing_entries, filters):
 	additional_conditions = []
 
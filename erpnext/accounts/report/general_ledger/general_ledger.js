@@ -189,7 +189,33 @@ frappe.query_reports["General Ledger"] = {
 			"label": __("Show Net Values in Party Account"),
 			"fieldtype": "Check"
 		}
-	]
+	],
+	"onload": function(report) {
+		report.page.add_inner_button(__("Export in Background"), function() {
+			frappe.prompt({
+				"fieldname": "file_type",
+				"label": __("File Type"),
+				"fieldtype": "Select",
+				"options": "CSV\nExcel",
+				"default": "CSV",
+				"reqd": 1
+			}, function(values) {
+				frappe.call({
+					method: "erpnext.accounts.report.general_ledger.general_ledger.enqueue_gl_export",
+					args: {
+						filters: report.get_values(),
+						file_type: values.file_type
+					},
+					callback: function() {
+						frappe.show_alert({
+							message: __("Export started, you will be notified when the file is ready"),
+							indicator: "blue"
+						});
+					}
+				});
+			}, __("Export General Ledger"), __("Export"));
+		});
+	}
 }
 
 erpnext.utils.add_dimensions('General Ledger', 15)
@@ -2,11 +2,13 @@
 # License: GNU General Public License v3. See license.txt
 
 
+import csv
+import json
 from collections import OrderedDict
 
 import frappe
 from frappe import _, _dict
-from frappe.utils import cstr, getdate
+from frappe.utils import cint, cstr, flt, getdate
 
 from erpnext import get_company_currency, get_default_company
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (
@@ -20,10 +22,24 @@ from erpnext.accounts.utils import get_account_currency
 # to cache translations
 TRANSLATIONS = frappe._dict()
 
+# number of GL Entries per page when streaming the ledger
+PAGE_LENGTH = 500
+
 def execute(filters=None):
 	if not filters:
 		return [], []
 
+	filters, account_details = prepare_filters(filters)
+
+	columns = get_columns(filters)
+
+	update_translations()
+
+	res = get_result(filters, account_details)
+
+	return columns, res
+
+def prepare_filters(filters):
 	account_details = {}
 
 	if filters and filters.get('print_in_account_currency') and \
@@ -42,13 +58,11 @@ def execute(filters=None):
 
 	filters = set_account_currency(filters)
 
-	columns = get_columns(filters)
-
-	update_translations()
-
-	res = get_result(filters, account_details)
+	if filters.get("include_default_book_entries"):
+		filters['company_fb'] = frappe.db.get_value("Company",
+			filters.get("company"), 'default_finance_book')
 
-	return columns, res
+	return filters, account_details
 
 def update_translations():
 	TRANSLATIONS.update(
@@ -168,10 +182,6 @@ def get_gl_entries(filters, accounting_dimensions):
 	if filters.get("group_by") == "Group by Account":
 		order_by_statement = "order by account, posting_date, creation"
 
-	if filters.get("include_default_book_entries"):
-		filters['company_fb'] = frappe.db.get_value("Company",
-			filters.get("company"), 'default_finance_book')
-
 	dimension_fields = ""
 	if accounting_dimensions:
 		dimension_fields = ', '.join(accounting_dimensions) + ','
@@ -588,3 +598,201 @@ def get_columns(filters):
 	])
 
 	return columns
+
+@frappe.whitelist()
+def get_gl_entries_page(filters, cursor=None, page_length=PAGE_LENGTH):
+	"""
+		Stream the ledger one page at a time.
+
+		Entries are returned individually in posting order, grouping filters don't apply.
+		The first page also returns the opening row. The returned cursor carries the last
+		entry's position and the running balance, pass it back to get the next page.
+	"""
+	check_gl_entry_permission()
+
+	filters = _dict(frappe.parse_json(filters))
+	filters, account_details = prepare_filters(filters)
+	cursor = _dict(frappe.parse_json(cursor)) if cursor else None
+	conditions = get_conditions(filters)
+
+	out = _dict()
+	if not cursor:
+		update_translations()
+		out.opening = get_opening_row(filters, conditions)
+		cursor = _dict(balance=out.opening.balance)
+
+	out.entries = get_entries_after_cursor(filters, conditions, cursor, cint(page_length) or PAGE_LENGTH)
+	out.cursor = get_next_cursor(out.entries, cursor) if len(out.entries) == cint(page_length) else None
+
+	return out
+
+def check_gl_entry_permission():
+	if not frappe.has_permission("GL Entry", "read"):
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+def get_opening_row(filters, conditions):
+	"""Opening balance of the filtered ledger, computed with one aggregate query"""
+	opening_condition = "posting_date < %(from_date)s"
+	if not filters.get("show_opening_entries"):
+		opening_condition += " or is_opening = 'Yes'"
+
+	balances = frappe.db.sql("""
+		select
+			account_currency, max(account) as account, sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from `tabGL Entry`
+		where company=%(company)s {conditions}
+			and ({opening_condition})
+		group by account_currency
+	""".format(conditions=conditions, opening_condition=opening_condition), filters, as_dict=1)
+
+	if filters.get('presentation_currency'):
+		balances = convert_to_presentation_currency(balances, get_currency(filters), filters.get('company'))
+
+	opening = _dict(account="'{0}'".format(TRANSLATIONS.OPENING), account_currency=filters.account_currency)
+	for field in ("debit", "credit", "debit_in_account_currency", "credit_in_account_currency"):
+		opening[field] = sum(flt(d.get(field)) for d in balances)
+
+	opening.balance = opening.debit - opening.credit
+	return opening
+
+def get_entries_after_cursor(filters, conditions, cursor, page_length):
+	accounting_dimensions = get_accounting_dimensions() if filters.get("include_dimensions") else []
+	dimension_fields = ''.join(d + ', ' for d in accounting_dimensions)
+
+	page_conditions = [
+		"posting_date >= %(from_date)s",
+		"posting_date <= %(to_date)s",
+	]
+	if not filters.get("show_opening_entries"):
+		page_conditions.append("is_opening != 'Yes'")
+
+	if cursor.get("name"):
+		page_conditions.append("""(posting_date > %(cursor_date)s
+			or (posting_date = %(cursor_date)s and (creation > %(cursor_creation)s
+				or (creation = %(cursor_creation)s and name > %(cursor_name)s))))""")
+		filters.update({
+			"cursor_date": cursor.posting_date,
+			"cursor_creation": cursor.creation,
+			"cursor_name": cursor.name
+		})
+
+	gl_entries = frappe.db.sql("""
+		select
+			name as gl_entry, posting_date, account, party_type, party,
+			voucher_type, voucher_no, {dimension_fields}
+			cost_center, project,
+			against_voucher_type, against_voucher, account_currency,
+			remarks, against, is_opening, creation, debit, credit,
+			debit_in_account_currency, credit_in_account_currency
+		from `tabGL Entry`
+		where company=%(company)s {conditions} and {page_conditions}
+		order by posting_date, creation, name
+		limit {page_length}
+	""".format(
+		dimension_fields=dimension_fields, conditions=conditions,
+		page_conditions=" and ".join(page_conditions), page_length=cint(page_length)
+	), filters, as_dict=1)
+
+	if filters.get('presentation_currency'):
+		gl_entries = convert_to_presentation_currency(gl_entries, get_currency(filters), filters.get('company'))
+
+	bill_nos = get_supplier_invoice_bill_nos([d.against_voucher for d in gl_entries
+		if d.against_voucher_type == "Purchase Invoice"])
+
+	balance = flt(cursor.get("balance"))
+	for d in gl_entries:
+		balance = get_balance(d, balance, 'debit', 'credit')
+		d['balance'] = balance
+		d['account_currency'] = filters.account_currency
+		d['bill_no'] = bill_nos.get(d.get('against_voucher'), '')
+
+	return gl_entries
+
+def get_next_cursor(gl_entries, cursor):
+	if not gl_entries:
+		return cursor
+
+	last_entry = gl_entries[-1]
+	return _dict(
+		posting_date=cstr(last_entry.posting_date),
+		creation=cstr(last_entry.creation),
+		name=last_entry.gl_entry,
+		balance=last_entry.balance
+	)
+
+def get_supplier_invoice_bill_nos(invoices):
+	if not invoices:
+		return {}
+
+	return frappe._dict(frappe.get_all("Purchase Invoice",
+		filters={"name": ("in", list(set(invoices))), "docstatus": 1, "bill_no": ("is", "set")},
+		fields=["name", "bill_no"], as_list=1))
+
+def iterate_gl_entry_pages(filters, page_length=PAGE_LENGTH):
+	cursor = None
+	while True:
+		page = get_gl_entries_page(json.dumps(filters, default=str), cursor=cursor and json.dumps(cursor),
+			page_length=page_length)
+		yield page
+
+		if not page.cursor:
+			break
+		cursor = page.cursor
+
+@frappe.whitelist()
+def enqueue_gl_export(filters, file_type="CSV"):
+	"""Export the filtered ledger to a file in a background job, the user is notified with a link"""
+	check_gl_entry_permission()
+
+	frappe.enqueue(export_gl_entries, queue="long", timeout=3600,
+		filters=frappe.parse_json(filters), file_type=file_type, user=frappe.session.user)
+
+def export_gl_entries(filters, file_type="CSV", user=None):
+	"""Write the ledger to a private file page by page, without holding all entries in memory"""
+	filters = _dict(filters)
+	columns = [d for d in get_columns(filters) if not d.get("hidden")]
+	fieldnames = [d["fieldname"] for d in columns]
+
+	file_name = "general_ledger_{0}.{1}".format(frappe.generate_hash(length=8),
+		"xlsx" if file_type == "Excel" else "csv")
+	file_path = frappe.get_site_path("private", "files", file_name)
+
+	def get_rows():
+		yield [d["label"] for d in columns]
+
+		for page in iterate_gl_entry_pages(filters):
+			if page.get("opening"):
+				yield [page.opening.get(field) for field in fieldnames]
+
+			for entry in page.entries:
+				yield [cstr(entry.get(field)) if field == "posting_date" else entry.get(field)
+					for field in fieldnames]
+
+	if file_type == "Excel":
+		from openpyxl import Workbook
+
+		workbook = Workbook(write_only=True)
+		sheet = workbook.create_sheet(_("General Ledger"))
+		for row in get_rows():
+			sheet.append(row)
+		workbook.save(file_path)
+	else:
+		with open(file_path, "w", newline="") as f:
+			writer = csv.writer(f)
+			for row in get_rows():
+				writer.writerow(row)
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": "/private/files/" + file_name,
+		"is_private": 1
+	}).insert(ignore_permissions=True)
+
+	if user:
+		frappe.publish_realtime("msgprint", _("General Ledger export is ready: {0}").format(
+			"<a href='{0}' target='_blank'>{1}</a>".format(file_doc.file_url, file_name)), user=user)
+
+	return file_doc.file_url
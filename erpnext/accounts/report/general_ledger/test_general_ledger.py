@@ -0,0 +1,40 @@
+import unittest
+
+import frappe
+from frappe.utils import add_days, flt, today
+
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.report.general_ledger.general_ledger import iterate_gl_entry_pages
+
+
+class TestGeneralLedger(unittest.TestCase):
+	def test_paginated_gl_entries(self):
+		for i in range(5):
+			make_journal_entry("_Test Bank - _TC", "_Test Cash - _TC", 10 * (i + 1), submit=True)
+
+		filters = frappe._dict({
+			"company": "_Test Company",
+			"account": ["_Test Bank - _TC"],
+			"from_date": add_days(today(), -1),
+			"to_date": add_days(today(), 1),
+		})
+
+		pages = list(iterate_gl_entry_pages(filters, page_length=2))
+		entries = [d for page in pages for d in page.entries]
+
+		expected = frappe.get_all("GL Entry",
+			filters={
+				"account": "_Test Bank - _TC",
+				"company": "_Test Company",
+				"is_cancelled": 0,
+				"is_opening": "No",
+				"posting_date": ("between", [filters.from_date, filters.to_date])
+			},
+			fields=["name", "debit", "credit"],
+			order_by="posting_date, creation, name")
+
+		self.assertTrue(len(pages) > 1)
+		self.assertEqual([d.gl_entry for d in entries], [d.name for d in expected])
+
+		closing_balance = pages[0].opening.balance + sum(flt(d.debit) - flt(d.credit) for d in expected)
+		self.assertEqual(flt(entries[-1].balance, 2), flt(closing_balance, 2))
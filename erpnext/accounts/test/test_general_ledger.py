@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from erpnext.accounts import general_ledger
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.general_ledger import (
+	BULK_GL_ENTRY_THRESHOLD,
+	check_if_in_list,
+	has_gl_entry_hooks_of_other_apps,
+	make_gl_entries,
+	make_reverse_gl_entries,
+	merge_similar_entries,
+)
+
+
+class TestGeneralLedger(unittest.TestCase):
+	def test_merge_similar_entries(self):
+		gl_map = make_gl_map(200, distinct_rows=30)
+		expected = merge_with_linear_scan(make_gl_map(200, distinct_rows=30))
+
+		merged = merge_similar_entries(gl_map, precision=2)
+
+		self.assertEqual(len(merged), 30)
+		self.assertEqual(
+			[(d.account, d.cost_center, d.party, d.debit, d.credit) for d in merged],
+			[(d.account, d.cost_center, d.party, d.debit, d.credit) for d in expected]
+		)
+
+	def test_merge_similar_entries_looks_up_each_row_once(self):
+		gl_map = make_gl_map(2000, distinct_rows=1000)
+
+		with patch.object(general_ledger, "get_merge_key", wraps=general_ledger.get_merge_key) as get_merge_key, \
+			patch.object(general_ledger, "check_if_in_list") as check_if_in_list:
+			merge_similar_entries(gl_map, precision=2)
+
+		# one key per row, no scan of the merged rows
+		self.assertEqual(get_merge_key.call_count, 2000)
+		check_if_in_list.assert_not_called()
+
+	def test_make_gl_entries_in_bulk(self):
+		jv = make_journal_entry("_Test Bank - _TC", "_Test Cash - _TC", 100, save=False)
+		jv.name = "_Test Bulk GL Posting"
+
+		rows = BULK_GL_ENTRY_THRESHOLD + 20
+		gl_map = []
+		for i in range(rows):
+			gl_map.append(jv.get_gl_dict({
+				"account": "_Test Bank - _TC" if i % 2 else "_Test Cash - _TC",
+				"cost_center": "_Test Cost Center - _TC",
+				"voucher_detail_no": "row-{0}".format(i),
+				"debit": 10 if i % 2 else 0,
+				"debit_in_account_currency": 10 if i % 2 else 0,
+				"credit": 0 if i % 2 else 10,
+				"credit_in_account_currency": 0 if i % 2 else 10,
+			}))
+
+		make_gl_entries(gl_map, merge_entries=False)
+
+		gl_entries = frappe.get_all("GL Entry",
+			filters={"voucher_type": "Journal Entry", "voucher_no": jv.name, "is_cancelled": 0},
+			fields=["account", "debit", "credit", "fiscal_year", "docstatus"])
+
+		self.assertEqual(len(gl_entries), rows)
+		self.assertEqual(sum(d.debit for d in gl_entries), 10 * rows / 2)
+		self.assertEqual(sum(d.credit for d in gl_entries), 10 * rows / 2)
+		self.assertTrue(all(d.fiscal_year and d.docstatus == 1 for d in gl_entries))
+
+		make_reverse_gl_entries(voucher_type="Journal Entry", voucher_no=jv.name)
+
+	def test_bulk_gl_entries_validate_links(self):
+		jv = make_journal_entry("_Test Bank - _TC", "_Test Cash - _TC", 100, save=False)
+		jv.name = "_Test Bulk GL Link Validation"
+
+		gl_map = []
+		for i in range(BULK_GL_ENTRY_THRESHOLD + 2):
+			gl_map.append(jv.get_gl_dict({
+				"account": "_Test Bank - _TC" if i % 2 else "_Test Cash - _TC",
+				"cost_center": "_Test Cost Center - _TC",
+				"debit": 10 if i % 2 else 0,
+				"debit_in_account_currency": 10 if i % 2 else 0,
+				"credit": 0 if i % 2 else 10,
+				"credit_in_account_currency": 0 if i % 2 else 10,
+			}))
+
+		gl_map[-1].cost_center = "_Test Missing Cost Center - _TC"
+		# rows are validated before any of them is inserted
+		self.assertRaises(frappe.LinkValidationError, make_gl_entries, gl_map, merge_entries=False)
+		self.assertFalse(frappe.db.exists("GL Entry", {"voucher_no": jv.name}))
+
+	def test_gl_entry_hooks_of_other_apps(self):
+		def _has_hooks(doc_events):
+			with patch.object(frappe, "get_installed_apps", return_value=["frappe", "erpnext", "custom_app"]), \
+				patch.object(frappe, "get_hooks", return_value=doc_events):
+				return has_gl_entry_hooks_of_other_apps()
+
+		# validate hooks also run for GL Entries posted in bulk
+		self.assertFalse(_has_hooks({"GL Entry": {"validate": ["custom_app.validate_gl_entry"]}}))
+		self.assertTrue(_has_hooks({"GL Entry": {"on_submit": ["custom_app.on_submit_gl_entry"]}}))
+		self.assertTrue(_has_hooks({"*": {"on_update": ["custom_app.on_update"]}}))
+
+
+def make_gl_map(rows, distinct_rows):
+	gl_map = []
+	for i in range(rows):
+		idx = i % distinct_rows
+		gl_map.append(frappe._dict({
+			"company": "_Test Company",
+			"account": "Sales - _TC" if idx % 2 else "Debtors - _TC",
+			"cost_center": "Main - _TC",
+			"party_type": "Customer" if not idx % 2 else None,
+			"party": "_Test Customer {0}".format(idx) if not idx % 2 else None,
+			"voucher_detail_no": "row-{0}".format(idx),
+			"debit": 10.0 if not idx % 2 else 0,
+			"credit": 10.0 if idx % 2 else 0,
+			"debit_in_account_currency": 10.0 if not idx % 2 else 0,
+			"credit_in_account_currency": 10.0 if idx % 2 else 0,
+		}))
+
+	return gl_map
+
+def merge_with_linear_scan(gl_map):
+	merged_gl_map = []
+	for entry in gl_map:
+		same_head = check_if_in_list(entry, merged_gl_map)
+		if same_head:
+			same_head.debit += entry.debit
+			same_head.credit += entry.credit
+		else:
+			merged_gl_map.append(entry)
+
+	return merged_gl_map
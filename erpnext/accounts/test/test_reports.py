@@ -17,6 +17,10 @@ REPORT_FILTER_TEST_CASES: List[Tuple[ReportName, ReportFilters]] = [
 	("General Ledger", {"group_by": "Group by Voucher (Consolidated)", "include_dimensions": 1} ),
 	("Accounts Payable", {"range1": 30, "range2": 60, "range3": 90, "range4": 120}),
 	("Accounts Receivable", {"range1": 30, "range2": 60, "range3": 90, "range4": 120}),
+	("Balance Sheet", {"filter_based_on": "Date Range", "periodicity": "Yearly"}),
+	("Profit and Loss Statement", {"filter_based_on": "Date Range", "periodicity": "Quarterly"}),
+	("Profit and Loss Statement", {"filter_based_on": "Date Range", "periodicity": "Yearly", "accumulated_values": 1}),
+	("Cash Flow", {"filter_based_on": "Date Range", "periodicity": "Yearly"}),
 	("Consolidated Financial Statement", {"report": "Balance Sheet"} ),
 	("Consolidated Financial Statement", {"report": "Profit and Loss Statement"} ),
 	("Consolidated Financial Statement", {"report": "Cash Flow"} ),
@@ -14,6 +14,16 @@ import erpnext
 
 # imported to enable erpnext.accounts.utils.get_account_currency
 from erpnext.accounts.doctype.account.account import get_account_currency  # noqa
+from erpnext.accounts.doctype.account_balance_snapshot.account_balance_snapshot import (
+	get_balance,
+	remove_voucher_from_account_balance_snapshot,
+)
+from erpnext.accounts.doctype.voucher_outstanding.voucher_outstanding import (
+	get_active_gl_entries,
+	get_open_vouchers,
+	remove_voucher_from_voucher_outstanding,
+	update_voucher_outstanding,
+)
 from erpnext.stock import get_warehouse_account_map
 from erpnext.stock.utils import get_stock_value_on
 
@@ -127,11 +137,9 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 	if not cost_center and frappe.form_dict.get("cost_center"):
 		cost_center = frappe.form_dict.get("cost_center")
 
-
-	cond = ["is_cancelled=0"]
-	if date:
-		cond.append("posting_date <= %s" % frappe.db.escape(cstr(date)))
-	else:
+	cond = []
+	to_date = date
+	if not date:
 		# get balance of all entries that exist
 		date = nowdate()
 
@@ -173,10 +181,6 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 			or ignore_account_permission):
 			acc.check_permission("read")
 
-		if report_type == 'Profit and Loss':
-			# for pl accounts, get balance within a fiscal year
-			cond.append("posting_date >= '%s' and voucher_type != 'Period Closing Voucher'" \
-				% year_start_date)
 		# different filter for group and ledger - improved performance
 		if acc.is_group:
 			cond.append("""exists (
@@ -200,16 +204,17 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 
 	if account or (party_type and party):
 		if in_account_currency:
-			select_field = "sum(debit_in_account_currency) - sum(credit_in_account_currency)"
+			balance_fields = ("debit_in_account_currency", "credit_in_account_currency")
 		else:
-			select_field = "sum(debit) - sum(credit)"
-		bal = frappe.db.sql("""
-			SELECT {0}
-			FROM `tabGL Entry` gle
-			WHERE {1}""".format(select_field, " and ".join(cond)))[0][0]
+			balance_fields = ("debit", "credit")
 
-		# if bal is None, return 0
-		return flt(bal)
+		# for pl accounts, get balance within a fiscal year
+		is_pl_account = report_type == 'Profit and Loss'
+
+		return get_balance(cond, balance_fields,
+			from_date=year_start_date if is_pl_account else None,
+			to_date=to_date,
+			exclude_period_closing=is_pl_account)
 
 def get_count_on(account, fieldname, date):
 	cond = ["is_cancelled=0"]
@@ -521,6 +526,11 @@ def unlink_ref_doc_from_payment_entries(ref_doc):
 	remove_ref_doc_link_from_jv(ref_doc.doctype, ref_doc.name)
 	remove_ref_doc_link_from_pe(ref_doc.doctype, ref_doc.name)
 
+	# the unlinked entries are no longer payments against the document
+	gl_entries = get_active_gl_entries("against_voucher_type = %s and against_voucher = %s "
+		"and voucher_no != ifnull(against_voucher, '')", (ref_doc.doctype, ref_doc.name))
+	update_voucher_outstanding(gl_entries, cancel=True)
+
 	frappe.db.sql("""update `tabGL Entry`
 		set against_voucher_type=null, against_voucher=null,
 		modified=%s, modified_by=%s
@@ -528,6 +538,10 @@ def unlink_ref_doc_from_payment_entries(ref_doc):
 		and voucher_no != ifnull(against_voucher, '')""",
 		(now(), frappe.session.user, ref_doc.doctype, ref_doc.name))
 
+	for gle in gl_entries:
+		gle.against_voucher_type = gle.against_voucher = None
+	update_voucher_outstanding(gl_entries)
+
 	if ref_doc.doctype in ("Sales Invoice", "Purchase Invoice"):
 		ref_doc.set("advances", [])
 
@@ -659,69 +673,13 @@ def get_outstanding_invoices(party_type, party, account, condition=None, filters
 	outstanding_invoices = []
 	precision = frappe.get_precision("Sales Invoice", "outstanding_amount") or 2
 
-	if account:
-		root_type, account_type = frappe.get_cached_value("Account", account, ["root_type", "account_type"])
-		party_account_type = "Receivable" if root_type == "Asset" else "Payable"
-		party_account_type = account_type or party_account_type
-	else:
-		party_account_type = erpnext.get_party_account_type(party_type)
-
-	if party_account_type == 'Receivable':
-		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
-		payment_dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
-	else:
-		dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
-		payment_dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
-
 	held_invoices = get_held_invoices(party_type, party)
 
-	invoice_list = frappe.db.sql("""
-		select
-			voucher_no, voucher_type, posting_date, due_date,
-			ifnull(sum({dr_or_cr}), 0) as invoice_amount,
-			account_currency as currency
-		from
-			`tabGL Entry`
-		where
-			party_type = %(party_type)s and party = %(party)s
-			and account = %(account)s and {dr_or_cr} > 0
-			and is_cancelled=0
-			{condition}
-			and ((voucher_type = 'Journal Entry'
-					and (against_voucher = '' or against_voucher is null))
-				or (voucher_type not in ('Journal Entry', 'Payment Entry')))
-		group by voucher_type, voucher_no
-		order by posting_date, name""".format(
-			dr_or_cr=dr_or_cr,
-			condition=condition or ""
-		), {
-			"party_type": party_type,
-			"party": party,
-			"account": account,
-		}, as_dict=True)
-
-	payment_entries = frappe.db.sql("""
-		select against_voucher_type, against_voucher,
-			ifnull(sum({payment_dr_or_cr}), 0) as payment_amount
-		from `tabGL Entry`
-		where party_type = %(party_type)s and party = %(party)s
-			and account = %(account)s
-			and {payment_dr_or_cr} > 0
-			and against_voucher is not null and against_voucher != ''
-			and is_cancelled=0
-		group by against_voucher_type, against_voucher
-	""".format(payment_dr_or_cr=payment_dr_or_cr), {
-		"party_type": party_type,
-		"party": party,
-		"account": account
-	}, as_dict=True)
-
-	pe_map = frappe._dict()
-	for d in payment_entries:
-		pe_map.setdefault((d.against_voucher_type, d.against_voucher), d.payment_amount)
+	# open vouchers are read from the outstanding ledger maintained on GL posting and cancellation
+	invoice_list = get_open_vouchers(party_type, party, account, condition)
 
 	for d in invoice_list:
-		payment_amount = pe_map.get((d.voucher_type, d.voucher_no), 0)
+		payment_amount = flt(d.payment_amount)
 		outstanding_amount = flt(d.invoice_amount - payment_amount, precision)
 		if outstanding_amount > 0.5 / (10**precision):
 			if (filters and filters.get("outstanding_amt_greater_than") and
@@ -924,6 +882,8 @@ def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for
 
 def repost_gle_for_stock_vouchers(stock_vouchers, posting_date, company=None, warehouse_account=None):
 	def _delete_gl_entries(voucher_type, voucher_no):
+		remove_voucher_from_account_balance_snapshot(voucher_type, voucher_no)
+		remove_voucher_from_voucher_outstanding(voucher_type, voucher_no)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
 
@@ -18,6 +18,8 @@ from erpnext.controllers.accounts_controller import (
 )
 from erpnext.stock.get_item_details import _get_item_tax_template
 
+# documents with more items than this compute their taxes one tax row at a time
+COLUMNWISE_TAX_THRESHOLD = 100
 
 class calculate_taxes_and_totals(object):
 	def __init__(self, doc):
@@ -281,6 +283,10 @@ class calculate_taxes_and_totals(object):
 		if not rounding_adjustment_computed:
 			self.doc.rounding_adjustment = 0
 
+		if len(self.doc.get("items")) > COLUMNWISE_TAX_THRESHOLD:
+			self.calculate_taxes_columnwise(rounding_adjustment_computed)
+			return
+
 		# maintain actual tax rate based on idx
 		actual_tax_dict = dict([[tax.idx, flt(tax.tax_amount, tax.precision("tax_amount"))]
 			for tax in self.doc.get("taxes") if tax.charge_type == "Actual"])
@@ -321,23 +327,106 @@ class calculate_taxes_and_totals(object):
 
 				# set precision in the last item iteration
 				if n == len(self.doc.get("items")) - 1:
-					self.round_off_totals(tax)
-					self._set_in_company_currency(tax,
-						["tax_amount", "tax_amount_after_discount_amount"])
-
-					self.round_off_base_values(tax)
-					self.set_cumulative_total(i, tax)
-
-					self._set_in_company_currency(tax, ["total"])
-
-					# adjust Discount Amount loss in last tax iteration
-					if i == (len(self.doc.get("taxes")) - 1) and self.discount_amount_applied \
-						and self.doc.discount_amount \
-						and self.doc.apply_discount_on == "Grand Total" \
-						and not rounding_adjustment_computed:
-							self.doc.rounding_adjustment = flt(self.doc.grand_total
-								- flt(self.doc.discount_amount) - tax.total,
-								self.doc.precision("rounding_adjustment"))
+					self.set_tax_totals(i, tax, rounding_adjustment_computed)
+
+	def calculate_taxes_columnwise(self, rounding_adjustment_computed):
+		"""
+			Same calculation as the item-wise loop in `calculate_taxes`, but each tax row is computed
+			for all items before the next one. Item tax maps and rates are resolved once per distinct
+			`item_tax_rate` instead of once per item and tax.
+
+			Amounts are still accumulated in item order, so the results are exactly the same.
+		"""
+		items = self.doc.get("items")
+		last_item = len(items) - 1
+		accumulate_tax_amount = not (self.discount_amount_applied and self.doc.apply_discount_on=="Grand Total")
+
+		# index of the distinct item tax map of each item
+		item_tax_maps, item_tax_map_idx = {}, []
+		for item in items:
+			item_tax_map_idx.append(item_tax_maps.setdefault(item.item_tax_rate or "", len(item_tax_maps)))
+
+		item_tax_maps = [self._load_item_tax_rate(d) for d in item_tax_maps]
+
+		# tax_amount_for_current_item and grand_total_for_current_item of each tax row, for every item
+		tax_amounts, grand_totals = [], []
+
+		for i, tax in enumerate(self.doc.get("taxes")):
+			rates = [self._get_tax_rate(tax, d) for d in item_tax_maps]
+			tax_rates = [rates[idx] for idx in item_tax_map_idx]
+			set_item_wise_tax = not (self.doc.get("is_consolidated") or tax.get("dont_recompute_tax"))
+
+			actual = remaining_actual = flt(tax.tax_amount, tax.precision("tax_amount"))
+			if tax.charge_type in ("On Previous Row Amount", "On Previous Row Total"):
+				previous_row = (tax_amounts if tax.charge_type == "On Previous Row Amount"
+					else grand_totals)[cint(tax.row_id) - 1]
+
+			current_tax_amounts, grand_total_for_items = [], []
+			tax_amount, tax_amount_after_discount_amount = tax.tax_amount, tax.tax_amount_after_discount_amount
+
+			for n, item in enumerate(items):
+				tax_rate = tax_rates[n]
+				current_tax_amount = 0.0
+
+				if tax.charge_type == "Actual":
+					current_tax_amount = item.net_amount*actual / self.doc.net_total if self.doc.net_total else 0.0
+				elif tax.charge_type == "On Net Total":
+					current_tax_amount = (tax_rate / 100.0) * item.net_amount
+				elif tax.charge_type in ("On Previous Row Amount", "On Previous Row Total"):
+					current_tax_amount = (tax_rate / 100.0) * previous_row[n]
+				elif tax.charge_type == "On Item Quantity":
+					current_tax_amount = tax_rate * item.qty
+
+				if set_item_wise_tax:
+					self.set_item_wise_tax(item, tax, tax_rate, current_tax_amount)
+
+				# Adjust divisional loss to the last item
+				if tax.charge_type == "Actual":
+					remaining_actual -= current_tax_amount
+					if n == last_item:
+						current_tax_amount += remaining_actual
+
+				if tax.charge_type != "Actual" and accumulate_tax_amount:
+					tax_amount += current_tax_amount
+
+				tax_amount_after_discount_amount += current_tax_amount
+				current_tax_amounts.append(current_tax_amount)
+
+				current_tax_amount = self.get_tax_amount_if_for_valuation_or_deduction(current_tax_amount, tax)
+
+				if i==0:
+					grand_total_for_items.append(flt(item.net_amount + current_tax_amount))
+				else:
+					grand_total_for_items.append(flt(grand_totals[i-1][n] + current_tax_amount))
+
+			tax_amounts.append(current_tax_amounts)
+			grand_totals.append(grand_total_for_items)
+
+			tax.tax_amount = tax_amount
+			tax.tax_amount_after_discount_amount = tax_amount_after_discount_amount
+			tax.tax_amount_for_current_item = current_tax_amounts[-1]
+			tax.grand_total_for_current_item = grand_total_for_items[-1]
+
+			self.set_tax_totals(i, tax, rounding_adjustment_computed)
+
+	def set_tax_totals(self, row_idx, tax, rounding_adjustment_computed):
+		self.round_off_totals(tax)
+		self._set_in_company_currency(tax,
+			["tax_amount", "tax_amount_after_discount_amount"])
+
+		self.round_off_base_values(tax)
+		self.set_cumulative_total(row_idx, tax)
+
+		self._set_in_company_currency(tax, ["total"])
+
+		# adjust Discount Amount loss in last tax iteration
+		if row_idx == (len(self.doc.get("taxes")) - 1) and self.discount_amount_applied \
+			and self.doc.discount_amount \
+			and self.doc.apply_discount_on == "Grand Total" \
+			and not rounding_adjustment_computed:
+				self.doc.rounding_adjustment = flt(self.doc.grand_total
+					- flt(self.doc.discount_amount) - tax.total,
+					self.doc.precision("rounding_adjustment"))
 
 	def get_tax_amount_if_for_valuation_or_deduction(self, tax_amount, tax):
 		# if just for valuation, do not add the tax amount in total
@@ -0,0 +1,89 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.controllers import taxes_and_totals
+from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
+
+TAX_FIELDS = ["tax_amount", "base_tax_amount", "tax_amount_after_discount_amount",
+	"base_tax_amount_after_discount_amount", "total", "base_total", "item_wise_tax_detail"]
+TOTAL_FIELDS = ["net_total", "total_taxes_and_charges", "grand_total", "base_grand_total",
+	"rounding_adjustment", "rounded_total", "discount_amount"]
+
+
+class TestTaxesAndTotals(unittest.TestCase):
+	def test_columnwise_taxes_for_all_charge_types(self):
+		self.assert_same_taxes(make_invoice(rows=150))
+
+	def test_columnwise_taxes_with_inclusive_taxes(self):
+		si = make_invoice(rows=150)
+		for tax in si.taxes:
+			if tax.charge_type != "Actual":
+				tax.included_in_print_rate = 1
+
+		self.assert_same_taxes(si)
+
+	def test_columnwise_taxes_with_discount_on_grand_total(self):
+		si = make_invoice(rows=150)
+		si.apply_discount_on = "Grand Total"
+		si.additional_discount_percentage = 7.5
+
+		self.assert_same_taxes(si)
+
+	def test_columnwise_taxes_with_conversion_rate(self):
+		si = make_invoice(rows=150, currency="USD", conversion_rate=63.37)
+		self.assert_same_taxes(si)
+
+	def assert_same_taxes(self, si):
+		expected = get_calculated_values(si, threshold=len(si.items))
+		self.assertEqual(get_calculated_values(si, threshold=0), expected)
+
+
+def make_invoice(rows, currency="INR", conversion_rate=1):
+	si = create_sales_invoice(do_not_save=True, currency=currency, conversion_rate=conversion_rate,
+		qty=3, rate=17.33)
+
+	item_tax_rates = [
+		"",
+		json.dumps({"_Test Account VAT - _TC": 3.333}),
+		json.dumps({"_Test Account Service Tax - _TC": 0, "_Test Account VAT - _TC": 11.11}),
+	]
+
+	for i in range(1, rows):
+		row = frappe.copy_doc(si.items[0])
+		row.qty = (i % 7) + 0.5
+		row.rate = row.price_list_rate = 9.99 + (i % 13) * 1.37
+		row.item_tax_rate = item_tax_rates[i % 3]
+		si.append("items", row)
+
+	taxes = [
+		{"charge_type": "On Net Total", "account_head": "_Test Account VAT - _TC", "rate": 12.5},
+		{"charge_type": "Actual", "account_head": "_Test Account Shipping Charges - _TC", "tax_amount": 101.17},
+		{"charge_type": "On Previous Row Amount", "account_head": "_Test Account Service Tax - _TC",
+			"rate": 2.07, "row_id": 1},
+		{"charge_type": "On Previous Row Total", "account_head": "_Test Account Excise Duty - _TC",
+			"rate": 1.01, "row_id": 3},
+		{"charge_type": "On Item Quantity", "account_head": "_Test Account Customs Duty - _TC", "rate": 0.73},
+	]
+	for tax in taxes:
+		tax.update({
+			"cost_center": "Main - _TC",
+			"description": tax["account_head"]
+		})
+		si.append("taxes", tax)
+
+	return si
+
+def get_calculated_values(si, threshold):
+	doc = frappe.copy_doc(si)
+	with patch.object(taxes_and_totals, "COLUMNWISE_TAX_THRESHOLD", threshold):
+		calculate_taxes_and_totals(doc)
+
+	return {
+		"totals": [doc.get(field) for field in TOTAL_FIELDS],
+		"taxes": [[tax.get(field) for field in TAX_FIELDS] for tax in doc.taxes],
+		"items": [[item.net_rate, item.net_amount, item.base_net_amount] for item in doc.items]
+	}
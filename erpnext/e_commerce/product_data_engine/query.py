@@ -2,10 +2,13 @@
 # License: GNU General Public License v3. See license.txt
 
 import frappe
-from frappe.utils import flt
+from frappe.utils import cint, flt
 
 from erpnext.e_commerce.doctype.item_review.item_review import get_customer
-from erpnext.e_commerce.shopping_cart.product_info import get_product_info_for_website
+from erpnext.e_commerce.shopping_cart.product_info import (
+	get_website_item_discounts,
+	get_website_item_prices,
+)
 from erpnext.utilities.product import get_non_stock_item_status
 
 
@@ -54,6 +57,8 @@ class ProductQuery:
 			self.build_search_filters(search_term)
 		if self.settings.hide_variants:
 			self.filters.append(["variant_of", "is", "not set"])
+		if self.filter_with_discount:
+			self.build_discount_filters(fields["discount"])
 
 		# query results
 		if attributes:
@@ -83,30 +88,22 @@ class ProductQuery:
 
 	def query_items(self, start=0):
 		"""Build a query to fetch Website Items based on field filters."""
-		# MySQL does not support offset without limit,
-		# frappe does not accept two parameters for limit
-		# https://dev.mysql.com/doc/refman/8.0/en/select.html#id4651989
-		count_items = frappe.db.get_all(
+		# count of items from this offset, to know if there are more pages ahead
+		total = frappe.db.get_all(
 			"Website Item",
+			fields=["count(distinct `tabWebsite Item`.name) as count"],
 			filters=self.filters,
-			or_filters=self.or_filters,
-			limit_page_length=184467440737095516,
-			limit_start=start, # get all items from this offset for total count ahead
-			order_by="ranking desc")
-		count = len(count_items)
-
-		# If discounts included, return all rows.
-		# Slice after filtering rows with discount (See `filter_results_by_discount`).
-		# Slicing before hand will miss discounted items on the 3rd or 4th page.
-		# Discounts are fetched on computing Pricing Rules so we cannot query them directly.
-		page_length = 184467440737095516 if self.filter_with_discount else self.page_length
+			or_filters=self.or_filters)[0].count
+		count = max(cint(total) - cint(start), 0)
 
+		# Discount filters are applied before paging (See `build_discount_filters`),
+		# so only the requested page is fetched.
 		items = frappe.db.get_all(
 			"Website Item",
 			fields=self.fields,
 			filters=self.filters,
 			or_filters=self.or_filters,
-			limit_page_length=page_length,
+			limit_page_length=self.page_length,
 			limit_start=start,
 			order_by="ranking desc")
 
@@ -184,6 +181,19 @@ class ProductQuery:
 
 		self.or_filters.extend(item_group_filters)
 
+	def build_discount_filters(self, discounts):
+		"""Filter items with a discount up to the selected discount, from the cached discount index
+
+		Args:
+			discounts (list): Selected discount filters
+		"""
+		discount_percent = flt(discounts[0])
+		item_codes = [item_code for item_code, discount in get_website_item_discounts().items()
+			if discount <= discount_percent]
+
+		# no item matches if none is discounted
+		self.filters.append(["item_code", "in", item_codes or [""]])
+
 	def build_search_filters(self, search_term):
 		"""Query search term in specified fields
 
@@ -209,21 +219,24 @@ class ProductQuery:
 
 	def add_display_details(self, result, discount_list, cart_items):
 		"""Add price and availability details in result."""
-		for item in result:
-			product_info = get_product_info_for_website(item.item_code, skip_quotation_creation=True).get('product_info')
+		item_codes = [item.item_code for item in result]
 
-			if product_info and product_info['price']:
+		# prices, stock and wishlist are looked up once for the whole page
+		prices = get_website_item_prices(item_codes)
+		bin_qty = self.get_bin_qty(result) if self.settings.show_stock_availability else {}
+		wished_items = self.get_wished_items(item_codes)
+
+		for item in result:
+			price = prices.get(item.item_code)
+			if price:
 				# update/mutate item and discount_list objects
-				self.get_price_discount_info(item, product_info['price'], discount_list)
+				self.get_price_discount_info(item, price, discount_list)
 
 			if self.settings.show_stock_availability:
-				self.get_stock_availability(item)
+				self.get_stock_availability(item, bin_qty)
 
 			item.in_cart = item.item_code in cart_items
-
-			item.wished = False
-			if frappe.db.exists("Wishlist Item", {"item_code": item.item_code, "parent": frappe.session.user}):
-				item.wished = True
+			item.wished = item.item_code in wished_items
 
 		return result, discount_list
 
@@ -241,7 +254,7 @@ class ProductQuery:
 			item.discount = price_object.get('formatted_discount_percent') or \
 				price_object.get('formatted_discount_rate')
 
-	def get_stock_availability(self, item):
+	def get_stock_availability(self, item, bin_qty):
 		"""Modify item object and add stock details."""
 		item.in_stock = False
 		warehouse = item.get("website_warehouse")
@@ -258,12 +271,32 @@ class ProductQuery:
 				item.in_stock = True
 		elif warehouse:
 			# stock item and has warehouse
-			actual_qty = frappe.db.get_value(
-				"Bin",
-				{"item_code": item.item_code,"warehouse": item.get("website_warehouse")},
-				"actual_qty")
+			actual_qty = bin_qty.get((item.item_code, warehouse))
 			item.in_stock = bool(flt(actual_qty))
 
+	def get_bin_qty(self, result):
+		"""Returns actual qty per (item_code, warehouse) of the items in result."""
+		item_codes = [item.item_code for item in result if item.get("website_warehouse")]
+		if not item_codes:
+			return {}
+
+		bins = frappe.get_all("Bin",
+			fields=["item_code", "warehouse", "actual_qty"],
+			filters={
+				"item_code": ("in", item_codes),
+				"warehouse": ("in", list({item.website_warehouse for item in result if item.get("website_warehouse")}))
+			})
+
+		return {(d.item_code, d.warehouse): d.actual_qty for d in bins}
+
+	def get_wished_items(self, item_codes):
+		if not item_codes:
+			return set()
+
+		return set(frappe.get_all("Wishlist Item",
+			filters={"item_code": ("in", item_codes), "parent": frappe.session.user},
+			pluck="item_code"))
+
 	def get_cart_items(self):
 		customer = get_customer(silent=True)
 		if customer:
@@ -287,9 +320,4 @@ class ProductQuery:
 			discount_percent = frappe.utils.flt(fields["discount"][0])
 			result = [row for row in result if row.get("discount_percent") and row.discount_percent <= discount_percent]
 
-		if self.filter_with_discount:
-			# no limit was added to results while querying
-			# slice results manually
-			result[:self.page_length]
-
 		return result
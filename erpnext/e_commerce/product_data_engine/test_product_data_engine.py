@@ -276,6 +276,46 @@ class TestProductDataEngine(unittest.TestCase):
 		self.assertEqual(len(items), 1)
 		self.assertEqual(items[0].get("item_code"), "Test 12I Laptop")
 
+	def test_product_list_count_with_discount_filters(self):
+		"Test if discount filters are applied before paging and counted."
+		from erpnext.e_commerce.doctype.website_item.test_website_item import (
+			make_web_item_price,
+			make_web_pricing_rule,
+		)
+		from erpnext.e_commerce.shopping_cart.product_info import WEBSITE_ITEM_DISCOUNTS_KEY
+
+		for item_code, discount in (("Test 11I Laptop", 10), ("Test 12I Laptop", 10), ("Test 13I Laptop", 15)):
+			make_web_item_price(item_code=item_code)
+			make_web_pricing_rule(
+				title=f"Test Pricing Rule for {item_code}",
+				item_code=item_code,
+				discount_percentage=discount,
+				selling=1
+			)
+
+		setup_e_commerce_settings({"show_price": 1, "products_per_page": 1})
+		frappe.local.shopping_cart_settings = None
+		frappe.cache().delete_value(WEBSITE_ITEM_DISCOUNTS_KEY)
+
+		engine = ProductQuery()
+		result = engine.query(
+			attributes={},
+			fields={"discount": [10]},
+			search_term=None,
+			start=1,
+			item_group=None
+		)
+		items = result.get("items")
+
+		# discounted items on later pages are found, the count is of discounted items after `start`
+		self.assertEqual(len(items), 1)
+		self.assertEqual(items[0].get("item_code"), "Test 11I Laptop")
+		self.assertEqual(result.get("items_count"), 1)
+
+		# tear down
+		setup_e_commerce_settings({"products_per_page": 4})
+		frappe.local.shopping_cart_settings = None
+
 	def test_product_list_with_api(self):
 		"Test products listing using API."
 		from erpnext.e_commerce.api import get_product_filter_data
@@ -2,18 +2,23 @@
 # License: GNU General Public License v3. See license.txt
 
 import frappe
+from frappe.utils import flt, nowdate
 
 from erpnext.e_commerce.doctype.e_commerce_settings.e_commerce_settings import (
 	get_shopping_cart_settings,
 	show_quantity_in_website,
 )
-from erpnext.e_commerce.shopping_cart.cart import _get_cart_quotation, _set_price_list
+from erpnext.e_commerce.shopping_cart.cart import _get_cart_quotation, _set_price_list, get_party
 from erpnext.utilities.product import (
 	get_non_stock_item_status,
 	get_price,
+	get_prices,
 	get_web_item_qty_in_stock,
 )
 
+# discount percent of every discounted published item, per price list and party
+WEBSITE_ITEM_DISCOUNTS_KEY = "website_item_discounts"
+
 
 @frappe.whitelist(allow_guest=True)
 def get_product_info_for_website(item_code, skip_quotation_creation=False):
@@ -95,3 +100,60 @@ def set_product_info_for_website(item):
 		else:
 			item["price_stock_uom"] = ""
 			item["price_sales_uom"] = ""
+
+def get_website_item_prices(item_codes):
+	"""Prices of `item_codes` for product listings, shown under the same settings as `get_product_info_for_website`"""
+	cart_settings, selling_price_list, party = get_listing_price_list()
+	if not selling_price_list:
+		return {}
+
+	return get_prices(item_codes, selling_price_list, cart_settings.default_customer_group,
+		cart_settings.company, party=party)
+
+def get_website_item_discounts():
+	"""
+		Returns {item_code: discount_percent} of published Website Items with a discount for the current user.
+
+		The index is cached per price list and party, and rebuilt when Pricing Rules, Item Prices of
+		the price list or Website Items change, or on a new day as Pricing Rules have validity dates.
+	"""
+	cart_settings, selling_price_list, party = get_listing_price_list()
+	if not selling_price_list:
+		return {}
+
+	stamp = (nowdate(),) + tuple(frappe.db.sql("""
+		select
+			(select count(*) from `tabPricing Rule`),
+			(select max(modified) from `tabPricing Rule`),
+			(select count(*) from `tabItem Price` where price_list = %(price_list)s),
+			(select max(modified) from `tabItem Price` where price_list = %(price_list)s),
+			(select count(*) from `tabWebsite Item`),
+			(select max(modified) from `tabWebsite Item`)
+	""", {"price_list": selling_price_list})[0])
+
+	key = "{0}:{1}".format(selling_price_list, party.name)
+	cached = frappe.cache().hget(WEBSITE_ITEM_DISCOUNTS_KEY, key)
+	if cached and cached.get("stamp") == stamp:
+		return cached.get("discounts")
+
+	item_codes = frappe.get_all("Website Item", filters={"published": 1}, pluck="item_code")
+	prices = get_prices(item_codes, selling_price_list, cart_settings.default_customer_group,
+		cart_settings.company, party=party)
+
+	discounts = {item_code: flt(price.discount_percent) for item_code, price in prices.items()
+		if price.get("discount_percent")}
+
+	frappe.cache().hset(WEBSITE_ITEM_DISCOUNTS_KEY, key, {"stamp": stamp, "discounts": discounts})
+
+	return discounts
+
+def get_listing_price_list():
+	"""Returns (cart settings, selling price list, party), without a price list if prices are hidden"""
+	cart_settings = get_shopping_cart_settings()
+	if not (cart_settings.enabled and cart_settings.show_price):
+		return cart_settings, None, None
+
+	if frappe.session.user == "Guest" and cart_settings.hide_price_for_guest:
+		return cart_settings, None, None
+
+	return cart_settings, _set_price_list(cart_settings, None), get_party()
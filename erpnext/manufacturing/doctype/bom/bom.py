@@ -18,6 +18,11 @@ from erpnext.setup.utils import get_exchange_rate
 from erpnext.stock.doctype.item.item import get_item_details
 from erpnext.stock.get_item_details import get_conversion_factor, get_price_list_rate
 
+# Flat BOMs of submitted BOMs and the exploded items used in production planning
+BOM_EXPLOSION_CACHE_KEY = "bom_explosion"
+# seconds after which the whole cache is dropped, even if it was not cleared
+BOM_EXPLOSION_CACHE_TTL = 6 * 60 * 60
+
 form_grid_templates = {
 	"items": "templates/form_grid/item_grid.html"
 }
@@ -166,6 +171,7 @@ class BOM(WebsiteGenerator):
 
 	def on_submit(self):
 		self.manage_default_bom()
+		clear_bom_explosion_cache()
 
 	def on_cancel(self):
 		frappe.db.set(self, "is_active", 0)
@@ -174,10 +180,12 @@ class BOM(WebsiteGenerator):
 		# check if used in any other bom
 		self.validate_bom_links()
 		self.manage_default_bom()
+		clear_bom_explosion_cache()
 
 	def on_update_after_submit(self):
 		self.validate_bom_links()
 		self.manage_default_bom()
+		clear_bom_explosion_cache()
 
 	def get_item_det(self, item_code):
 		item = get_item_details(item_code)
@@ -341,7 +349,7 @@ class BOM(WebsiteGenerator):
 
 		if self.docstatus == 1:
 			self.flags.ignore_validate_update_after_submit = True
-			self.calculate_cost(update_hour_rate)
+			self.calculate_cost(update_hour_rate, save=save)
 		if save:
 			self.db_update()
 
@@ -506,21 +514,21 @@ class BOM(WebsiteGenerator):
 		bom_list.reverse()
 		return bom_list
 
-	def calculate_cost(self, update_hour_rate = False):
+	def calculate_cost(self, update_hour_rate = False, save=True):
 		"""Calculate bom totals"""
-		self.calculate_op_cost(update_hour_rate)
+		self.calculate_op_cost(update_hour_rate, save=save)
 		self.calculate_rm_cost()
 		self.calculate_sm_cost()
 		self.total_cost = self.operating_cost + self.raw_material_cost - self.scrap_material_cost
 		self.base_total_cost = self.base_operating_cost + self.base_raw_material_cost - self.base_scrap_material_cost
 
-	def calculate_op_cost(self, update_hour_rate = False):
+	def calculate_op_cost(self, update_hour_rate = False, save=True):
 		"""Update workstation rate and calculates totals"""
 		self.operating_cost = 0
 		self.base_operating_cost = 0
 		for d in self.get('operations'):
 			if d.workstation:
-				self.update_rate_and_time(d, update_hour_rate)
+				self.update_rate_and_time(d, update_hour_rate, save=save)
 
 			operating_cost = d.operating_cost
 			base_operating_cost = d.base_operating_cost
@@ -531,7 +539,7 @@ class BOM(WebsiteGenerator):
 			self.operating_cost += flt(operating_cost)
 			self.base_operating_cost += flt(base_operating_cost)
 
-	def update_rate_and_time(self, row, update_hour_rate = False):
+	def update_rate_and_time(self, row, update_hour_rate = False, save=True):
 		if not row.hour_rate or update_hour_rate:
 			hour_rate = flt(frappe.get_cached_value("Workstation", row.workstation, "hour_rate"))
 
@@ -546,7 +554,7 @@ class BOM(WebsiteGenerator):
 			row.cost_per_unit = row.operating_cost / (row.batch_size or 1.0)
 			row.base_cost_per_unit = row.base_operating_cost / (row.batch_size or 1.0)
 
-		if update_hour_rate:
+		if update_hour_rate and save:
 			row.db_update()
 
 	def calculate_rm_cost(self):
@@ -627,26 +635,11 @@ class BOM(WebsiteGenerator):
 
 	def get_child_exploded_items(self, bom_no, stock_qty):
 		""" Add all items from Flat BOM of child BOM"""
-		# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
-		child_fb_items = frappe.db.sql("""
-			SELECT
-				bom_item.item_code,
-				bom_item.item_name,
-				bom_item.description,
-				bom_item.source_warehouse,
-				bom_item.operation,
-				bom_item.stock_uom,
-				bom_item.stock_qty,
-				bom_item.rate,
-				bom_item.include_item_in_manufacturing,
-				bom_item.sourced_by_supplier,
-				bom_item.stock_qty / ifnull(bom.quantity, 1) AS qty_consumed_per_unit
-			FROM `tabBOM Explosion Item` bom_item, tabBOM bom
-			WHERE
-				bom_item.parent = bom.name
-				AND bom.name = %s
-				AND bom.docstatus = 1
-		""", bom_no, as_dict = 1)
+		if self.flags.child_exploded_items is not None:
+			# loaded for many BOMs at once by `get_exploded_items_of_boms`
+			child_fb_items = self.flags.child_exploded_items.get(bom_no, [])
+		else:
+			child_fb_items = get_exploded_items_of_boms([bom_no]).get(bom_no, [])
 
 		for d in child_fb_items:
 			self.add_to_cur_exploded_items(frappe._dict({
@@ -668,6 +661,7 @@ class BOM(WebsiteGenerator):
 
 		if save:
 			frappe.db.sql("""delete from `tabBOM Explosion Item` where parent=%s""", self.name)
+			clear_bom_explosion_cache()
 
 		for d in sorted(self.cur_exploded_items, key=itemgetter(0)):
 			ch = self.append('exploded_items', {})
@@ -955,32 +949,133 @@ def get_children(parent=None, is_root=False, **filters):
 
 		return bom_items
 
+def get_exploded_items_of_boms(boms):
+	"""
+		Returns the Flat BOM items of submitted `boms` as a dict of BOM -> list of items.
+		Flat BOMs are cached until a BOM is submitted, cancelled, updated or replaced.
+	"""
+	exploded_items = {}
+	missing_boms = []
+	for bom in set(boms):
+		items = frappe.cache().hget(BOM_EXPLOSION_CACHE_KEY, "exploded_items::" + bom)
+		if items is None:
+			missing_boms.append(bom)
+		else:
+			exploded_items[bom] = items
+
+	if not missing_boms:
+		return exploded_items
+
+	# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
+	missing_items = {bom: [] for bom in missing_boms}
+	for d in frappe.db.sql("""
+		SELECT
+			bom_item.parent,
+			bom_item.item_code,
+			bom_item.item_name,
+			bom_item.description,
+			bom_item.source_warehouse,
+			bom_item.operation,
+			bom_item.stock_uom,
+			bom_item.stock_qty,
+			bom_item.rate,
+			bom_item.include_item_in_manufacturing,
+			bom_item.sourced_by_supplier,
+			bom_item.stock_qty / ifnull(bom.quantity, 1) AS qty_consumed_per_unit
+		FROM `tabBOM Explosion Item` bom_item, tabBOM bom
+		WHERE
+			bom_item.parent = bom.name
+			AND bom.name in %s
+			AND bom.docstatus = 1
+		ORDER BY bom_item.parent, bom_item.idx
+	""", [missing_boms], as_dict = 1):
+		missing_items[d.parent].append(d)
+
+	for bom, items in missing_items.items():
+		set_bom_explosion_cache("exploded_items::" + bom, items)
+		exploded_items[bom] = items
+
+	return exploded_items
+
+def set_bom_explosion_cache(key, value):
+	cache = frappe.cache()
+	cache.hset(BOM_EXPLOSION_CACHE_KEY, key, value)
+
+	name = cache.make_key(BOM_EXPLOSION_CACHE_KEY)
+	if cache.ttl(name) < 0:
+		cache.expire(name, BOM_EXPLOSION_CACHE_TTL)
+
+def clear_bom_explosion_cache():
+	"""
+		Clear the cache for the current transaction, and again once it is committed,
+		as other transactions may cache the old BOMs until then.
+	"""
+	delete_bom_explosion_cache()
+	frappe.enqueue("erpnext.manufacturing.doctype.bom.bom.delete_bom_explosion_cache",
+		queue="short", enqueue_after_commit=True)
+
+def delete_bom_explosion_cache():
+	frappe.cache().delete_key(BOM_EXPLOSION_CACHE_KEY)
+
 def get_boms_in_bottom_up_order(bom_no=None):
-	def _get_parent(bom_no):
-		return frappe.db.sql_list("""
-			select distinct bom_item.parent from `tabBOM Item` bom_item
-			where bom_item.bom_no = %s and bom_item.docstatus=1 and bom_item.parenttype='BOM'
-				and exists(select bom.name from `tabBOM` bom where bom.name=bom_item.parent and bom.is_active=1)
-		""", bom_no)
-
-	count = 0
-	bom_list = []
+	return [bom for level in get_bom_levels(bom_no) for bom in level]
+
+def get_bom_levels(bom_no=None, include_drafts=False):
+	"""
+		Returns active submitted BOMs grouped in levels, every BOM is in a later level
+		than all of its child BOMs, so the BOMs of one level can be processed independently.
+
+		If `bom_no` is set, only that BOM and the BOMs using it (directly or through
+		other BOMs) are returned.
+		If `include_drafts` is set, draft and inactive BOMs are included as well.
+	"""
+	bom_filters = {"docstatus": ("<", 2)} if include_drafts else {"docstatus": 1, "is_active": 1}
+	boms = set(frappe.get_all("BOM", filters=bom_filters, pluck="name"))
 	if bom_no:
-		bom_list.append(bom_no)
-	else:
-		# get all leaf BOMs
-		bom_list = frappe.db.sql_list("""select name from `tabBOM` bom
-			where docstatus=1 and is_active=1
-				and not exists(select bom_no from `tabBOM Item`
-					where parent=bom.name and ifnull(bom_no, '')!='')""")
-
-	while(count < len(bom_list)):
-		for child_bom in _get_parent(bom_list[count]):
-			if child_bom not in bom_list:
-				bom_list.append(child_bom)
-		count += 1
-
-	return bom_list
+		boms.add(bom_no)
+
+	children, parents = {}, {}
+	for parent, child in frappe.db.sql("""
+		select distinct parent, bom_no from `tabBOM Item`
+		where docstatus {0} and parenttype = 'BOM' and ifnull(bom_no, '') != ''
+	""".format("< 2" if include_drafts else "= 1")):
+		if parent in boms and child in boms and parent != child:
+			children.setdefault(parent, set()).add(child)
+			parents.setdefault(child, set()).add(parent)
+
+	if bom_no:
+		selected, to_visit = {bom_no}, [bom_no]
+		while to_visit:
+			for parent in parents.get(to_visit.pop(), ()):
+				if parent not in selected:
+					selected.add(parent)
+					to_visit.append(parent)
+		boms = selected
+
+	# number of child BOMs not yet placed in a level
+	pending = {bom: len(children.get(bom, set()) & boms) for bom in boms}
+
+	levels = []
+	level = sorted(bom for bom, count in pending.items() if not count)
+	while level:
+		levels.append(level)
+
+		next_level = []
+		for bom in level:
+			for parent in parents.get(bom, ()):
+				if parent in pending:
+					pending[parent] -= 1
+					if not pending[parent]:
+						next_level.append(parent)
+
+		level = sorted(next_level)
+
+	# BOMs in a recursion can not be ordered, process them after the others
+	unordered = sorted(bom for bom, count in pending.items() if count)
+	if unordered:
+		levels.append(unordered)
+
+	return levels
 
 def add_additional_cost(stock_entry, work_order):
 	# Add non stock items cost in the additional cost
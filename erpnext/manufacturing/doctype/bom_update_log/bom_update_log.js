@@ -0,0 +1,20 @@
+// Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('BOM Update Log', {
+	refresh: function(frm) {
+		if (frm.doc.status != "Completed") {
+			frm.add_custom_button(__('Resume'), function() {
+				frappe.call({
+					method: "erpnext.manufacturing.doctype.bom_update_log.bom_update_log.resume_bom_update",
+					args: {
+						log_name: frm.doc.name
+					},
+					callback: function() {
+						frm.reload_doc();
+					}
+				});
+			});
+		}
+	}
+});
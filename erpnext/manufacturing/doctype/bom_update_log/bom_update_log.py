@@ -0,0 +1,133 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import cint, cstr
+from frappe.utils.background_jobs import get_jobs
+
+from erpnext.manufacturing.doctype.bom.bom import clear_bom_explosion_cache, get_bom_levels
+from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import (
+	BOM_COST_UPDATE_CHUNK_SIZE,
+	get_bom_docs,
+	get_new_bom_unit_cost,
+	update_parent_bom_item_rates,
+	write_bom_costs,
+)
+
+
+class BOMUpdateLog(Document):
+	def replace_bom(self, commit=False):
+		"""
+			Replace `current_bom` by `new_bom` and update the costs and Flat BOMs of all BOMs above it.
+
+			BOMs are processed level by level in chunks and the progress is saved after each chunk.
+			With `commit`, each chunk is committed, so a failed replacement continues after the last
+			completed chunk.
+		"""
+		if not self.bom_levels:
+			self.start_replacement(commit=commit)
+		else:
+			self.db_set("status", "In Progress")
+
+		processed_boms = cint(self.processed_boms)
+		for chunk in get_pending_chunks(json.loads(self.bom_levels), processed_boms):
+			rebuild_boms(chunk)
+
+			processed_boms += len(chunk)
+			self.db_set("processed_boms", processed_boms)
+			if commit:
+				frappe.db.commit()
+
+		self.db_set("status", "Completed")
+
+	def start_replacement(self, commit=False):
+		# BOMs using the current BOM, directly or through other BOMs, would use the new BOM
+		if self.new_bom in {bom for level in get_bom_levels(self.current_bom, include_drafts=True)
+			for bom in level}:
+			frappe.throw(_("BOM recursion: {0} cannot be child of {1}").format(self.current_bom, self.new_bom))
+
+		unit_cost = get_new_bom_unit_cost(self.new_bom)
+		frappe.db.sql("""update `tabBOM Item` set bom_no=%s,
+			rate=%s, amount=stock_qty*%s where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
+			(self.new_bom, unit_cost, unit_cost, self.current_bom))
+
+		frappe.cache().delete_key('bom_children')
+		clear_bom_explosion_cache()
+
+		# the new BOM itself does not change
+		levels = get_bom_levels(self.new_bom, include_drafts=True)[1:]
+
+		self.db_set({
+			"bom_levels": json.dumps(levels),
+			"total_boms": sum(len(level) for level in levels),
+			"processed_boms": 0,
+			"status": "In Progress"
+		})
+		if commit:
+			frappe.db.commit()
+
+def get_pending_chunks(levels, processed_boms):
+	"""Chunks of the BOMs not processed yet, in level order. A chunk never spans two levels."""
+	for level in levels:
+		if processed_boms >= len(level):
+			processed_boms -= len(level)
+			continue
+
+		for start in range(processed_boms, len(level), BOM_COST_UPDATE_CHUNK_SIZE):
+			yield level[start:start + BOM_COST_UPDATE_CHUNK_SIZE]
+
+		processed_boms = 0
+
+def rebuild_boms(boms):
+	"""Recalculate Flat BOM and cost of `boms`, and pass their unit cost to the BOMs using them"""
+	bom_docs = get_bom_docs(boms)
+	for bom_doc in bom_docs:
+		bom_doc.update_exploded_items(save=False)
+		bom_doc.calculate_cost()
+
+	write_bom_costs(bom_docs)
+	update_parent_bom_item_rates(bom_docs)
+
+def process_bom_update_log(log_name):
+	log = frappe.get_doc("BOM Update Log", log_name)
+
+	frappe.db.auto_commit_on_many_writes = 1
+	try:
+		log.replace_bom(commit=True)
+	except Exception:
+		frappe.db.rollback()
+		log.db_set({"status": "Failed", "error_log": frappe.get_traceback()})
+		frappe.db.commit()
+	finally:
+		frappe.db.auto_commit_on_many_writes = 0
+
+@frappe.whitelist()
+def resume_bom_update(log_name):
+	frappe.only_for(("Manufacturing Manager", "System Manager"))
+
+	log = frappe.get_doc("BOM Update Log", log_name)
+	if log.status == "Completed":
+		frappe.throw(_("The BOM replacement is already completed"))
+
+	# a log left Queued or In Progress by a killed job can be resumed once no job runs for it
+	if log.status != "Failed" and is_bom_update_job_running(log.name):
+		frappe.throw(_("The BOM replacement is still running"))
+
+	log.db_set({"status": "Queued", "error_log": None})
+	enqueue_bom_update_log(log.name)
+
+def enqueue_bom_update_log(log_name):
+	frappe.enqueue("erpnext.manufacturing.doctype.bom_update_log.bom_update_log.process_bom_update_log",
+		log_name=log_name, timeout=40000, job_name=get_bom_update_job_name(log_name),
+		enqueue_after_commit=True)
+
+def is_bom_update_job_running(log_name):
+	running_jobs = get_jobs(site=frappe.local.site, queue="default", key="job_name").get(frappe.local.site) or []
+	return get_bom_update_job_name(log_name) in [cstr(job) for job in running_jobs]
+
+def get_bom_update_job_name(log_name):
+	return "bom_update_log_{0}".format(log_name)
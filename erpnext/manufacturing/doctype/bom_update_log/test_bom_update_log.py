@@ -0,0 +1,76 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+import json
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext.manufacturing.doctype.bom_update_log.bom_update_log import (
+	get_pending_chunks,
+	resume_bom_update,
+)
+from erpnext.manufacturing.doctype.production_plan.test_production_plan import make_bom
+from erpnext.stock.doctype.item.test_item import create_item
+
+
+class TestBOMUpdateLog(FrappeTestCase):
+	def test_replace_bom_in_multi_level_boms(self):
+		for item, rate in [("BOM Replace Test Raw 1", 100), ("BOM Replace Test Raw 2", 300),
+			("BOM Replace Test Sub Assembly", 0), ("BOM Replace Test Assembly", 0),
+			("BOM Replace Test Finished", 0)]:
+			create_item(item, valuation_rate=rate)
+			frappe.db.set_value("Item", item, "valuation_rate", rate)
+
+		current_bom = make_bom(item="BOM Replace Test Sub Assembly",
+			raw_materials=["BOM Replace Test Raw 1"], currency="INR")
+		assembly_bom = make_bom(item="BOM Replace Test Assembly",
+			raw_materials=["BOM Replace Test Sub Assembly"], currency="INR")
+		finished_bom = make_bom(item="BOM Replace Test Finished",
+			raw_materials=["BOM Replace Test Assembly"], currency="INR")
+		new_bom = make_bom(item="BOM Replace Test Sub Assembly",
+			raw_materials=["BOM Replace Test Raw 2"], currency="INR")
+
+		update_tool = frappe.get_doc("BOM Update Tool")
+		update_tool.current_bom = current_bom.name
+		update_tool.new_bom = new_bom.name
+		update_tool.replace_bom()
+
+		log = frappe.get_last_doc("BOM Update Log")
+		self.assertEqual(log.status, "Completed")
+		self.assertEqual(json.loads(log.bom_levels), [[assembly_bom.name], [finished_bom.name]])
+		self.assertEqual(log.processed_boms, 2)
+
+		assembly_bom.load_from_db()
+		finished_bom.load_from_db()
+		self.assertEqual(assembly_bom.items[0].bom_no, new_bom.name)
+		self.assertEqual(assembly_bom.total_cost, 300)
+		self.assertEqual(finished_bom.total_cost, 300)
+		self.assertEqual([(d.item_code, d.rate) for d in finished_bom.exploded_items],
+			[("BOM Replace Test Raw 2", 300)])
+
+	def test_pending_chunks(self):
+		levels = [["A", "B", "C"], ["D"], ["E", "F"]]
+
+		self.assertEqual(list(get_pending_chunks(levels, 0)), [["A", "B", "C"], ["D"], ["E", "F"]])
+		self.assertEqual(list(get_pending_chunks(levels, 2)), [["C"], ["D"], ["E", "F"]])
+		self.assertEqual(list(get_pending_chunks(levels, 4)), [["E", "F"]])
+		self.assertEqual(list(get_pending_chunks(levels, 6)), [])
+
+	def test_resume_killed_bom_update(self):
+		update_tool = frappe.get_doc("BOM Update Tool")
+		update_tool.current_bom = "BOM-_Test Item Home Desktop Manufactured-001"
+		update_tool.new_bom = "BOM-_Test Item Home Desktop Manufactured-001"
+
+		# left In Progress by a killed job, no job runs for it anymore
+		log = update_tool.make_bom_update_log(status="In Progress")
+		with patch.object(frappe, "enqueue") as enqueue:
+			resume_bom_update(log.name)
+
+		log.load_from_db()
+		self.assertEqual(log.status, "Queued")
+		self.assertEqual(enqueue.call_args.kwargs["log_name"], log.name)
+
+		log.db_set("status", "Completed")
+		self.assertRaises(frappe.ValidationError, resume_bom_update, log.name)
@@ -3,44 +3,42 @@
 
 
 import json
+import time
 
-import click
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import cstr, flt
+from frappe.utils import cstr, flt, get_link_to_form, now
+from frappe.utils.background_jobs import get_jobs
 
-from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+from erpnext.manufacturing.doctype.bom.bom import (
+	clear_bom_explosion_cache,
+	get_bom_levels,
+	get_exploded_items_of_boms,
+)
+
+# BOMs recalculated and written together, and the number of extra workers per level
+BOM_COST_UPDATE_CHUNK_SIZE = 200
+BOM_COST_UPDATE_WORKERS = 4
+# seconds to wait for the workers of a level, same as the timeout of the job
+BOM_COST_UPDATE_TIMEOUT = 40000
+BULK_UPDATE_BATCH_SIZE = 1000
 
 
 class BOMUpdateTool(Document):
 	def replace_bom(self):
 		self.validate_bom()
 
-		unit_cost = get_new_bom_unit_cost(self.new_bom)
-		self.update_new_bom(unit_cost)
-
-		frappe.cache().delete_key('bom_children')
-		bom_list = self.get_parent_boms(self.new_bom)
-
-		with click.progressbar(bom_list) as bom_list:
-			pass
-		for bom in bom_list:
-			try:
-				bom_obj = frappe.get_cached_doc('BOM', bom)
-				# this is only used for versioning and we do not want
-				# to make separate db calls by using load_doc_before_save
-				# which proves to be expensive while doing bulk replace
-				bom_obj._doc_before_save = bom_obj
-				bom_obj.update_new_bom(self.current_bom, self.new_bom, unit_cost)
-				bom_obj.update_exploded_items()
-				bom_obj.calculate_cost()
-				bom_obj.update_parent_cost()
-				bom_obj.db_update()
-				if bom_obj.meta.get('track_changes') and not bom_obj.flags.ignore_version:
-					bom_obj.save_version()
-			except Exception:
-				frappe.log_error(frappe.get_traceback())
+		log = self.make_bom_update_log()
+		log.replace_bom()
+
+	def make_bom_update_log(self, status="In Progress"):
+		return frappe.get_doc({
+			"doctype": "BOM Update Log",
+			"current_bom": self.current_bom,
+			"new_bom": self.new_bom,
+			"status": status
+		}).insert(ignore_permissions=True)
 
 	def validate_bom(self):
 		if cstr(self.current_bom) == cstr(self.new_bom):
@@ -50,26 +48,6 @@ class BOMUpdateTool(Document):
 			!= frappe.db.get_value("BOM", self.new_bom, "item"):
 				frappe.throw(_("The selected BOMs are not for the same item"))
 
-	def update_new_bom(self, unit_cost):
-		frappe.db.sql("""update `tabBOM Item` set bom_no=%s,
-			rate=%s, amount=stock_qty*%s where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
-			(self.new_bom, unit_cost, unit_cost, self.current_bom))
-
-	def get_parent_boms(self, bom, bom_list=None):
-		if bom_list is None:
-			bom_list = []
-		data = frappe.db.sql("""SELECT DISTINCT parent FROM `tabBOM Item`
-			WHERE bom_no = %s AND docstatus < 2 AND parenttype='BOM'""", bom)
-
-		for d in data:
-			if self.new_bom == d[0]:
-				frappe.throw(_("BOM recursion: {0} cannot be child of {1}").format(bom, self.new_bom))
-
-			bom_list.append(d[0])
-			self.get_parent_boms(d[0], bom_list)
-
-		return list(set(bom_list))
-
 def get_new_bom_unit_cost(bom):
 	new_bom_unitcost = frappe.db.sql("""SELECT `total_cost`/`quantity`
 		FROM `tabBOM` WHERE name = %s""", bom)
@@ -78,11 +56,20 @@ def get_new_bom_unit_cost(bom):
 
 @frappe.whitelist()
 def enqueue_replace_bom(args):
+	from erpnext.manufacturing.doctype.bom_update_log.bom_update_log import enqueue_bom_update_log
+
 	if isinstance(args, str):
 		args = json.loads(args)
 
-	frappe.enqueue("erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool.replace_bom", args=args, timeout=40000)
-	frappe.msgprint(_("Queued for replacing the BOM. It may take a few minutes."))
+	doc = frappe.get_doc("BOM Update Tool")
+	doc.current_bom = args.get("current_bom")
+	doc.new_bom = args.get("new_bom")
+	doc.validate_bom()
+
+	log = doc.make_bom_update_log(status="Queued")
+	enqueue_bom_update_log(log.name)
+	frappe.msgprint(_("Queued for replacing the BOM. The progress can be followed in {0}.").format(
+		get_link_to_form("BOM Update Log", log.name)))
 
 @frappe.whitelist()
 def enqueue_update_cost():
@@ -93,21 +80,214 @@ def update_latest_price_in_all_boms():
 	if frappe.db.get_single_value("Manufacturing Settings", "update_bom_costs_automatically"):
 		update_cost()
 
-def replace_bom(args):
+def update_cost():
+	"""Update the cost of all BOMs, level by level from the lowest sub-assemblies to the finished goods"""
 	frappe.db.auto_commit_on_many_writes = 1
-	args = frappe._dict(args)
 
-	doc = frappe.get_doc("BOM Update Tool")
-	doc.current_bom = args.current_bom
-	doc.new_bom = args.new_bom
-	doc.replace_bom()
+	for level in get_bom_levels():
+		update_cost_for_level(level)
+		if not frappe.flags.in_test:
+			frappe.db.commit()
 
 	frappe.db.auto_commit_on_many_writes = 0
 
-def update_cost():
-	frappe.db.auto_commit_on_many_writes = 1
-	bom_list = get_boms_in_bottom_up_order()
-	for bom in bom_list:
-		frappe.get_doc("BOM", bom).update_cost(update_parent=False, from_child_bom=True)
+def update_cost_for_level(boms):
+	"""
+		Update the cost of BOMs which don't use each other.
 
-	frappe.db.auto_commit_on_many_writes = 0
+		Large levels are split in chunks which are put in a queue, the chunks are taken
+		from the queue by this job and by up to `BOM_COST_UPDATE_WORKERS` background jobs.
+		Returns when all chunks are done, as the next level reads the costs of this one.
+		Raises if a chunk failed, a chunk was lost with a killed worker, or the chunks are not done
+		within `BOM_COST_UPDATE_TIMEOUT`, so that the parent BOMs are not updated from stale costs.
+	"""
+	chunks = [boms[i:i + BOM_COST_UPDATE_CHUNK_SIZE] for i in range(0, len(boms), BOM_COST_UPDATE_CHUNK_SIZE)]
+	if len(chunks) == 1 or frappe.flags.in_test:
+		for chunk in chunks:
+			update_bom_costs(chunk)
+		return
+
+	cache = frappe.cache()
+	run_id = frappe.generate_hash(length=10)
+	keys = get_bom_cost_update_keys(run_id)
+	for chunk in chunks:
+		cache.rpush(keys.queue, json.dumps(chunk))
+
+	# workers must see the costs of the previous levels
+	frappe.db.commit()
+
+	for idx in range(min(len(chunks) - 1, BOM_COST_UPDATE_WORKERS)):
+		frappe.enqueue(process_bom_cost_update_queue, queue="long", timeout=BOM_COST_UPDATE_TIMEOUT,
+			job_name=f"bom_cost_update_{run_id}_{idx}", run_id=run_id)
+
+	deadline = time.time() + BOM_COST_UPDATE_TIMEOUT
+	try:
+		process_bom_cost_update_queue(run_id)
+
+		while cache.llen(keys.done) < len(chunks):
+			if time.time() > deadline:
+				frappe.throw(_("BOM cost update did not finish within {0} seconds, {1} of {2} chunks are done")
+					.format(BOM_COST_UPDATE_TIMEOUT, cache.llen(keys.done), len(chunks)))
+
+			if not get_bom_cost_update_workers(run_id):
+				# chunks left in the queue by workers which never started
+				process_bom_cost_update_queue(run_id)
+
+				# workers mark their chunks done before they exit
+				if cache.llen(keys.done) < len(chunks):
+					frappe.throw(_("BOM cost update workers stopped, {0} of {1} chunks are done. See the Error Log and the background jobs for details.")
+						.format(cache.llen(keys.done), len(chunks)))
+
+			time.sleep(1)
+
+		failed_boms = [bom for chunk in cache.lrange(keys.failed, 0, -1) for bom in json.loads(chunk)]
+		if failed_boms:
+			frappe.throw(_("BOM cost update failed for {0} BOMs, their parent BOMs were not updated. See the Error Log for details.")
+				.format(len(failed_boms)))
+	finally:
+		# also stops the workers still running after a timeout
+		cache.delete_value([keys.queue, keys.done, keys.failed])
+
+def get_bom_cost_update_workers(run_id):
+	"""Queued and running worker jobs of a cost update run"""
+	jobs = get_jobs(site=frappe.local.site, queue="long", key="job_name").get(frappe.local.site) or []
+	return [job for job in jobs if cstr(job).startswith(f"bom_cost_update_{run_id}_")]
+
+def get_bom_cost_update_keys(run_id):
+	return frappe._dict(
+		queue=f"bom_cost_update_queue::{run_id}",
+		done=f"bom_cost_update_done::{run_id}",
+		failed=f"bom_cost_update_failed::{run_id}",
+	)
+
+def process_bom_cost_update_queue(run_id):
+	keys = get_bom_cost_update_keys(run_id)
+
+	while True:
+		chunk = frappe.cache().lpop(keys.queue)
+		if not chunk:
+			break
+
+		try:
+			update_bom_costs(json.loads(chunk))
+			frappe.db.commit()
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(frappe.get_traceback(), _("BOM cost update failed"))
+			frappe.cache().rpush(keys.failed, chunk)
+		finally:
+			frappe.cache().rpush(keys.done, 1)
+
+def update_bom_costs(boms):
+	"""Recalculate the cost of `boms` and write them back with a few bulk statements"""
+	bom_docs = get_bom_docs(boms)
+	for bom_doc in bom_docs:
+		bom_doc.update_cost(update_parent=False, from_child_bom=True, save=False)
+
+	write_bom_costs(bom_docs)
+
+def get_bom_docs(boms):
+	"""
+		Load BOMs with one query per table instead of one document load per BOM.
+		The Flat BOMs of their child BOMs are loaded together and set in `flags.child_exploded_items`.
+	"""
+	bom_data = {d.name: d for d in frappe.db.sql("select * from `tabBOM` where name in %s",
+		[boms], as_dict=1)}
+
+	for fieldname, doctype in (("items", "BOM Item"), ("operations", "BOM Operation"),
+		("scrap_items", "BOM Scrap Item")):
+		for row in frappe.db.sql("""
+			select * from `tab{0}`
+			where parent in %s and parenttype = 'BOM' and parentfield = %s
+			order by parent, idx
+		""".format(doctype), [boms, fieldname], as_dict=1):
+			row.doctype = doctype
+			bom_data[row.parent].setdefault(fieldname, []).append(row)
+
+	child_exploded_items = get_exploded_items_of_boms([row.bom_no for d in bom_data.values()
+		for row in d.get("items", []) if row.bom_no])
+
+	bom_docs = []
+	for bom in boms:
+		if bom not in bom_data:
+			continue
+
+		bom_doc = frappe.get_doc(dict(bom_data[bom], doctype="BOM"))
+		bom_doc.flags.child_exploded_items = child_exploded_items
+		bom_docs.append(bom_doc)
+
+	return bom_docs
+
+def write_bom_costs(bom_docs):
+	"""Write calculated costs and Flat BOMs of `bom_docs`"""
+	if not bom_docs:
+		return
+
+	items, operations, exploded_items = [], [], []
+	for bom_doc in bom_docs:
+		items.extend(bom_doc.get("items"))
+		operations.extend(bom_doc.get("operations"))
+		exploded_items.extend(bom_doc.get("exploded_items"))
+
+	bulk_update("BOM", bom_docs, ["operating_cost", "base_operating_cost", "raw_material_cost",
+		"base_raw_material_cost", "scrap_material_cost", "base_scrap_material_cost", "total_cost",
+		"base_total_cost"])
+	bulk_update("BOM Item", items, ["rate", "amount", "base_rate", "base_amount", "qty_consumed_per_unit"])
+	bulk_update("BOM Operation", operations, ["hour_rate", "base_hour_rate", "operating_cost",
+		"base_operating_cost", "cost_per_unit", "base_cost_per_unit"])
+
+	frappe.db.delete("BOM Explosion Item", {"parent": ("in", [d.name for d in bom_docs]),
+		"parenttype": "BOM"})
+	insert_child_rows("BOM Explosion Item", exploded_items)
+	clear_bom_explosion_cache()
+
+def update_parent_bom_item_rates(bom_docs):
+	"""Set the unit cost of `bom_docs` as rate in the BOMs using them, like `BOM.update_parent_cost`"""
+	costs = [(d.name, flt(d.total_cost) / flt(d.quantity)) for d in bom_docs if d.total_cost]
+	if not costs:
+		return
+
+	rate = "case bom_no {0} end".format(" ".join(["when %s then %s"] * len(costs)))
+	case_values = [value for cost in costs for value in cost]
+
+	frappe.db.sql("""
+		update `tabBOM Item`
+		set rate = {0}, amount = stock_qty * {0}
+		where bom_no in ({1}) and docstatus < 2 and parenttype = 'BOM'
+	""".format(rate, ", ".join(["%s"] * len(costs))),
+		case_values + case_values + [name for name, cost in costs])
+
+def bulk_update(doctype, rows, fields):
+	"""Write `fields` of `rows` using one `update ... set field = case name when ...` statement per batch"""
+	for start in range(0, len(rows), BULK_UPDATE_BATCH_SIZE):
+		batch = rows[start:start + BULK_UPDATE_BATCH_SIZE]
+		set_clauses, values = [], []
+
+		for field in fields:
+			set_clauses.append("`{0}` = case name {1} end".format(field,
+				" ".join(["when %s then %s"] * len(batch))))
+			for row in batch:
+				values.extend([row.name, row.get(field)])
+
+		values.extend(row.name for row in batch)
+		frappe.db.sql("""
+			update `tab{0}`
+			set {1}
+			where name in ({2})
+		""".format(doctype, ", ".join(set_clauses), ", ".join(["%s"] * len(batch))), values)
+
+def insert_child_rows(doctype, rows):
+	if not rows:
+		return
+
+	timestamp = now()
+	for row in rows:
+		row.name = frappe.generate_hash(length=10)
+		row.creation = row.modified = timestamp
+		row.owner = row.modified_by = frappe.session.user
+
+	fields = list(rows[0].get_valid_dict(convert_dates_to_str=True))
+	for start in range(0, len(rows), BULK_UPDATE_BATCH_SIZE):
+		values = [tuple(row.get_valid_dict(convert_dates_to_str=True).get(field) for field in fields)
+			for row in rows[start:start + BULK_UPDATE_BATCH_SIZE]]
+		frappe.db.bulk_insert(doctype, fields, values)
@@ -4,6 +4,7 @@
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from erpnext.manufacturing.doctype.bom.bom import get_bom_levels
 from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import update_cost
 from erpnext.manufacturing.doctype.production_plan.test_production_plan import make_bom
 from erpnext.stock.doctype.item.test_item import create_item
@@ -57,3 +58,31 @@ class TestBOMUpdateTool(FrappeTestCase):
 
 		doc.load_from_db()
 		self.assertEqual(doc.total_cost, 200)
+
+	def test_multi_level_bom_cost(self):
+		for item in ["BOM Level Test Raw 1", "BOM Level Test Raw 2"]:
+			create_item(item, valuation_rate=100)
+			frappe.db.set_value("Item", item, "valuation_rate", 100)
+
+		for item in ["BOM Level Test Sub Assembly", "BOM Level Test Finished"]:
+			create_item(item, valuation_rate=100)
+
+		sub_bom = make_bom(item="BOM Level Test Sub Assembly", raw_materials=["BOM Level Test Raw 1"],
+			currency="INR")
+		top_bom = make_bom(item="BOM Level Test Finished",
+			raw_materials=["BOM Level Test Sub Assembly", "BOM Level Test Raw 2"], currency="INR")
+
+		self.assertEqual(top_bom.items[0].bom_no, sub_bom.name)
+		self.assertEqual(get_bom_levels(sub_bom.name), [[sub_bom.name], [top_bom.name]])
+
+		levels = get_bom_levels()
+		level_of = {bom: idx for idx, level in enumerate(levels) for bom in level}
+		self.assertLess(level_of[sub_bom.name], level_of[top_bom.name])
+
+		frappe.db.set_value("Item", "BOM Level Test Raw 1", "valuation_rate", 150)
+		update_cost()
+
+		top_bom.load_from_db()
+		self.assertEqual(top_bom.total_cost, 250)
+		self.assertEqual(sorted((d.item_code, d.rate) for d in top_bom.exploded_items),
+			[("BOM Level Test Raw 1", 150), ("BOM Level Test Raw 2", 100)])
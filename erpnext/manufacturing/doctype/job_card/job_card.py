@@ -1,6 +1,5 @@
 # Copyright (c) 2021, Frappe Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
-import datetime
 import json
 
 import frappe
@@ -8,22 +7,16 @@ from frappe import _, bold
 from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
 from frappe.utils import (
-	add_days,
-	add_to_date,
 	cint,
 	flt,
 	get_datetime,
 	get_link_to_form,
-	get_time,
-	getdate,
 	time_diff,
 	time_diff_in_hours,
 	time_diff_in_seconds,
 )
 
-from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import (
-	get_mins_between_operations,
-)
+from erpnext.manufacturing.doctype.workstation.workstation import get_workstation_schedule
 
 
 class OverlapError(frappe.ValidationError): pass
@@ -123,73 +116,12 @@ class JobCard(Document):
 		return existing[0] if existing else None
 
 	def schedule_time_logs(self, row):
-		row.remaining_time_in_mins = row.time_in_mins
-		while row.remaining_time_in_mins > 0:
-			args = frappe._dict({
-				"from_time": row.planned_start_time,
-				"to_time": row.planned_end_time
-			})
-
-			self.validate_overlap_for_workstation(args, row)
-			self.check_workstation_time(row)
-
-	def validate_overlap_for_workstation(self, args, row):
-		# get the last record based on the to time from the job card
-		data = self.get_overlap_for(args, check_next_available_slot=True)
-		if data:
-			row.planned_start_time = get_datetime(data.to_time + get_mins_between_operations())
-
-	def check_workstation_time(self, row):
-		workstation_doc = frappe.get_cached_doc("Workstation", self.workstation)
-		if (not workstation_doc.working_hours or
-			cint(frappe.db.get_single_value("Manufacturing Settings", "allow_overtime"))):
-			if get_datetime(row.planned_end_time) < get_datetime(row.planned_start_time):
-				row.planned_end_time = add_to_date(row.planned_start_time, minutes=row.time_in_mins)
-				row.remaining_time_in_mins = 0.0
-			else:
-				row.remaining_time_in_mins -= time_diff_in_minutes(row.planned_end_time, row.planned_start_time)
-
+		"""Book the operation time on the workstation from `row.planned_start_time` on"""
+		schedule = get_workstation_schedule(self.workstation)
+		for from_time, to_time in schedule.allocate(row.planned_start_time, row.time_in_mins):
+			row.planned_start_time = from_time
+			row.planned_end_time = to_time
 			self.update_time_logs(row)
-			return
-
-		start_date = getdate(row.planned_start_time)
-		start_time = get_time(row.planned_start_time)
-
-		new_start_date = workstation_doc.validate_workstation_holiday(start_date)
-
-		if new_start_date != start_date:
-			row.planned_start_time = datetime.datetime.combine(new_start_date, start_time)
-			start_date = new_start_date
-
-		total_idx = len(workstation_doc.working_hours)
-
-		for i, time_slot in enumerate(workstation_doc.working_hours):
-			workstation_start_time = datetime.datetime.combine(start_date, get_time(time_slot.start_time))
-			workstation_end_time = datetime.datetime.combine(start_date, get_time(time_slot.end_time))
-
-			if (get_datetime(row.planned_start_time) >= workstation_start_time and
-				get_datetime(row.planned_start_time) <= workstation_end_time):
-				time_in_mins = time_diff_in_minutes(workstation_end_time, row.planned_start_time)
-
-				# If remaining time fit in workstation time logs else split hours as per workstation time
-				if time_in_mins > row.remaining_time_in_mins:
-					row.planned_end_time = add_to_date(row.planned_start_time,
-						minutes=row.remaining_time_in_mins)
-					row.remaining_time_in_mins = 0
-				else:
-					row.planned_end_time = add_to_date(row.planned_start_time, minutes=time_in_mins)
-					row.remaining_time_in_mins -= time_in_mins
-
-				self.update_time_logs(row)
-
-				if total_idx != (i+1) and row.remaining_time_in_mins > 0:
-					row.planned_start_time = datetime.datetime.combine(start_date,
-						get_time(workstation_doc.working_hours[i+1].start_time))
-
-		if row.remaining_time_in_mins > 0:
-			start_date = add_days(start_date, 1)
-			row.planned_start_time = datetime.datetime.combine(start_date,
-				get_time(workstation_doc.working_hours[0].start_time))
 
 	def add_time_log(self, args):
 		last_row = []
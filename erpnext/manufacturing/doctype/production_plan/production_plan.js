@@ -92,6 +92,12 @@ frappe.ui.form.on('Production Plan', {
 					}, __('Create'));
 				}
 
+				if (frm.doc.po_items && frm.doc.status === "In Process") {
+					frm.add_custom_button(__("Submit Work Orders"), ()=> {
+						frm.trigger("submit_work_orders");
+					}, __('Status'));
+				}
+
 				if (frm.doc.mr_items && !in_list(['Material Requested', 'Closed'], frm.doc.status)) {
 					frm.add_custom_button(__("Material Request"), ()=> {
 						frm.trigger("make_material_request");
@@ -174,6 +180,17 @@ frappe.ui.form.on('Production Plan', {
 		});
 	},
 
+	submit_work_orders: function(frm) {
+		frappe.call({
+			method: "submit_work_orders",
+			freeze: true,
+			doc: frm.doc,
+			callback: function() {
+				frm.reload_doc();
+			}
+		});
+	},
+
 	make_material_request: function(frm) {
 
 		frappe.confirm(__("Do you want to submit the material request"),
@@ -21,8 +21,9 @@ from frappe.utils import (
 )
 from frappe.utils.csvutils import build_csv_response
 
+from erpnext.manufacturing.doctype.bom.bom import BOM_EXPLOSION_CACHE_KEY
 from erpnext.manufacturing.doctype.bom.bom import get_children as get_bom_children
-from erpnext.manufacturing.doctype.bom.bom import validate_bom_no
+from erpnext.manufacturing.doctype.bom.bom import set_bom_explosion_cache, validate_bom_no
 from erpnext.manufacturing.doctype.work_order.work_order import get_item_details
 from erpnext.setup.doctype.item_group.item_group import get_item_group_defaults
 
@@ -476,6 +477,28 @@ class ProductionPlan(Document):
 			po.insert()
 			purchase_orders.append(po.name)
 
+	@frappe.whitelist()
+	def submit_work_orders(self):
+		"""Submit the draft work orders of this plan, planning the job cards of all of them in one run"""
+		from erpnext.manufacturing.doctype.workstation.workstation import (
+			end_capacity_planning,
+			start_capacity_planning,
+		)
+
+		work_orders = frappe.get_all("Work Order",
+			filters={"production_plan": self.name, "docstatus": 0},
+			order_by="planned_start_date, creation", pluck="name")
+
+		started_planning = start_capacity_planning()
+		try:
+			for work_order in work_orders:
+				frappe.get_doc("Work Order", work_order).submit()
+		finally:
+			if started_planning:
+				end_capacity_planning()
+
+		self.show_list_created_message("Work Order", work_orders)
+
 	def show_list_created_message(self, doctype, doc_list=None):
 		if not doc_list:
 			return
@@ -704,6 +727,37 @@ def get_exploded_items(item_details, company, bom_no, include_non_stock_items, p
 
 	return item_details
 
+def get_bom_items_for_planning(doc, data, company, bom_no, include_non_stock_items,
+	include_subcontracted_items, planned_qty):
+	"""
+		Raw materials of `bom_no` for `planned_qty`.
+
+		The items for one unit are cached until a BOM or Item changes,
+		and multiplied by `planned_qty` instead of exploding the BOM again.
+	"""
+	use_exploded_items = cint(data.get('include_exploded_items') and include_subcontracted_items)
+	key = "planning::{0}::{1}::{2}::{3}::{4}::{5}".format(bom_no, company, cint(include_non_stock_items),
+		cint(include_subcontracted_items), cint(data.get('include_exploded_items')), use_exploded_items)
+
+	items = frappe.cache().hget(BOM_EXPLOSION_CACHE_KEY, key)
+	if items is None:
+		if use_exploded_items:
+			# fetch exploded items from BOM
+			items = get_exploded_items({}, company, bom_no, include_non_stock_items)
+		else:
+			items = get_subitems(doc, data, {}, bom_no, company, include_non_stock_items,
+				include_subcontracted_items, 1)
+
+		set_bom_explosion_cache(key, items)
+
+	item_details = {}
+	for item_code, d in items.items():
+		d = frappe._dict(d)
+		d.qty = flt(d.qty) * flt(planned_qty)
+		item_details[item_code] = d
+
+	return item_details
+
 def get_uom_conversion_factor(item_code, uom):
 	return frappe.db.get_value('UOM Conversion Detail',
 		{'parent': item_code, 'uom': uom}, 'conversion_factor')
@@ -940,13 +994,8 @@ def get_items_for_material_requests(doc, warehouses=None, get_parent_warehouse_d
 				frappe.throw(_("For row {0}: Enter Planned Qty").format(data.get('idx')))
 
 			if bom_no:
-				if data.get('include_exploded_items') and include_subcontracted_items:
-					# fetch exploded items from BOM
-					item_details = get_exploded_items(item_details,
-						company, bom_no, include_non_stock_items, planned_qty=planned_qty)
-				else:
-					item_details = get_subitems(doc, data, item_details, bom_no, company,
-						include_non_stock_items, include_subcontracted_items, 1, planned_qty=planned_qty)
+				item_details = get_bom_items_for_planning(doc, data, company, bom_no,
+					include_non_stock_items, include_subcontracted_items, planned_qty)
 		elif data.get('item_code'):
 			item_master = frappe.get_doc('Item', data['item_code']).as_dict()
 			purchase_uom = item_master.purchase_uom or item_master.stock_uom
@@ -1,11 +1,16 @@
 # Copyright (c) 2017, Frappe Technologies Pvt. Ltd. and Contributors
 # See license.txt
+from unittest.mock import patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
 from frappe.utils import add_to_date, flt, now_datetime, nowdate
 
 from erpnext.controllers.item_variant import create_variant
+from erpnext.manufacturing.doctype.bom.bom import clear_bom_explosion_cache
+from erpnext.manufacturing.doctype.production_plan import production_plan
 from erpnext.manufacturing.doctype.production_plan.production_plan import (
+	get_bom_items_for_planning,
 	get_items_for_material_requests,
 	get_sales_orders,
 	get_warehouse_list,
@@ -40,6 +45,7 @@ class TestProductionPlan(FrappeTestCase):
 
 	def tearDown(self) -> None:
 		frappe.db.rollback()
+		clear_bom_explosion_cache()
 
 	def test_production_plan_mr_creation(self):
 		"Test if MRs are created for unavailable raw materials."
@@ -655,6 +661,49 @@ class TestProductionPlan(FrappeTestCase):
 		]
 		self.assertFalse(pp.all_items_completed())
 
+	def test_bom_items_for_planning_are_cached(self):
+		bom_no = frappe.db.get_value('BOM', {'item': 'Test Production Item 1', 'is_default': 1})
+		data = frappe._dict(include_exploded_items=1)
+		clear_bom_explosion_cache()
+
+		with patch.object(production_plan, "get_subitems", wraps=production_plan.get_subitems) as get_subitems:
+			items_for_2 = get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 2)
+			self.assertTrue(get_subitems.called)
+
+			get_subitems.reset_mock()
+			items_for_5 = get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 5)
+			self.assertFalse(get_subitems.called)
+
+		self.assertEqual(set(items_for_2), {'Raw Material Item 1', 'Raw Material Item 2'})
+		for item_code, d in items_for_2.items():
+			self.assertEqual(flt(items_for_5[item_code].qty), flt(d.qty * 2.5))
+
+		# changing a BOM clears the cache
+		make_bom(item='Subassembly Item 1', raw_materials=['Raw Material Item 1'])
+		with patch.object(production_plan, "get_subitems", wraps=production_plan.get_subitems) as get_subitems:
+			items = get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 1)
+			self.assertTrue(get_subitems.called)
+
+		self.assertEqual(list(items), ['Raw Material Item 1'])
+
+	def test_bom_items_for_planning_cache_on_item_update(self):
+		bom_no = frappe.db.get_value('BOM', {'item': 'Test Production Item 1', 'is_default': 1})
+		data = frappe._dict(include_exploded_items=1)
+		get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 1)
+
+		item = frappe.get_doc('Item', 'Raw Material Item 1')
+		with patch.object(production_plan, "get_subitems", wraps=production_plan.get_subitems) as get_subitems:
+			# fields not used to explode BOMs keep the cache
+			item.description = "Updated description"
+			item.save()
+			get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 1)
+			self.assertFalse(get_subitems.called)
+
+			item.safety_stock = flt(item.safety_stock) + 1
+			item.save()
+			get_bom_items_for_planning(frappe._dict(), data, "_Test Company", bom_no, 0, 0, 1)
+			self.assertTrue(get_subitems.called)
+
 
 def create_production_plan(**args):
 	"""
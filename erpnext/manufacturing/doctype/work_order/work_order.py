@@ -29,6 +29,10 @@ from erpnext.manufacturing.doctype.bom.bom import (
 from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import (
 	get_mins_between_operations,
 )
+from erpnext.manufacturing.doctype.workstation.workstation import (
+	end_capacity_planning,
+	start_capacity_planning,
+)
 from erpnext.stock.doctype.batch.batch import make_batch
 from erpnext.stock.doctype.item.item import get_item_defaults, validate_end_of_life
 from erpnext.stock.doctype.serial_no.serial_no import (
@@ -380,13 +384,19 @@ class WorkOrder(Document):
 		enable_capacity_planning = not cint(manufacturing_settings_doc.disable_capacity_planning)
 		plan_days = cint(manufacturing_settings_doc.capacity_planning_for_days) or 30
 
-		for index, row in enumerate(self.operations):
-			qty = self.qty
-			while qty > 0:
-				qty = split_qty_based_on_batch_size(self, row, qty)
-				if row.job_card_qty > 0:
-					self.prepare_data_for_job_card(row, index,
-						plan_days, enable_capacity_planning)
+		# the time logs of each workstation are loaded once for all operations
+		started_planning = start_capacity_planning()
+		try:
+			for index, row in enumerate(self.operations):
+				qty = self.qty
+				while qty > 0:
+					qty = split_qty_based_on_batch_size(self, row, qty)
+					if row.job_card_qty > 0:
+						self.prepare_data_for_job_card(row, index,
+							plan_days, enable_capacity_planning)
+		finally:
+			if started_planning:
+				end_capacity_planning()
 
 		planned_end_date = self.operations and self.operations[-1].planned_end_time
 		if planned_end_date:
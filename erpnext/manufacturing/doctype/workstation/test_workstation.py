@@ -1,14 +1,18 @@
 # Copyright (c) 2015, Frappe Technologies Pvt. Ltd. and Contributors and Contributors
 # See license.txt
+import datetime
+
 import frappe
 from frappe.test_runner import make_test_records
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
 
 from erpnext.manufacturing.doctype.operation.test_operation import make_operation
 from erpnext.manufacturing.doctype.routing.test_routing import create_routing, setup_bom
 from erpnext.manufacturing.doctype.workstation.workstation import (
 	NotInWorkingHoursError,
 	WorkstationHolidayError,
+	WorkstationSchedule,
 	check_if_within_operating_hours,
 )
 
@@ -79,6 +83,38 @@ class TestWorkstation(FrappeTestCase):
 		self.assertEqual(bom_doc.operations[0].hour_rate, 250)
 		self.assertEqual(bom_doc.operations[1].hour_rate, 250)
 
+	def test_workstation_schedule(self):
+		try:
+			workstation = make_workstation(workstation_name="_Test Scheduling Workstation")
+			workstation.production_capacity = 2
+			workstation.set("working_hours", [
+				{"start_time": "09:00:00", "end_time": "12:00:00"},
+				{"start_time": "13:00:00", "end_time": "17:00:00"}
+			])
+			workstation.save()
+
+			def time_logs(*logs):
+				return [(get_datetime(from_time), get_datetime(to_time)) for from_time, to_time in logs]
+
+			schedule = WorkstationSchedule(workstation.name)
+			schedule.mins_between_operations = datetime.timedelta(0)
+			start = "2030-01-07 10:00:00"
+
+			# two operations can run at the same time, the third one waits for the first one to finish
+			self.assertEqual(schedule.allocate(start, 60), time_logs(("2030-01-07 10:00", "2030-01-07 11:00")))
+			self.assertEqual(schedule.allocate(start, 90), time_logs(("2030-01-07 10:00", "2030-01-07 11:30")))
+			self.assertEqual(schedule.allocate(start, 60), time_logs(("2030-01-07 11:00", "2030-01-07 12:00")))
+
+			# split over working hours
+			self.assertEqual(schedule.allocate(start, 150), time_logs(
+				("2030-01-07 11:30", "2030-01-07 12:00"), ("2030-01-07 13:00", "2030-01-07 15:00")))
+
+			# outside working hours start with the next working hours
+			self.assertEqual(schedule.allocate("2030-01-07 18:00:00", 30),
+				time_logs(("2030-01-08 09:00", "2030-01-08 09:30")))
+		finally:
+			frappe.db.rollback()
+
 def make_workstation(*args, **kwargs):
 	args = args if args else kwargs
 	if isinstance(args, tuple):
@@ -1,6 +1,8 @@
 # Copyright (c) 2015, Frappe Technologies Pvt. Ltd. and Contributors
 # License: GNU General Public License v3. See license.txt
 
+import datetime
+from bisect import bisect_left, insort
 
 import frappe
 from frappe import _
@@ -11,6 +13,8 @@ from frappe.utils import (
 	comma_and,
 	flt,
 	formatdate,
+	get_datetime,
+	get_time,
 	getdate,
 	time_diff_in_seconds,
 	to_timedelta,
@@ -105,3 +109,171 @@ def check_workstation_for_holiday(workstation, from_datetime, to_datetime):
 		if applicable_holidays:
 			frappe.throw(_("Workstation is closed on the following dates as per Holiday List: {0}")
 				.format(holiday_list) + "\n" + "\n".join(applicable_holidays), WorkstationHolidayError)
+
+class WorkstationSchedule:
+	"""
+		Time booked on a workstation, used to plan job cards without querying time logs for every slot.
+
+		Booked intervals are kept sorted by start time. Together with the longest interval,
+		this bounds the intervals which have to be checked for overlaps with a new one.
+	"""
+	def __init__(self, workstation):
+		workstation_doc = frappe.get_cached_doc("Workstation", workstation)
+		settings = frappe.db.get_singles_dict("Manufacturing Settings")
+
+		self.workstation = workstation
+		self.capacity = cint(workstation_doc.production_capacity) or 1
+		self.mins_between_operations = datetime.timedelta(minutes=cint(settings.mins_between_operations) or 10)
+
+		# like `check_if_within_operating_hours`, overtime only lifts the working hours,
+		# holidays are skipped unless production on holidays is allowed
+		self.working_hours = []
+		if not cint(settings.allow_overtime):
+			self.working_hours = sorted((get_time(d.start_time), get_time(d.end_time))
+				for d in workstation_doc.working_hours if d.start_time and d.end_time)
+
+		self.holidays = set()
+		if workstation_doc.holiday_list and not cint(settings.allow_production_on_holidays):
+			self.holidays = {getdate(d) for d in get_holidays(workstation_doc.holiday_list)}
+
+		self.intervals = []
+		self.starts = []
+		self.max_length = datetime.timedelta(0)
+		self.loaded_from = None
+
+	def load(self, from_time):
+		"""Load the time logs of job cards on this workstation which end after `from_time`"""
+		if self.loaded_from and from_time >= self.loaded_from:
+			return
+
+		conditions = "and jctl.to_time <= %(loaded_from)s" if self.loaded_from else ""
+		for d in frappe.db.sql("""
+			select jctl.from_time, jctl.to_time
+			from `tabJob Card Time Log` jctl, `tabJob Card` jc
+			where jctl.parent = jc.name and jc.workstation = %(workstation)s and jc.docstatus < 2
+				and jctl.from_time is not null and jctl.to_time > %(from_time)s {0}
+		""".format(conditions), {
+			"workstation": self.workstation,
+			"from_time": from_time,
+			"loaded_from": self.loaded_from
+		}, as_dict=1):
+			self.add_interval(get_datetime(d.from_time), get_datetime(d.to_time))
+
+		self.loaded_from = from_time
+
+	def add_interval(self, from_time, to_time):
+		idx = bisect_left(self.starts, from_time)
+		self.starts.insert(idx, from_time)
+		insort(self.intervals, (from_time, to_time))
+		self.max_length = max(self.max_length, to_time - from_time)
+
+	def get_overlapping_intervals(self, from_time, to_time):
+		overlapping = []
+		idx = bisect_left(self.starts, to_time) - 1
+		while idx >= 0 and self.starts[idx] > from_time - self.max_length:
+			if self.intervals[idx][1] > from_time:
+				overlapping.append(self.intervals[idx])
+			idx -= 1
+
+		return overlapping
+
+	def get_free_time(self, from_time, minutes):
+		"""Earliest time from `from_time` on when the workstation has capacity for `minutes` of work"""
+		while True:
+			to_time = from_time + datetime.timedelta(minutes=minutes)
+			overlapping = self.get_overlapping_intervals(from_time, to_time)
+			if get_max_concurrency(overlapping, from_time, to_time) < self.capacity:
+				return from_time
+
+			# wait for the first running job to finish
+			from_time = min(d[1] for d in overlapping if d[1] > from_time) + self.mins_between_operations
+
+	def get_working_time(self, from_time):
+		"""Earliest working time from `from_time` on, and the end of its working hours slot"""
+		while True:
+			date = from_time.date()
+			if date in self.holidays:
+				from_time = datetime.datetime.combine(add_days(date, 1), datetime.time())
+				continue
+
+			if not self.working_hours:
+				return from_time, None
+
+			for start_time, end_time in self.working_hours:
+				slot_end = datetime.datetime.combine(date, end_time)
+				if from_time < slot_end:
+					return max(from_time, datetime.datetime.combine(date, start_time)), slot_end
+
+			from_time = datetime.datetime.combine(add_days(date, 1), datetime.time())
+
+	def allocate(self, from_time, minutes):
+		"""
+			Book `minutes` of work starting at `from_time` or later, split over working hours.
+
+			:returns: list of (from_time, to_time) of the booked time logs
+		"""
+		from_time = get_datetime(from_time)
+		self.load(from_time)
+
+		time_logs = []
+		remaining_minutes = flt(minutes)
+		while remaining_minutes > 0:
+			from_time, slot_end = self.get_working_time(from_time)
+
+			minutes = remaining_minutes
+			if slot_end:
+				minutes = min(minutes, (slot_end - from_time).total_seconds() / 60)
+
+			free_time = self.get_free_time(from_time, minutes)
+			if free_time != from_time:
+				from_time = free_time
+				continue
+
+			to_time = from_time + datetime.timedelta(minutes=minutes)
+			self.add_interval(from_time, to_time)
+			time_logs.append((from_time, to_time))
+
+			remaining_minutes -= minutes
+			from_time = to_time
+
+		return time_logs
+
+def get_max_concurrency(intervals, from_time, to_time):
+	"""Maximum number of `intervals` running at the same time between `from_time` and `to_time`"""
+	events = []
+	for start, end in intervals:
+		events.append((max(start, from_time), 1))
+		events.append((min(end, to_time), -1))
+
+	# intervals ending at a time are closed before the ones starting at it
+	events.sort()
+
+	max_concurrency = concurrency = 0
+	for _time, change in events:
+		concurrency += change
+		max_concurrency = max(max_concurrency, concurrency)
+
+	return max_concurrency
+
+def start_capacity_planning():
+	"""
+		Share workstation schedules between all job cards created until `end_capacity_planning`.
+		Returns False if a planning run is already active.
+	"""
+	if frappe.flags.workstation_schedules is not None:
+		return False
+
+	frappe.flags.workstation_schedules = {}
+	return True
+
+def end_capacity_planning():
+	frappe.flags.workstation_schedules = None
+
+def get_workstation_schedule(workstation):
+	if frappe.flags.workstation_schedules is None:
+		return WorkstationSchedule(workstation)
+
+	if workstation not in frappe.flags.workstation_schedules:
+		frappe.flags.workstation_schedules[workstation] = WorkstationSchedule(workstation)
+
+	return frappe.flags.workstation_schedules[workstation]
@@ -0,0 +1,15 @@
+import frappe
+
+from erpnext.accounts.doctype.account_balance_snapshot.account_balance_snapshot import (
+	rebuild_account_balance_snapshot,
+)
+
+
+def execute():
+	"""
+	- Build the account balance snapshot from existing GL Entries.
+	- New GL postings and cancellations keep it up to date.
+	"""
+
+	frappe.reload_doc("accounts", "doctype", "account_balance_snapshot")
+	rebuild_account_balance_snapshot()
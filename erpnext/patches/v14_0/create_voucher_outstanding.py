@@ -0,0 +1,15 @@
+import frappe
+
+from erpnext.accounts.doctype.voucher_outstanding.voucher_outstanding import (
+	rebuild_voucher_outstanding,
+)
+
+
+def execute():
+	"""
+	- Build the voucher outstanding ledger from existing GL Entries.
+	- New GL postings, cancellations and unlinked payments keep it up to date.
+	"""
+
+	frappe.reload_doc("accounts", "doctype", "voucher_outstanding")
+	rebuild_voucher_outstanding()
@@ -2,6 +2,8 @@
 # For license information, please see license.txt
 
 
+import json
+
 import frappe
 from dateutil.relativedelta import relativedelta
 from frappe import _
@@ -14,10 +16,13 @@ from frappe.utils import (
 	add_to_date,
 	cint,
 	comma_and,
+	cstr,
 	date_diff,
 	flt,
 	getdate,
+	now_datetime,
 )
+from frappe.utils.background_jobs import get_jobs
 
 import erpnext
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (
@@ -26,6 +31,11 @@ from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import (
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
 
+# employees per background job, the jobs of one Payroll Entry run in parallel on the long queue
+SALARY_SLIP_CHUNK_SIZE = 100
+# minutes after which queued Salary Slip creation without running jobs is finished by the scheduler
+SALARY_SLIP_RECONCILE_AFTER = 10
+
 
 class PayrollEntry(Document):
 	def onload(self):
@@ -135,26 +145,29 @@ class PayrollEntry(Document):
 		self.check_permission('write')
 		employees = [emp.employee for emp in self.employees]
 		if employees:
-			args = frappe._dict({
-				"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
-				"payroll_frequency": self.payroll_frequency,
-				"start_date": self.start_date,
-				"end_date": self.end_date,
-				"company": self.company,
-				"posting_date": self.posting_date,
-				"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
-				"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
-				"payroll_entry": self.name,
-				"exchange_rate": self.exchange_rate,
-				"currency": self.currency
-			})
+			args = self.get_salary_slip_args()
 			if len(employees) > 30:
-				frappe.enqueue(create_salary_slips_for_employees, timeout=600, employees=employees, args=args)
+				enqueue_salary_slip_creation(employees, args)
 			else:
 				create_salary_slips_for_employees(employees, args, publish_progress=False)
 				# since this method is called via frm.call this doc needs to be updated manually
 				self.reload()
 
+	def get_salary_slip_args(self):
+		return frappe._dict({
+			"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
+			"payroll_frequency": self.payroll_frequency,
+			"start_date": self.start_date,
+			"end_date": self.end_date,
+			"company": self.company,
+			"posting_date": self.posting_date,
+			"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
+			"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
+			"payroll_entry": self.name,
+			"exchange_rate": self.exchange_rate,
+			"currency": self.currency
+		})
+
 	def get_sal_slip_list(self, ss_status, as_dict=False):
 		"""
 			Returns list of salary slips based on selected criteria
@@ -636,24 +649,31 @@ def payroll_entry_has_bank_entries(name):
 	return response
 
 def create_salary_slips_for_employees(employees, args, publish_progress=True):
+	from erpnext.payroll.doctype.salary_slip.salary_slip import end_payroll_batch, start_payroll_batch
+
 	salary_slips_exists_for = get_existing_salary_slips(employees, args)
 	count=0
 	salary_slips_not_created = []
-	for emp in employees:
-		if emp not in salary_slips_exists_for:
-			args.update({
-				"doctype": "Salary Slip",
-				"employee": emp
-			})
-			ss = frappe.get_doc(args)
-			ss.insert()
-			count+=1
-			if publish_progress:
-				frappe.publish_progress(count*100/len(set(employees) - set(salary_slips_exists_for)),
-					title = _("Creating Salary Slips..."))
 
-		else:
-			salary_slips_not_created.append(emp)
+	start_payroll_batch(employees, args.start_date, args.end_date)
+	try:
+		for emp in employees:
+			if emp not in salary_slips_exists_for:
+				args.update({
+					"doctype": "Salary Slip",
+					"employee": emp
+				})
+				ss = frappe.get_doc(args)
+				ss.insert()
+				count+=1
+				if publish_progress:
+					frappe.publish_progress(count*100/len(set(employees) - set(salary_slips_exists_for)),
+						title = _("Creating Salary Slips..."))
+
+			else:
+				salary_slips_not_created.append(emp)
+	finally:
+		end_payroll_batch()
 
 	payroll_entry = frappe.get_doc("Payroll Entry", args.payroll_entry)
 	payroll_entry.db_set("salary_slips_created", 1)
@@ -663,6 +683,115 @@ def create_salary_slips_for_employees(employees, args, publish_progress=True):
 		frappe.msgprint(_("Salary Slips already exists for employees {}, and will not be processed by this payroll.")
 			.format(frappe.bold(", ".join([emp for emp in salary_slips_not_created]))) , title=_("Message"), indicator="orange")
 
+def enqueue_salary_slip_creation(employees, args):
+	"""Create the Salary Slips in chunks of `SALARY_SLIP_CHUNK_SIZE` employees, one background job per chunk"""
+	chunks = [employees[i:i + SALARY_SLIP_CHUNK_SIZE] for i in range(0, len(employees), SALARY_SLIP_CHUNK_SIZE)]
+	frappe.cache().delete_value(get_salary_slip_job_keys(args.payroll_entry))
+	frappe.db.set_value("Payroll Entry", args.payroll_entry, {
+		"error_message": "",
+		"salary_slips_queued_on": now_datetime()
+	})
+
+	for idx, chunk in enumerate(chunks):
+		frappe.enqueue(create_salary_slips_for_chunk, queue="long", timeout=3000,
+			job_name=get_salary_slip_job_name(args.payroll_entry, idx), enqueue_after_commit=True,
+			employees=chunk, args=args, total_chunks=len(chunks), total_employees=len(employees))
+
+def create_salary_slips_for_chunk(employees, args, total_chunks, total_employees):
+	"""
+		Background job: create the Salary Slips of one chunk of employees.
+
+		A failing employee is rolled back and logged without stopping the chunk. The progress and
+		failures of all chunks are collected in the cache, the last chunk to finish updates the Payroll Entry.
+	"""
+	from erpnext.payroll.doctype.salary_slip.salary_slip import end_payroll_batch, start_payroll_batch
+
+	cache = frappe.cache()
+	progress_key, failed_key, done_key = get_salary_slip_job_keys(args.payroll_entry)
+	salary_slips_exists_for = get_existing_salary_slips(employees, args)
+
+	start_payroll_batch(employees, args.start_date, args.end_date)
+	try:
+		for emp in employees:
+			if emp not in salary_slips_exists_for:
+				try:
+					frappe.db.savepoint("before_salary_slip_creation")
+					frappe.get_doc(dict(args, doctype="Salary Slip", employee=emp)).insert()
+				except Exception as e:
+					frappe.db.rollback(save_point="before_salary_slip_creation")
+					frappe.log_error(frappe.get_traceback(), _("Salary Slip creation failed for {0}").format(emp))
+					cache.rpush(failed_key, json.dumps([emp, cstr(e) or e.__class__.__name__]))
+
+			cache.rpush(progress_key, 1)
+			frappe.publish_progress(cache.llen(progress_key) * 100 / total_employees,
+				title=_("Creating Salary Slips..."), doctype="Payroll Entry", docname=args.payroll_entry)
+	finally:
+		end_payroll_batch()
+
+	# the last chunk reads the Salary Slips of all chunks from the database
+	if not frappe.flags.in_test:
+		frappe.db.commit()
+
+	cache.rpush(done_key, 1)
+	if cache.llen(done_key) >= total_chunks:
+		finish_salary_slip_creation(args.payroll_entry)
+
+def finish_salary_slip_creation(payroll_entry):
+	"""
+		Mark the Salary Slips as created and list the employees without a Salary Slip.
+
+		The employees are taken from the Salary Slips in the database, so employees of a chunk
+		that was killed are listed as well. Failure messages are added where the cache still has them.
+	"""
+	keys = get_salary_slip_job_keys(payroll_entry)
+	failed = dict(json.loads(d) for d in frappe.cache().lrange(keys[1], 0, -1))
+
+	payroll_entry = frappe.get_doc("Payroll Entry", payroll_entry)
+	employees = [d.employee for d in payroll_entry.employees]
+	created = set(get_existing_salary_slips(employees, payroll_entry.get_salary_slip_args()) if employees else [])
+	not_created = sorted(emp for emp in employees if emp not in created)
+
+	error_message = ""
+	if not_created:
+		error_message = _("Salary Slips could not be created for the following employees, see Error Log for details:")
+		error_message += "\n" + "\n".join("{0}: {1}".format(emp,
+			failed.get(emp) or _("Salary Slip creation did not finish")) for emp in not_created)
+
+	payroll_entry.db_set({
+		"salary_slips_created": 1,
+		"error_message": error_message,
+		"salary_slips_queued_on": None
+	})
+	payroll_entry.notify_update()
+
+	frappe.cache().delete_value(keys)
+
+def reconcile_salary_slip_creation():
+	"""
+		Scheduled job: finish the Salary Slip creation of Payroll Entries whose chunk jobs all stopped
+		without the last one finishing, e.g. a chunk killed on timeout or the cache being flushed.
+	"""
+	payroll_entries = frappe.get_all("Payroll Entry", filters={
+		"docstatus": 1,
+		"salary_slips_created": 0,
+		"salary_slips_queued_on": ("<", add_to_date(now_datetime(), minutes=-SALARY_SLIP_RECONCILE_AFTER))
+	}, pluck="name")
+
+	if not payroll_entries:
+		return
+
+	running_jobs = get_jobs(site=frappe.local.site, queue="long", key="job_name").get(frappe.local.site) or []
+	for payroll_entry in payroll_entries:
+		if not any(cstr(job).startswith(get_salary_slip_job_name(payroll_entry, "")) for job in running_jobs):
+			finish_salary_slip_creation(payroll_entry)
+
+def get_salary_slip_job_name(payroll_entry, chunk):
+	return "{0}_salary_slips_{1}".format(payroll_entry, chunk)
+
+def get_salary_slip_job_keys(payroll_entry):
+	"""Cache keys of the processed employees, failures and finished chunks of a Payroll Entry"""
+	return ["payroll_entry_salary_slips_{0}::{1}".format(key, payroll_entry) for key in ("progress", "failed", "done")]
+
 def get_existing_salary_slips(employees, args):
 	return frappe.db.sql_list("""
 		select distinct employee from `tabSalary Slip`
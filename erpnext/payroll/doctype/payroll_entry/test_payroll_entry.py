@@ -5,7 +5,7 @@ import unittest
 
 import frappe
 from dateutil.relativedelta import relativedelta
-from frappe.utils import add_months
+from frappe.utils import add_days, add_months, add_to_date, now_datetime
 
 import erpnext
 from erpnext.accounts.utils import get_fiscal_year, getdate, nowdate
@@ -19,7 +19,12 @@ from erpnext.loan_management.doctype.loan.test_loan import (
 from erpnext.loan_management.doctype.process_loan_interest_accrual.process_loan_interest_accrual import (
 	process_loan_interest_accrual_for_term_loans,
 )
-from erpnext.payroll.doctype.payroll_entry.payroll_entry import get_end_date, get_start_end_dates
+from erpnext.payroll.doctype.payroll_entry.payroll_entry import (
+	create_salary_slips_for_chunk,
+	get_end_date,
+	get_start_end_dates,
+	reconcile_salary_slip_creation,
+)
 from erpnext.payroll.doctype.salary_slip.test_salary_slip import (
 	create_account,
 	get_salary_component_account,
@@ -173,6 +178,47 @@ class TestPayrollEntry(unittest.TestCase):
 
 			self.assertEqual(je_entries, expected_je)
 
+	def test_create_salary_slips_in_chunks(self):
+		payroll_entry, employees = make_chunked_payroll_entry()
+
+		args = payroll_entry.get_salary_slip_args()
+		create_salary_slips_for_chunk(employees[:2], args, total_chunks=2, total_employees=3)
+		self.assertFalse(frappe.db.get_value("Payroll Entry", payroll_entry.name, "salary_slips_created"))
+
+		create_salary_slips_for_chunk(employees[2:], args, total_chunks=2, total_employees=3)
+
+		payroll_entry.reload()
+		self.assertTrue(payroll_entry.salary_slips_created)
+		self.assertIn(employees[1], payroll_entry.error_message)
+		self.assertEqual(
+			sorted(frappe.get_all("Salary Slip", {"payroll_entry": payroll_entry.name}, pluck="employee")),
+			sorted([employees[0], employees[2]]))
+
+		frappe.db.set_value("Employee", employees[1], "date_of_joining", "2001-01-01")
+
+	def test_reconcile_killed_salary_slip_chunk(self):
+		payroll_entry, employees = make_chunked_payroll_entry()
+		frappe.db.set_value("Payroll Entry", payroll_entry.name, {
+			"docstatus": 1,
+			"salary_slips_queued_on": add_to_date(now_datetime(), hours=-1)
+		})
+
+		# the job of the second chunk is killed before it finishes
+		args = payroll_entry.get_salary_slip_args()
+		create_salary_slips_for_chunk(employees[:2], args, total_chunks=2, total_employees=3)
+		self.assertFalse(frappe.db.get_value("Payroll Entry", payroll_entry.name, "salary_slips_created"))
+
+		reconcile_salary_slip_creation()
+
+		payroll_entry.reload()
+		self.assertTrue(payroll_entry.salary_slips_created)
+		self.assertFalse(payroll_entry.salary_slips_queued_on)
+		self.assertIn(employees[1], payroll_entry.error_message)
+		self.assertIn(employees[2], payroll_entry.error_message)
+		self.assertNotIn(employees[0], payroll_entry.error_message)
+
+		frappe.db.set_value("Employee", employees[1], "date_of_joining", "2001-01-01")
+
 	def test_get_end_date(self):
 		self.assertEqual(get_end_date('2017-01-01', 'monthly'), {'end_date': '2017-01-31'})
 		self.assertEqual(get_end_date('2017-02-01', 'monthly'), {'end_date': '2017-02-28'})
@@ -248,6 +294,42 @@ class TestPayrollEntry(unittest.TestCase):
 			frappe.delete_doc('Salary Slip', name)
 
 
+def make_chunked_payroll_entry():
+	company = "_Test Company"
+	for data in frappe.get_all('Salary Component', fields = ["name"]):
+		if not frappe.db.get_value('Salary Component Account',
+			{'parent': data.name, 'company': company}, 'name'):
+			get_salary_component_account(data.name)
+
+	currency = frappe.db.get_value("Company", company, "default_currency")
+	dates = get_start_end_dates('Monthly', nowdate())
+
+	employees = []
+	for i in range(3):
+		employee = make_employee("test_payroll_chunk{0}@example.com".format(i), company=company)
+		make_salary_structure("_Test Chunk Salary Structure {0}".format(i), "Monthly", employee,
+			company=company, currency=currency)
+		employees.append(employee)
+
+	# joins after the payroll period, its Salary Slip must fail without stopping the others
+	frappe.db.set_value("Employee", employees[1], "date_of_joining", add_days(dates.end_date, 1))
+
+	payroll_entry = frappe.get_doc({
+		"doctype": "Payroll Entry",
+		"company": company,
+		"posting_date": nowdate(),
+		"payroll_frequency": "Monthly",
+		"start_date": dates.start_date,
+		"end_date": dates.end_date,
+		"currency": currency,
+		"exchange_rate": 1,
+		"payroll_payable_account": frappe.db.get_value("Company", company, "default_payroll_payable_account"),
+		"payment_account": get_payment_account(),
+		"employees": [{"employee": employee} for employee in employees]
+	}).insert()
+
+	return payroll_entry, employees
+
 def make_payroll_entry(**args):
 	args = frappe._dict(args)
 
@@ -4,6 +4,7 @@
 
 import datetime
 import math
+import unicodedata
 
 import frappe
 from frappe import _, msgprint
@@ -44,6 +45,10 @@ from erpnext.payroll.doctype.payroll_period.payroll_period import (
 )
 from erpnext.utilities.transaction_base import TransactionBase
 
+# compiled conditions and formulas, only added once `frappe.safe_eval` has accepted them
+COMPILED_FORMULA_CACHE_SIZE = 5000
+_compiled_salary_formulas = {}
+
 
 class SalarySlip(TransactionBase):
 	def __init__(self, *args, **kwargs):
@@ -57,6 +62,7 @@ class SalarySlip(TransactionBase):
 			"date": datetime.date,
 			"getdate": getdate
 		}
+		self.formula_globals = dict(self.whitelisted_globals, __builtins__={})
 
 	def autoname(self):
 		self.name = make_autoname(self.series)
@@ -205,7 +211,7 @@ class SalarySlip(TransactionBase):
 			struct = self.check_sal_struct(joining_date, relieving_date)
 
 			if struct:
-				self._salary_structure_doc = frappe.get_doc('Salary Structure', struct)
+				self._salary_structure_doc = get_salary_structure_doc(struct)
 				self.salary_slip_based_on_timesheet = self._salary_structure_doc.salary_slip_based_on_timesheet or 0
 				self.set_time_sheet()
 				self.pull_sal_struct()
@@ -390,6 +396,10 @@ class SalarySlip(TransactionBase):
 		return payment_days
 
 	def get_holidays_for_employee(self, start_date, end_date):
+		holidays = get_batch_holidays(self.employee, start_date, end_date)
+		if holidays is not None:
+			return holidays
+
 		return get_holiday_dates_for_employee(self.employee, start_date, end_date)
 
 	def calculate_lwp_or_ppl_based_on_leave_application(self, holidays, working_days):
@@ -531,7 +541,7 @@ class SalarySlip(TransactionBase):
 
 	def calculate_component_amounts(self, component_type):
 		if not getattr(self, '_salary_structure_doc', None):
-			self._salary_structure_doc = frappe.get_doc('Salary Structure', self.salary_structure)
+			self._salary_structure_doc = get_salary_structure_doc(self.salary_structure)
 
 		payroll_period = get_payroll_period(self.start_date, self.end_date, self.company)
 
@@ -552,7 +562,7 @@ class SalarySlip(TransactionBase):
 	def get_data_for_eval(self):
 		'''Returns data for evaluating formula'''
 		data = frappe._dict()
-		employee = frappe.get_doc("Employee", self.employee).as_dict()
+		employee = get_employee_data(self.employee)
 
 		start_date = getdate(self.start_date)
 		date_to_validate = (
@@ -561,18 +571,8 @@ class SalarySlip(TransactionBase):
 			else start_date
 		)
 
-		salary_structure_assignment = frappe.get_value(
-			"Salary Structure Assignment",
-			{
-				"employee": self.employee,
-				"salary_structure": self.salary_structure,
-				"from_date": ("<=", date_to_validate),
-				"docstatus": 1,
-			},
-			"*",
-			order_by="from_date desc",
-			as_dict=True,
-		)
+		salary_structure_assignment = get_salary_structure_assignment(
+			self.employee, self.salary_structure, date_to_validate)
 
 		if not salary_structure_assignment:
 			frappe.throw(
@@ -588,9 +588,8 @@ class SalarySlip(TransactionBase):
 		data.update(self.as_dict())
 
 		# set values for components
-		salary_components = frappe.get_all("Salary Component", fields=["salary_component_abbr"])
-		for sc in salary_components:
-			data.setdefault(sc.salary_component_abbr, 0)
+		for abbr in get_salary_component_abbrs():
+			data.setdefault(abbr, 0)
 
 		for key in ('earnings', 'deductions'):
 			for d in self.get(key):
@@ -600,15 +599,13 @@ class SalarySlip(TransactionBase):
 
 	def eval_condition_and_formula(self, d, data):
 		try:
-			condition = d.condition.strip().replace("\n", " ") if d.condition else None
-			if condition:
-				if not frappe.safe_eval(condition, self.whitelisted_globals, data):
+			if d.condition and d.condition.strip():
+				if not eval_salary_formula(d.condition, self.formula_globals, data):
 					return None
 			amount = d.amount
 			if d.amount_based_on_formula:
-				formula = d.formula.strip().replace("\n", " ") if d.formula else None
-				if formula:
-					amount = flt(frappe.safe_eval(formula, self.whitelisted_globals, data), d.precision("amount"))
+				if d.formula and d.formula.strip():
+					amount = flt(eval_salary_formula(d.formula, self.formula_globals, data), d.precision("amount"))
 			if amount:
 				data[d.abbr] = amount
 
@@ -1100,7 +1097,7 @@ class SalarySlip(TransactionBase):
 		try:
 			condition = condition.strip()
 			if condition:
-				return frappe.safe_eval(condition, self.whitelisted_globals, data)
+				return eval_salary_formula(condition, self.formula_globals, data)
 		except NameError as err:
 			frappe.throw(_("{0} <br> This error can be due to missing or deleted field.").format(err),
 				title=_("Name error"))
@@ -1431,4 +1428,130 @@ def get_payroll_payable_account(company, payroll_entry):
 	else:
 		payroll_payable_account = frappe.db.get_value('Company', company, 'default_payroll_payable_account')
 
-	return payroll_payable_account
\ No newline at end of file
+	return payroll_payable_account
+
+def eval_salary_formula(expression, eval_globals, data):
+	"""
+		Evaluate a component or tax slab condition or formula, `eval_globals` must set `__builtins__`.
+
+		The first evaluation of an expression goes through `frappe.safe_eval`, so it is validated by
+		frappe's own checks. Only an accepted expression has its compiled code cached, which is then
+		shared by all the slips of a worker. An edited formula is a new expression, so the cache is never stale.
+	"""
+	code = _compiled_salary_formulas.get(expression)
+	if code is not None:
+		return eval(code, eval_globals, data)
+
+	# identifiers are NFKC normalized by python, check the expression as it will be compiled
+	normalized = unicodedata.normalize("NFKC", expression.strip().replace("\n", " "))
+	result = frappe.safe_eval(normalized, dict(eval_globals), data)
+
+	if len(_compiled_salary_formulas) >= COMPILED_FORMULA_CACHE_SIZE:
+		_compiled_salary_formulas.clear()
+	_compiled_salary_formulas[expression] = compile(normalized, "<salary formula>", "eval")
+
+	return result
+
+def start_payroll_batch(employees, start_date, end_date):
+	"""
+		Preload the data read by every Salary Slip of `employees` for the period: employee details,
+		Salary Structure Assignments, holidays and component abbreviations.
+		Salary Structures are loaded once per batch as they are used.
+	"""
+	employee_data = {d.name: d for d in frappe.get_all("Employee",
+		filters={"name": ("in", employees)}, fields=["*"])}
+
+	assignments = {}
+	for d in frappe.get_all("Salary Structure Assignment",
+		filters={"employee": ("in", employees), "docstatus": 1}, fields=["*"], order_by="from_date desc"):
+		assignments.setdefault(d.employee, []).append(d)
+
+	holiday_lists = {}
+	for emp in employee_data.values():
+		holiday_list = emp.holiday_list or frappe.get_cached_value("Company", emp.company, "default_holiday_list")
+		if holiday_list:
+			holiday_lists[emp.name] = holiday_list
+
+	holidays = {holiday_list: [] for holiday_list in holiday_lists.values()}
+	if holidays:
+		for d in frappe.get_all("Holiday",
+			filters={"parent": ("in", list(holidays)), "holiday_date": ("between", [start_date, end_date])},
+			fields=["parent", "holiday_date"]):
+			holidays[d.parent].append(getdate(d.holiday_date))
+
+	frappe.flags.payroll_batch = frappe._dict({
+		"start_date": getdate(start_date),
+		"end_date": getdate(end_date),
+		"employees": employee_data,
+		"assignments": assignments,
+		"holiday_lists": holiday_lists,
+		"holidays": holidays,
+		"salary_structures": {},
+		"component_abbrs": None,
+	})
+
+def end_payroll_batch():
+	frappe.flags.payroll_batch = None
+
+def get_employee_data(employee):
+	batch = frappe.flags.payroll_batch
+	if batch and employee in batch.employees:
+		return batch.employees[employee]
+
+	return frappe.get_doc("Employee", employee).as_dict()
+
+def get_salary_structure_doc(salary_structure):
+	batch = frappe.flags.payroll_batch
+	if not batch:
+		return frappe.get_doc("Salary Structure", salary_structure)
+
+	if salary_structure not in batch.salary_structures:
+		batch.salary_structures[salary_structure] = frappe.get_doc("Salary Structure", salary_structure)
+
+	return batch.salary_structures[salary_structure]
+
+def get_salary_structure_assignment(employee, salary_structure, date):
+	"""Latest submitted assignment of `salary_structure` to `employee` from or before `date`"""
+	batch = frappe.flags.payroll_batch
+	if batch and employee in batch.employees:
+		date = getdate(date)
+		for d in batch.assignments.get(employee, []):
+			if d.salary_structure == salary_structure and getdate(d.from_date) <= date:
+				return d
+		return
+
+	return frappe.get_value(
+		"Salary Structure Assignment",
+		{
+			"employee": employee,
+			"salary_structure": salary_structure,
+			"from_date": ("<=", date),
+			"docstatus": 1,
+		},
+		"*",
+		order_by="from_date desc",
+		as_dict=True,
+	)
+
+def get_salary_component_abbrs():
+	batch = frappe.flags.payroll_batch
+	if batch and batch.component_abbrs is not None:
+		return batch.component_abbrs
+
+	abbrs = [d.salary_component_abbr for d in frappe.get_all("Salary Component", fields=["salary_component_abbr"])]
+	if batch:
+		batch.component_abbrs = abbrs
+
+	return abbrs
+
+def get_batch_holidays(employee, start_date, end_date):
+	"""Holiday dates of `employee` from the preloaded batch, None if the batch does not cover them"""
+	batch = frappe.flags.payroll_batch
+	if not batch or employee not in batch.holiday_lists:
+		return
+
+	start_date, end_date = getdate(start_date), getdate(end_date)
+	if start_date < batch.start_date or end_date > batch.end_date:
+		return
+
+	return [cstr(d) for d in batch.holidays[batch.holiday_lists[employee]] if start_date <= d <= end_date]
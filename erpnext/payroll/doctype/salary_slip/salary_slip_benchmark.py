@@ -0,0 +1,70 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+"""
+Compare the evaluation of salary formulas through `frappe.safe_eval` on every call with
+the compiled formulas of `eval_salary_formula`:
+
+	bench --site [site] execute erpnext.payroll.doctype.salary_slip.salary_slip_benchmark.execute
+"""
+
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+from erpnext.payroll.doctype.salary_slip import salary_slip
+
+
+def execute(slips=200, components=40):
+	slip = make_benchmark_salary_slip(cint(components) or 40)
+	slips = cint(slips) or 200
+
+	salary_slip._compiled_salary_formulas.clear()
+	timings = {}
+	for label, eval_row in (("safe_eval", lambda d, data: eval_with_safe_eval(slip, d, data)),
+		("compiled", slip.eval_condition_and_formula)):
+		start = time.perf_counter()
+		evaluate_salary_slips(slip, eval_row, slips)
+		timings[label] = time.perf_counter() - start
+
+	print("{0} slips of {1} components: safe_eval {2:.3f}s, compiled {3:.3f}s".format(
+		slips, len(slip.earnings), timings["safe_eval"], timings["compiled"]))
+
+	return timings
+
+def make_benchmark_salary_slip(components=40):
+	"""Salary Slip with chained formula components, every other one with a condition"""
+	slip = frappe.new_doc("Salary Slip")
+	for i in range(components):
+		slip.append("earnings", {
+			"abbr": "C{0}".format(i),
+			"condition": "base > {0}".format(i * 1000) if i % 2 else "",
+			"amount_based_on_formula": 1,
+			"formula": "base * {0} / 100\n + C{1} * .1".format(i + 1, i - 1) if i else "base * .4",
+		})
+
+	return slip
+
+def eval_with_safe_eval(slip, d, data):
+	"""Evaluation before formulas were compiled once per worker"""
+	if d.condition and not frappe.safe_eval(d.condition.strip().replace("\n", " "),
+		dict(slip.whitelisted_globals), data):
+		return None
+
+	amount = flt(frappe.safe_eval(d.formula.strip().replace("\n", " "),
+		dict(slip.whitelisted_globals), data), d.precision("amount"))
+	if amount:
+		data[d.abbr] = amount
+
+	return amount
+
+def evaluate_salary_slips(slip, eval_row, slips=200):
+	"""Amounts of all components for `slips` different base amounts"""
+	amounts = []
+	for i in range(slips):
+		data = frappe._dict({d.abbr: 0 for d in slip.earnings})
+		data.base = 20000 + i * 100
+		amounts.append([eval_row(d, data) for d in slip.earnings])
+
+	return amounts
@@ -3,6 +3,7 @@
 
 import calendar
 import random
+import time
 import unittest
 
 import frappe
@@ -32,6 +33,12 @@ from erpnext.payroll.doctype.employee_tax_exemption_declaration.test_employee_ta
 	create_payroll_period,
 )
 from erpnext.payroll.doctype.payroll_entry.payroll_entry import get_month_details
+from erpnext.payroll.doctype.salary_slip import salary_slip
+from erpnext.payroll.doctype.salary_slip.salary_slip_benchmark import (
+	eval_with_safe_eval,
+	evaluate_salary_slips,
+	make_benchmark_salary_slip,
+)
 from erpnext.payroll.doctype.salary_structure.salary_structure import make_salary_slip
 
 
@@ -712,6 +719,20 @@ class TestSalarySlip(unittest.TestCase):
 
 		frappe.db.rollback()
 
+	def test_compiled_formula_evaluation(self):
+		slip = make_benchmark_salary_slip()
+
+		salary_slip._compiled_salary_formulas.clear()
+		expected = evaluate_salary_slips(slip, lambda d, data: eval_with_safe_eval(slip, d, data))
+		self.assertEqual(evaluate_salary_slips(slip, slip.eval_condition_and_formula), expected)
+
+		# illegal expressions are rejected by frappe.safe_eval and never cached,
+		# including identifiers that only become "format" after NFKC normalization
+		for expression in ("().__class__", '"{0.\\x5f\\x5fclass\\x5f\\x5f}".\uff46ormat(())'):
+			self.assertRaises(frappe.ValidationError, salary_slip.eval_salary_formula,
+				expression, dict(slip.formula_globals), {})
+			self.assertNotIn(expression, salary_slip._compiled_salary_formulas)
+
 	def make_activity_for_employee(self):
 		activity_type = frappe.get_doc("Activity Type", "_Test Activity Type")
 		activity_type.billing_rate = 50
@@ -6,7 +6,7 @@ import frappe
 from frappe.model.document import Document
 from frappe.query_builder import Case
 from frappe.query_builder.functions import Coalesce, Sum
-from frappe.utils import flt
+from frappe.utils import flt, now
 
 
 class Bin(Document):
@@ -100,41 +100,61 @@ def get_bin_details(bin_name):
 	'reserved_qty', 'indented_qty', 'planned_qty', 'reserved_qty_for_production',
 	'reserved_qty_for_sub_contract'], as_dict=1)
 
+BIN_QTY_DELTA_FIELDS = ("ordered_qty", "reserved_qty", "indented_qty", "planned_qty")
+
 def update_qty(bin_name, args):
+	"""
+		Apply the qty deltas in `args` to the Bin and derive projected qty,
+		in one `update ... set col = col + delta` statement so that concurrent postings
+		on the same item and warehouse do not overwrite each other.
+	"""
 	from erpnext.controllers.stock_controller import future_sle_exists
 
-	bin_details = get_bin_details(bin_name)
+	values = {fieldname: flt(args.get(fieldname)) for fieldname in BIN_QTY_DELTA_FIELDS}
+	values.update({
+		"name": bin_name,
+		"item_code": args.get("item_code"),
+		"warehouse": args.get("warehouse"),
+		"modified": now(),
+	})
+
 	# actual qty is already updated by processing current voucher
-	actual_qty = bin_details.actual_qty
+	actual_qty = "actual_qty"
 
 	# actual qty is not up to date in case of backdated transaction
 	if future_sle_exists(args):
-		actual_qty = frappe.db.get_value("Stock Ledger Entry",
-				filters={
-					"item_code": args.get("item_code"),
-					"warehouse": args.get("warehouse"),
-					"is_cancelled": 0
-				},
-				fieldname="qty_after_transaction",
-				order_by="posting_date desc, posting_time desc, creation desc",
-			) or 0.0
-
-	ordered_qty = flt(bin_details.ordered_qty) + flt(args.get("ordered_qty"))
-	reserved_qty = flt(bin_details.reserved_qty) + flt(args.get("reserved_qty"))
-	indented_qty = flt(bin_details.indented_qty) + flt(args.get("indented_qty"))
-	planned_qty = flt(bin_details.planned_qty) + flt(args.get("planned_qty"))
-
-
-	# compute projected qty
-	projected_qty = (flt(actual_qty) + flt(ordered_qty)
-		+ flt(indented_qty) + flt(planned_qty) - flt(reserved_qty)
-		- flt(bin_details.reserved_qty_for_production) - flt(bin_details.reserved_qty_for_sub_contract))
-
-	frappe.db.set_value('Bin', bin_name, {
-		'actual_qty': actual_qty,
-		'ordered_qty': ordered_qty,
-		'reserved_qty': reserved_qty,
-		'indented_qty': indented_qty,
-		'planned_qty': planned_qty,
-		'projected_qty': projected_qty
-	})
+		actual_qty = """ifnull((
+			select qty_after_transaction from `tabStock Ledger Entry`
+			where item_code = %(item_code)s and warehouse = %(warehouse)s and is_cancelled = 0
+			order by posting_date desc, posting_time desc, creation desc
+			limit 1
+		), 0)"""
+
+	# projected qty is set first, so that it reads the values before this update on every database
+	frappe.db.sql("""
+		update `tabBin`
+		set
+			projected_qty = {actual_qty} + ordered_qty + %(ordered_qty)s + indented_qty + %(indented_qty)s
+				+ planned_qty + %(planned_qty)s - reserved_qty - %(reserved_qty)s
+				- ifnull(reserved_qty_for_production, 0) - ifnull(reserved_qty_for_sub_contract, 0),
+			actual_qty = {actual_qty},
+			ordered_qty = ordered_qty + %(ordered_qty)s,
+			reserved_qty = reserved_qty + %(reserved_qty)s,
+			indented_qty = indented_qty + %(indented_qty)s,
+			planned_qty = planned_qty + %(planned_qty)s,
+			modified = %(modified)s
+		where name = %(name)s
+	""".format(actual_qty=actual_qty), values)
+
+def update_qty_for_bins(bin_args):
+	"""
+		Update the Bins of a document once per Bin.
+
+		:param bin_args: dict of Bin name -> list of args of the document's ledger entries for that Bin
+	"""
+	for bin_name, args_list in bin_args.items():
+		args = frappe._dict(args_list[-1])
+		for fieldname in BIN_QTY_DELTA_FIELDS:
+			args[fieldname] = sum(flt(d.get(fieldname)) for d in args_list)
+
+		update_qty(bin_name, args)
@@ -4,6 +4,7 @@
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from erpnext.stock.doctype.bin.bin import update_qty, update_qty_for_bins
 from erpnext.stock.doctype.item.test_item import make_item
 from erpnext.stock.utils import _create_bin
 
@@ -34,3 +35,28 @@ class TestBin(FrappeTestCase):
 		indexes = frappe.db.sql("show index from tabBin where Non_unique = 0", as_dict=1)
 		if not any(index.get("Key_name") == "unique_item_warehouse" for index in indexes):
 			self.fail(f"Expected unique index on item-warehouse")
+
+	def test_update_qty_increments(self):
+		item_code = make_item("_TestBinIncrementItem", {"is_stock_item": 1}).name
+		warehouse = "_Test Warehouse - _TC"
+		bin = _create_bin(item_code, warehouse)
+		bin.db_set("reserved_qty_for_production", 2)
+
+		args = frappe._dict(item_code=item_code, warehouse=warehouse, posting_date=frappe.utils.nowdate(),
+			posting_time=frappe.utils.nowtime())
+
+		# deltas of postings that read the bin at the same time are all applied
+		update_qty(bin.name, frappe._dict(args, ordered_qty=5, reserved_qty=1))
+		update_qty(bin.name, frappe._dict(args, ordered_qty=3, planned_qty=4))
+		update_qty_for_bins({bin.name: [
+			frappe._dict(args, indented_qty=2),
+			frappe._dict(args, indented_qty=1, reserved_qty=2),
+		]})
+
+		bin.reload()
+		self.assertEqual(
+			[bin.ordered_qty, bin.reserved_qty, bin.indented_qty, bin.planned_qty],
+			[8, 3, 3, 4])
+		self.assertEqual(bin.projected_qty, 8 + 3 + 4 - 3 - 2)
+
+		frappe.db.rollback()
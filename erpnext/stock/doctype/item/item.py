@@ -130,6 +130,7 @@ class Item(Document):
 
 	def on_update(self):
 		invalidate_cache_for_item(self)
+		self.clear_bom_explosion_cache()
 		self.update_variants()
 		self.update_item_price()
 		self.update_website_item()
@@ -233,6 +234,28 @@ class Item(Document):
 				"conversion_factor": 1
 			})
 
+	def clear_bom_explosion_cache(self):
+		"""Clear the cached BOM explosions if a field read while exploding BOMs changed on an item used in BOMs"""
+		from erpnext.manufacturing.doctype.bom.bom import clear_bom_explosion_cache
+
+		doc_before_save = self.get_doc_before_save()
+		if not doc_before_save:
+			return
+
+		def get_explosion_values(doc):
+			return (
+				[doc.get(field) for field in ("item_name", "default_bom", "is_stock_item", "is_sub_contracted_item",
+					"default_material_request_type", "min_order_qty", "safety_stock", "purchase_uom")],
+				[(d.company, d.default_warehouse) for d in doc.get("item_defaults")],
+				[(d.uom, d.conversion_factor) for d in doc.get("uoms")],
+			)
+
+		if get_explosion_values(self) == get_explosion_values(doc_before_save):
+			return
+
+		if frappe.db.exists("BOM Item", {"item_code": self.name}):
+			clear_bom_explosion_cache()
+
 	def update_website_item(self):
 		"""Update Website Item if change in Item impacts it."""
 		web_item = frappe.db.exists("Website Item", {"item_code": self.item_code})
@@ -25,7 +25,7 @@ from erpnext.stock.doctype.item.item import (
 	validate_is_stock_item,
 )
 from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
-from erpnext.stock.get_item_details import get_item_details
+from erpnext.stock.get_item_details import get_item_details, get_items_details
 
 test_ignore = ["BOM"]
 test_dependencies = ["Warehouse", "Item Group", "Item Tax Template", "Brand", "Item Attribute"]
@@ -116,6 +116,36 @@ class TestItem(FrappeTestCase):
 		for key, value in to_check.items():
 			self.assertEqual(value, details.get(key))
 
+	def test_get_items_details(self):
+		make_test_objects("Item Price")
+
+		company = "_Test Company"
+		currency = frappe.get_cached_value("Company",  company,  "default_currency")
+
+		args_list = [{
+			"item_code": item_code,
+			"company": company,
+			"price_list": "_Test Price List",
+			"currency": currency,
+			"doctype": "Sales Order",
+			"conversion_rate": 1,
+			"order_type": "Sales",
+			"customer": "_Test Customer",
+			"warehouse": "_Test Warehouse - _TC",
+			"qty": 1
+		} for item_code in ["_Test Item", "_Test Item 2", "_Test Item With Item Tax Template", "_Test Item"]]
+
+		expected = [get_item_details(args.copy()) for args in args_list]
+		details = get_items_details(args_list)
+
+		self.assertEqual(len(details), len(args_list))
+		for row, expected_row in zip(details, expected):
+			for key in ("item_code", "price_list_rate", "item_tax_rate", "actual_qty", "projected_qty",
+				"plc_conversion_rate", "pricing_rules"):
+				self.assertEqual(row.get(key), expected_row.get(key))
+
+		self.assertFalse(frappe.flags.item_details_batch)
+
 	def test_item_tax_template(self):
 		expected_item_tax_template = [
 			{"item_code": "_Test Item With Item Tax Template", "tax_category": "",
@@ -1,10 +1,13 @@
 # Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
+import json
+
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import cint, get_link_to_form, get_weekday, now, nowtime, today
+from frappe.utils import cint, get_datetime, get_link_to_form, get_weekday, now, nowtime, today
+from frappe.utils.background_jobs import get_jobs
 from frappe.utils.user import get_users_with_role
 from rq.timeouts import JobTimeoutException
 
@@ -170,23 +173,245 @@ def repost_entries():
 	if not in_configured_timeslot():
 		return
 
-	riv_entries = get_repost_item_valuation_entries()
+	riv_entries = coalesce_queued_reposts(get_repost_item_valuation_entries())
 
-	for row in riv_entries:
-		doc = frappe.get_doc('Repost Item Valuation', row.name)
-		if doc.status in ('Queued', 'In Progress'):
-			repost(doc)
-			doc.deduplicate_similar_repost()
+	if cint(frappe.db.get_single_value("Stock Reposting Settings", "parallel_reposting")):
+		if riv_entries:
+			# the balances are checked by the last group to finish
+			enqueue_independent_repost_groups(riv_entries)
+		elif not get_repost_group_jobs():
+			# in case the last group of a run was killed before it could check them
+			check_stock_and_account_balances()
+		return
+
+	repost_group([row.name for row in riv_entries])
+	check_stock_and_account_balances()
 
-	riv_entries = get_repost_item_valuation_entries()
-	if riv_entries:
+def check_stock_and_account_balances():
+	if get_repost_item_valuation_entries():
 		return
 
 	for d in frappe.get_all('Company', filters= {'enable_perpetual_inventory': 1}):
 		check_if_stock_and_account_balance_synced(today(), d.name)
 
+def repost_group(riv_names, run_id=None, total_groups=1):
+	"""
+		Repost the given Repost Item Valuation entries one after another, in the given order.
+
+		For a group enqueued by `enqueue_independent_repost_groups`, the last group of the run
+		to finish checks the stock and account balances. If a group is killed, they are checked
+		by the next `repost_entries` once no group is left.
+	"""
+	try:
+		for name in riv_names:
+			doc = frappe.get_doc('Repost Item Valuation', name)
+			if doc.status in ('Queued', 'In Progress'):
+				repost(doc)
+				doc.deduplicate_similar_repost()
+	finally:
+		last_group = False
+		if run_id:
+			done_key = get_repost_group_done_key(run_id)
+			frappe.cache().rpush(done_key, 1)
+			# not deleted if a group of the run was killed
+			frappe.cache().expire(frappe.cache().make_key(done_key), 86400)
+			last_group = frappe.cache().llen(done_key) >= total_groups
+
+	if last_group:
+		frappe.cache().delete_value(done_key)
+		check_stock_and_account_balances()
+
+def get_repost_group_done_key(run_id):
+	return "repost_sle_groups_done::{0}".format(run_id)
+
+def coalesce_queued_reposts(riv_entries):
+	"""
+		Merge queued reposts into a minimal set before executing them.
+
+		Reposting an item-warehouse from a posting timestamp replays its whole future
+		stock ledger and reposts the GL entries of every voucher in it. So a queued repost
+		whose item-warehouses are all reposted from an earlier (or the same) timestamp
+		by another queued repost has nothing left to do: it is marked as Skipped and
+		linked to the repost that absorbed it via `coalesced_into`.
+
+		:param riv_entries: queued entries ordered by posting timestamp
+		:returns: entries which still have to be reposted, in the same order
+	"""
+	# (item_code, warehouse) -> repost which replays it from the earliest timestamp
+	earliest_repost = {}
+	to_repost = []
+
+	for row in riv_entries:
+		item_warehouses = get_item_warehouses_of_repost(row)
+
+		if row.status == "Queued" and item_warehouses:
+			absorbed_by = get_absorbing_repost(row, item_warehouses, earliest_repost)
+			if absorbed_by:
+				frappe.db.set_value("Repost Item Valuation", row.name, {
+					"status": "Skipped",
+					"coalesced_into": absorbed_by
+				})
+				continue
+
+		if row.status == "Queued":
+			# partially completed reposts may have moved past these item-warehouses already
+			for key in item_warehouses:
+				earliest_repost.setdefault(key, row)
+
+		to_repost.append(row)
+
+	return to_repost
+
+def get_item_warehouses_of_repost(row):
+	if row.based_on == "Transaction":
+		sles = frappe.get_all("Stock Ledger Entry",
+			filters={"voucher_type": row.voucher_type, "voucher_no": row.voucher_no},
+			fields=["item_code", "warehouse"], distinct=True)
+
+		return {(d.item_code, d.warehouse) for d in sles}
+
+	return {(row.item_code, row.warehouse)}
+
+def get_absorbing_repost(row, item_warehouses, earliest_repost):
+	"""Return the name of the queued repost covering all `item_warehouses` of `row`, if any"""
+	timestamp = get_datetime(f"{row.posting_date} {row.posting_time}")
+	absorbed_by = None
+
+	for key in item_warehouses:
+		earlier = earliest_repost.get(key)
+		if (not earlier
+			or cint(earlier.via_landed_cost_voucher) != cint(row.via_landed_cost_voucher)
+			or get_datetime(f"{earlier.posting_date} {earlier.posting_time}") > timestamp):
+			return
+
+		absorbed_by = absorbed_by or earlier.name
+
+	return absorbed_by
+
+def enqueue_independent_repost_groups(riv_entries):
+	"""
+		Enqueue one job per group of reposts which don't share any item,
+		so that independent groups are reposted by different workers at the same time.
+
+		Groups from the previous run must finish before new groups are enqueued,
+		otherwise reposts of the same item could run concurrently.
+	"""
+	if get_repost_group_jobs():
+		return
+
+	groups = get_independent_repost_groups(riv_entries)
+	run_id = frappe.generate_hash(length=10)
+
+	for idx, group in enumerate(groups):
+		frappe.enqueue(repost_group, queue="long", timeout=3600,
+			job_name=f"repost_sle_group_{idx}_{group[0]}", riv_names=group,
+			run_id=run_id, total_groups=len(groups))
+
+def get_repost_group_jobs():
+	"""Queued and running jobs of `repost_group` on this site"""
+	site_jobs = get_jobs(site=frappe.local.site, queue="long", key="job_name").get(frappe.local.site) or []
+	return [job_name for job_name in site_jobs if str(job_name).startswith("repost_sle_group")]
+
+def get_independent_repost_groups(riv_entries):
+	"""
+		Split reposts into groups which can be processed in parallel.
+
+		Two reposts are placed in the same group when they affect a common item,
+		either directly or through `dependant_sle_voucher_detail_no` links
+		(transfers, repacks, manufacture), or when the GL entries of a common voucher are
+		reposted by both, e.g. a voucher with items of both reposts.
+		Within a group the original posting order is kept.
+
+		:returns: list of lists of Repost Item Valuation names
+	"""
+	parent = {}
+
+	def find(name):
+		while parent[name] != name:
+			parent[name] = parent[parent[name]]
+			name = parent[name]
+		return name
+
+	owner = {}
+	for row in riv_entries:
+		parent.setdefault(row.name, row.name)
+
+		items = get_items_affected_by_repost(row)
+		vouchers = get_vouchers_affected_by_repost(row, items)
+
+		for key in [("Item", item_code) for item_code in items] + list(vouchers):
+			if key in owner:
+				parent[find(row.name)] = find(owner[key])
+			else:
+				owner[key] = row.name
+
+	groups = {}
+	for row in riv_entries:
+		groups.setdefault(find(row.name), []).append(row.name)
+
+	return list(groups.values())
+
+def get_items_affected_by_repost(row):
+	if row.based_on == "Transaction":
+		items = set(frappe.get_all("Stock Ledger Entry",
+			filters={"voucher_type": row.voucher_type, "voucher_no": row.voucher_no},
+			pluck="item_code", distinct=True))
+	else:
+		items = {row.item_code}
+
+	if row.distinct_item_and_warehouse:
+		# item-warehouses discovered by a partially completed repost
+		for key in json.loads(row.distinct_item_and_warehouse):
+			items.add(frappe.safe_eval(key)[0])
+
+	return get_items_linked_by_dependant_sle(items, row.posting_date)
+
+def get_vouchers_affected_by_repost(row, items):
+	"""(voucher_type, voucher_no) of the vouchers whose GL entries are reposted for `items`"""
+	vouchers = set()
+	if row.based_on == "Transaction":
+		vouchers.add((row.voucher_type, row.voucher_no))
+
+	if items:
+		vouchers.update(tuple(d) for d in frappe.db.sql("""
+			select distinct voucher_type, voucher_no
+			from `tabStock Ledger Entry`
+			where
+				item_code in %(items)s
+				and posting_date >= %(posting_date)s
+				and is_cancelled = 0
+		""", {"items": tuple(items), "posting_date": row.posting_date or "1900-01-01"}))
+
+	return vouchers
+
+def get_items_linked_by_dependant_sle(items, posting_date):
+	"""Expand `items` with the items whose SLEs depend on SLEs of `items` after `posting_date`."""
+	items = set(filter(None, items))
+	new_items = set(items)
+
+	while new_items:
+		dependant_items = frappe.db.sql_list("""
+			select distinct dependant.item_code
+			from `tabStock Ledger Entry` sle
+				inner join `tabStock Ledger Entry` dependant
+					on dependant.voucher_detail_no = sle.dependant_sle_voucher_detail_no
+			where
+				sle.item_code in %(items)s
+				and sle.posting_date >= %(posting_date)s
+				and sle.is_cancelled = 0
+				and sle.dependant_sle_voucher_detail_no != ''
+				and dependant.is_cancelled = 0
+		""", {"items": tuple(new_items), "posting_date": posting_date or "1900-01-01"})
+
+		new_items = set(dependant_items) - items
+		items |= new_items
+
+	return items
+
 def get_repost_item_valuation_entries():
-	return frappe.db.sql(""" SELECT name from `tabRepost Item Valuation`
+	return frappe.db.sql(""" SELECT name, status, based_on, item_code, warehouse, voucher_type, voucher_no,
+			posting_date, posting_time, via_landed_cost_voucher, distinct_item_and_warehouse
+		from `tabRepost Item Valuation`
 		WHERE status in ('Queued', 'In Progress') and creation <= %s and docstatus = 1
 		ORDER BY timestamp(posting_date, posting_time) asc, creation asc
 	""", now(), as_dict=1)
@@ -2,14 +2,21 @@
 # See license.txt
 
 import unittest
+from unittest.mock import patch
 
 import frappe
 from frappe.utils import nowdate
 
 from erpnext.controllers.stock_controller import create_item_wise_repost_entries
 from erpnext.stock.doctype.purchase_receipt.test_purchase_receipt import make_purchase_receipt
+from erpnext.stock.doctype.repost_item_valuation import repost_item_valuation
 from erpnext.stock.doctype.repost_item_valuation.repost_item_valuation import (
+	coalesce_queued_reposts,
+	enqueue_independent_repost_groups,
+	get_independent_repost_groups,
+	get_repost_item_valuation_entries,
 	in_configured_timeslot,
+	repost_group,
 )
 from erpnext.stock.utils import PendingRepostingError
 
@@ -162,3 +169,128 @@ class TestRepostItemValuation(unittest.TestCase):
 		self.assertRaises(PendingRepostingError, stock_settings.save)
 
 		riv.set_status("Skipped")
+
+	def test_independent_repost_groups(self):
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		item_1 = make_item("_Test Independent Repost Item 1", {"is_stock_item": 1}).name
+		item_2 = make_item("_Test Independent Repost Item 2", {"is_stock_item": 1}).name
+
+		riv_entries = [
+			frappe._dict(name="RIV-1", based_on="Item and Warehouse", item_code=item_1,
+				warehouse="_Test Warehouse - _TC", posting_date="2021-01-01"),
+			frappe._dict(name="RIV-2", based_on="Item and Warehouse", item_code=item_2,
+				warehouse="_Test Warehouse - _TC", posting_date="2021-01-01"),
+			frappe._dict(name="RIV-3", based_on="Item and Warehouse", item_code=item_1,
+				warehouse="Stores - _TC", posting_date="2021-01-02"),
+		]
+
+		# reposts of the same item stay in one group, in posting order
+		self.assertEqual(get_independent_repost_groups(riv_entries), [["RIV-1", "RIV-3"], ["RIV-2"]])
+
+	def test_repost_groups_with_common_voucher(self):
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		item_1 = make_item("_Test Common Voucher Repost Item 1", {"is_stock_item": 1}).name
+		item_2 = make_item("_Test Common Voucher Repost Item 2", {"is_stock_item": 1}).name
+
+		# GL entries of this voucher are reposted by reposts of both items
+		frappe.get_doc({
+			"doctype": "Stock Entry",
+			"stock_entry_type": "Material Receipt",
+			"company": "_Test Company",
+			"items": [
+				{"item_code": item_code, "qty": 1, "basic_rate": 100, "t_warehouse": "_Test Warehouse - _TC"}
+				for item_code in (item_1, item_2)
+			]
+		}).submit()
+
+		riv_entries = [
+			frappe._dict(name="RIV-1", based_on="Item and Warehouse", item_code=item_1,
+				warehouse="_Test Warehouse - _TC", posting_date="2021-01-01"),
+			frappe._dict(name="RIV-2", based_on="Item and Warehouse", item_code=item_2,
+				warehouse="_Test Warehouse - _TC", posting_date="2021-01-01"),
+		]
+
+		self.assertEqual(get_independent_repost_groups(riv_entries), [["RIV-1", "RIV-2"]])
+
+	def test_enqueue_independent_repost_groups(self):
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		rivs = []
+		for idx in range(2):
+			riv = frappe.get_doc(
+				doctype="Repost Item Valuation",
+				item_code=make_item("_Test Parallel Repost Item {0}".format(idx), {"is_stock_item": 1}).name,
+				warehouse="_Test Warehouse - _TC",
+				based_on="Item and Warehouse",
+				posting_date="2021-01-01",
+				posting_time="00:01:00",
+			)
+			riv.flags.dont_run_in_test = True
+			riv.submit()
+			rivs.append(riv)
+
+		with patch.object(frappe, "enqueue") as enqueue:
+			enqueue_independent_repost_groups(rivs)
+
+		jobs = [call.kwargs for call in enqueue.call_args_list]
+		self.assertEqual([job["riv_names"] for job in jobs], [[rivs[0].name], [rivs[1].name]])
+
+		for riv in rivs:
+			riv.set_status("Skipped")
+
+		# stock and account balances are checked once, after the last group
+		with patch.object(repost_item_valuation, "check_stock_and_account_balances") as check:
+			repost_group(jobs[0]["riv_names"], run_id=jobs[0]["run_id"], total_groups=jobs[0]["total_groups"])
+			check.assert_not_called()
+
+			repost_group(jobs[1]["riv_names"], run_id=jobs[1]["run_id"], total_groups=jobs[1]["total_groups"])
+			check.assert_called_once()
+
+	def test_balances_checked_after_killed_repost_group(self):
+		# the balances are checked by the next run once no group is queued or running
+		with patch.object(frappe.db, "get_single_value", return_value=1), \
+			patch.object(repost_item_valuation, "in_configured_timeslot", return_value=True), \
+			patch.object(repost_item_valuation, "get_repost_item_valuation_entries", return_value=[]), \
+			patch.object(repost_item_valuation, "check_stock_and_account_balances") as check:
+
+			with patch.object(repost_item_valuation, "get_repost_group_jobs", return_value=["repost_sle_group_0_x"]):
+				repost_item_valuation.repost_entries()
+				check.assert_not_called()
+
+			with patch.object(repost_item_valuation, "get_repost_group_jobs", return_value=[]):
+				repost_item_valuation.repost_entries()
+				check.assert_called_once()
+
+	def test_coalesce_queued_reposts(self):
+		riv_args = frappe._dict(
+			doctype="Repost Item Valuation",
+			item_code="_Test Item",
+			warehouse="_Test Warehouse - _TC",
+			based_on="Item and Warehouse",
+			posting_date="2021-02-02",
+			posting_time="00:01:00",
+		)
+
+		rivs = []
+		for posting_date, warehouse in (("2021-02-01", "_Test Warehouse - _TC"),
+			("2021-02-03", "_Test Warehouse - _TC"), ("2021-02-03", "Stores - _TC")):
+			riv = frappe.get_doc(riv_args.copy().update({"posting_date": posting_date, "warehouse": warehouse}))
+			riv.flags.dont_run_in_test = True
+			riv.submit()
+			rivs.append(riv)
+
+		# only the reposts of this test, other queued reposts must not be changed
+		riv_names = {riv.name for riv in rivs}
+		riv_entries = coalesce_queued_reposts([d for d in get_repost_item_valuation_entries()
+			if d.name in riv_names])
+		self.assertEqual([d.name for d in riv_entries], [rivs[0].name, rivs[2].name])
+
+		# later repost of the same item-warehouse is absorbed by the earlier one
+		rivs[1].load_from_db()
+		self.assertEqual(rivs[1].status, "Skipped")
+		self.assertEqual(rivs[1].coalesced_into, rivs[0].name)
+
+		for riv in (rivs[0], rivs[2]):
+			riv.set_status("Skipped")
@@ -0,0 +1,193 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import (
+	add_days,
+	add_months,
+	cstr,
+	flt,
+	get_first_day,
+	get_last_day,
+	getdate,
+	now,
+	today,
+)
+
+# cached end date of the latest snapshot, checked on every stock posting
+LAST_SNAPSHOT_DATE_KEY = "stock_balance_snapshot_date"
+NO_SNAPSHOT_DATE = "0001-01-01"
+
+# last month end of the running snapshot job, and the posting dates of the backdated
+# entries posted while it runs
+SNAPSHOT_RUN_KEY = "stock_balance_snapshot_run"
+SNAPSHOT_RUN_POSTING_DATES_KEY = "stock_balance_snapshot_run_posting_dates"
+SNAPSHOT_RUN_EXPIRY = 24 * 60 * 60
+
+
+class StockBalanceSnapshot(Document):
+	pass
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Balance Snapshot", ["period_end_date", "item_code"])
+
+def create_stock_balance_snapshots():
+	"""
+		Scheduled job: add the snapshots of all closed months after the latest snapshot.
+
+		Stock Ledger Entries are replayed one month at a time from the latest snapshot, the same way
+		the Stock Balance report replays them, and the balance of every item, warehouse and batch
+		is stored at each month end.
+
+		Each month is committed on its own. Entries posted while the job runs, on or before the last
+		month end, are recorded by `invalidate_stock_balance_snapshot`; after each month the snapshots
+		from their posting date are removed and the job stops, the next run recreates them.
+	"""
+	last_period_end = get_last_day(add_months(today(), -1))
+
+	latest_snapshot_date = get_last_snapshot_date()
+	if latest_snapshot_date:
+		period_start = add_days(latest_snapshot_date, 1)
+	else:
+		first_posting_date = frappe.db.sql("""
+			select min(posting_date) from `tabStock Ledger Entry`
+			where is_cancelled = 0 and docstatus < 2
+		""")[0][0]
+
+		if not first_posting_date:
+			return
+
+		period_start = get_first_day(first_posting_date)
+
+	if period_start > last_period_end:
+		return
+
+	balances = (get_snapshot_balances(latest_snapshot_date) if latest_snapshot_date
+		else frappe._dict(qty_and_value={}, valuation_rate={}))
+
+	cache = frappe.cache()
+	cache.delete_value(SNAPSHOT_RUN_POSTING_DATES_KEY)
+	cache.set_value(SNAPSHOT_RUN_KEY, cstr(last_period_end), expires_in_sec=SNAPSHOT_RUN_EXPIRY)
+
+	try:
+		while period_start <= last_period_end:
+			period_end = get_last_day(period_start)
+			add_stock_ledger_entries_to_balances(balances, period_start, period_end)
+			insert_snapshot(balances, period_end)
+
+			if not frappe.flags.in_test:
+				frappe.db.commit()
+			cache.delete_value(LAST_SNAPSHOT_DATE_KEY)
+
+			if remove_snapshots_posted_during_run():
+				return
+
+			period_start = add_days(period_end, 1)
+	finally:
+		cache.delete_value([SNAPSHOT_RUN_KEY, SNAPSHOT_RUN_POSTING_DATES_KEY])
+
+def remove_snapshots_posted_during_run():
+	"""Remove the snapshots from the earliest posting date recorded during the run, if any"""
+	posting_dates = frappe.cache().lrange(SNAPSHOT_RUN_POSTING_DATES_KEY, 0, -1)
+	if not posting_dates:
+		return False
+
+	posting_date = min(getdate(frappe.safe_decode(d)) for d in posting_dates)
+	frappe.db.sql("delete from `tabStock Balance Snapshot` where period_end_date >= %s", posting_date)
+	if not frappe.flags.in_test:
+		frappe.db.commit()
+	frappe.cache().delete_value(LAST_SNAPSHOT_DATE_KEY)
+
+	return True
+
+def get_snapshot_balances(period_end_date):
+	"""
+		Returns qty and value per (company, item, warehouse, batch)
+		and valuation rate per (company, item, warehouse)
+	"""
+	balances = frappe._dict(qty_and_value={}, valuation_rate={})
+	for d in frappe.db.sql("""
+		select company, item_code, warehouse, batch_no, qty_after_transaction, stock_value, valuation_rate
+		from `tabStock Balance Snapshot`
+		where period_end_date = %s
+	""", period_end_date, as_dict=1):
+		balances.qty_and_value[(d.company, d.item_code, d.warehouse, cstr(d.batch_no))] = [
+			flt(d.qty_after_transaction), flt(d.stock_value)]
+		balances.valuation_rate[(d.company, d.item_code, d.warehouse)] = flt(d.valuation_rate)
+
+	return balances
+
+def add_stock_ledger_entries_to_balances(balances, from_date, to_date):
+	# qty per item and warehouse, reconciliations without batch set the total of all batches
+	item_warehouse_qty = {}
+	for (company, item_code, warehouse, batch_no), balance in balances.qty_and_value.items():
+		key = (company, item_code, warehouse)
+		item_warehouse_qty[key] = item_warehouse_qty.get(key, 0.0) + balance[0]
+
+	for d in frappe.db.sql("""
+		select
+			company, item_code, warehouse, batch_no, voucher_type, actual_qty,
+			qty_after_transaction, stock_value_difference, valuation_rate
+		from `tabStock Ledger Entry`
+		where posting_date between %s and %s
+			and docstatus < 2 and is_cancelled = 0
+		order by posting_date, posting_time, creation, actual_qty
+	""", (from_date, to_date), as_dict=1):
+		item_warehouse = (d.company, d.item_code, d.warehouse)
+
+		if d.voucher_type == "Stock Reconciliation" and not d.batch_no:
+			qty_diff = flt(d.qty_after_transaction) - item_warehouse_qty.get(item_warehouse, 0.0)
+		else:
+			qty_diff = flt(d.actual_qty)
+
+		balance = balances.qty_and_value.setdefault(item_warehouse + (cstr(d.batch_no),), [0.0, 0.0])
+		balance[0] += qty_diff
+		balance[1] += flt(d.stock_value_difference)
+		item_warehouse_qty[item_warehouse] = item_warehouse_qty.get(item_warehouse, 0.0) + qty_diff
+		balances.valuation_rate[item_warehouse] = flt(d.valuation_rate)
+
+def insert_snapshot(balances, period_end_date):
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus", "company", "item_code",
+		"warehouse", "batch_no", "period_end_date", "qty_after_transaction", "stock_value", "valuation_rate"]
+
+	timestamp = now()
+	values = []
+	for (company, item_code, warehouse, batch_no), (qty, value) in balances.qty_and_value.items():
+		if not (flt(qty, 9) or flt(value, 9)):
+			continue
+
+		values.append((frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator",
+			0, company, item_code, warehouse, batch_no or None, period_end_date, qty, value,
+			balances.valuation_rate.get((company, item_code, warehouse), 0.0)))
+
+	frappe.db.bulk_insert("Stock Balance Snapshot", fields, values)
+
+def get_last_snapshot_date():
+	last_date = frappe.cache().get_value(LAST_SNAPSHOT_DATE_KEY, generator=lambda: cstr(
+		frappe.db.sql("select max(period_end_date) from `tabStock Balance Snapshot`")[0][0] or NO_SNAPSHOT_DATE))
+
+	return getdate(last_date) if last_date != NO_SNAPSHOT_DATE else None
+
+def get_snapshot_date_before(date):
+	"""End date of the latest snapshot before `date`"""
+	last_date = get_last_snapshot_date()
+	if not last_date:
+		return
+
+	return frappe.db.sql("""
+		select max(period_end_date) from `tabStock Balance Snapshot`
+		where period_end_date < %s
+	""", date)[0][0]
+
+def invalidate_stock_balance_snapshot(posting_date):
+	"""Remove the snapshots affected by a (re)posting on `posting_date`, they are recreated by the scheduled job"""
+	run_until = frappe.cache().get_value(SNAPSHOT_RUN_KEY)
+	if run_until and getdate(posting_date) <= getdate(run_until):
+		# the running job may have read the month before this entry is committed
+		frappe.cache().rpush(SNAPSHOT_RUN_POSTING_DATES_KEY, cstr(posting_date))
+
+	last_date = get_last_snapshot_date()
+	if last_date and getdate(posting_date) <= last_date:
+		frappe.db.sql("delete from `tabStock Balance Snapshot` where period_end_date >= %s", posting_date)
+		frappe.cache().delete_value(LAST_SNAPSHOT_DATE_KEY)
@@ -0,0 +1,71 @@
+# Copyright (c) 2022, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, add_months, get_first_day, nowdate
+
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_balance_snapshot import stock_balance_snapshot
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import (
+	create_stock_balance_snapshots,
+	get_last_snapshot_date,
+	invalidate_stock_balance_snapshot,
+)
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.report.stock_balance.stock_balance import execute
+
+
+class TestStockBalanceSnapshot(FrappeTestCase):
+	def setUp(self):
+		frappe.db.delete("Stock Balance Snapshot")
+		frappe.cache().delete_value("stock_balance_snapshot_date")
+
+	def test_stock_balance_from_snapshot(self):
+		item_code = make_item("_Test Snapshot Item", {"is_stock_item": 1}).name
+		warehouse = "_Test Warehouse - _TC"
+		month_start = get_first_day(nowdate())
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, rate=100,
+			posting_date=add_months(month_start, -2))
+		make_stock_entry(item_code=item_code, source=warehouse, qty=4,
+			posting_date=add_days(add_months(month_start, -1), 3))
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, rate=120, posting_date=nowdate())
+
+		filters = frappe._dict(company="_Test Company", item_code=item_code,
+			from_date=month_start, to_date=nowdate())
+
+		expected = execute(filters.copy())[1]
+
+		create_stock_balance_snapshots()
+		self.assertEqual(get_last_snapshot_date(), add_days(month_start, -1))
+		self.assertEqual(execute(filters.copy())[1], expected)
+
+		# backdated entries remove the snapshots after them
+		make_stock_entry(item_code=item_code, target=warehouse, qty=1, rate=100,
+			posting_date=add_days(add_months(month_start, -1), 5))
+		self.assertEqual(get_last_snapshot_date(), add_days(add_months(month_start, -1), -1))
+
+	def test_entry_posted_during_snapshot_run(self):
+		item_code = make_item("_Test Snapshot Item", {"is_stock_item": 1}).name
+		month_start = get_first_day(nowdate())
+		posting_date = add_months(month_start, -2)
+
+		make_stock_entry(item_code=item_code, target="_Test Warehouse - _TC", qty=10, rate=100,
+			posting_date=posting_date)
+
+		add_entries = stock_balance_snapshot.add_stock_ledger_entries_to_balances
+
+		def add_entries_and_post(balances, from_date, to_date):
+			add_entries(balances, from_date, to_date)
+			# a backdated entry posted by another transaction after the job read the month
+			invalidate_stock_balance_snapshot(posting_date)
+
+		with patch.object(stock_balance_snapshot, "add_stock_ledger_entries_to_balances",
+			side_effect=add_entries_and_post):
+			create_stock_balance_snapshots()
+
+		self.assertFalse(frappe.db.exists("Stock Balance Snapshot", {"period_end_date": (">=", posting_date)}))
+		self.assertIsNone(frappe.cache().get_value(stock_balance_snapshot.SNAPSHOT_RUN_KEY))
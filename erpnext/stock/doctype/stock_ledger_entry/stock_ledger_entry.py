@@ -12,6 +12,9 @@ from frappe.utils import add_days, cint, formatdate, get_datetime, getdate
 
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.controllers.item_variant import ItemTemplateCannotHaveStock
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import (
+	invalidate_stock_balance_snapshot,
+)
 
 
 class StockFreezeError(frappe.ValidationError): pass
@@ -44,6 +47,7 @@ class StockLedgerEntry(Document):
 	def on_submit(self):
 		self.check_stock_frozen_date()
 		self.calculate_batch_qty()
+		invalidate_stock_balance_snapshot(self.posting_date)
 
 		if not self.get("via_landed_cost_voucher"):
 			from erpnext.stock.doctype.serial_no.serial_no import process_serial_no
@@ -3,6 +3,7 @@
 
 import json
 from operator import itemgetter
+from unittest.mock import patch
 from uuid import uuid4
 
 import frappe
@@ -739,6 +740,29 @@ class TestStockLedgerEntry(FrappeTestCase):
 			{"incoming_rate": sum(rates) * 10}
 		], sle_filters={"item_code": packed.name})
 
+	def test_backdated_repost_with_bulk_sle_updates(self):
+		item_code = make_item("_TestBulkRepostItem" + get_unique_suffix(),
+			{"valuation_method": "FIFO"}).name
+		warehouse = "_Test Warehouse - _TC"
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=100, rate=10,
+			posting_date=add_days(today(), -10))
+
+		issues = [make_stock_entry(item_code=item_code, source=warehouse, qty=5,
+			posting_date=add_days(today(), -5)) for _ in range(7)]
+
+		# flush every 3 rows so that the chain is written back across several batches
+		with patch("erpnext.stock.stock_ledger.SLE_BULK_UPDATE_BATCH_SIZE", 3):
+			make_stock_entry(item_code=item_code, target=warehouse, qty=10, rate=20,
+				posting_date=add_days(today(), -8))
+
+		for idx, issue in enumerate(issues, start=1):
+			self.assertSLEs(issue, [{
+				"qty_after_transaction": 110 - 5 * idx,
+				"stock_value": (100 - 5 * idx) * 10 + 10 * 20,
+				"stock_value_difference": -50,
+			}])
+
 
 def create_repack_entry(**args):
 	args = frappe._dict(args)
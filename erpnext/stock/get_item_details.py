@@ -123,6 +123,79 @@ def get_item_details(args, doc=None, for_validate=False, overwrite_warehouse=Tru
 	out = remove_standard_fields(out)
 	return out
 
+@frappe.whitelist()
+def get_items_details(args_list, doc=None, for_validate=False, overwrite_warehouse=True):
+	"""
+		Returns the item details of many rows of one document, in the order of `args_list`.
+
+		All rows share one context: the parent document is loaded once, Item Price and Bin rows
+		of all items are fetched together, and price list details, item tax maps and the
+		pricing rule set are resolved once per document.
+
+		:param args_list: list of `args` of `get_item_details`
+	"""
+	from erpnext.accounts.doctype.pricing_rule.utils import (
+		end_pricing_rule_batch,
+		start_pricing_rule_batch,
+	)
+
+	args_list = [process_args(args) for args in process_string_args(args_list)]
+
+	if isinstance(doc, str):
+		doc = json.loads(doc)
+
+	if doc:
+		doc = frappe.get_doc(doc)
+
+	start_item_details_batch(args_list)
+	start_pricing_rule_batch()
+	try:
+		return [get_item_details(args, doc, for_validate=for_validate,
+			overwrite_warehouse=overwrite_warehouse) for args in args_list]
+	finally:
+		end_pricing_rule_batch()
+		end_item_details_batch()
+
+def start_item_details_batch(args_list):
+	"""Prefetch Item Price and Bin rows of all items in `args_list`, used until `end_item_details_batch`"""
+	item_codes = list(set(args.item_code for args in args_list if args.item_code))
+	price_lists = list(set(args.price_list for args in args_list if args.price_list))
+
+	batch = frappe._dict(item_codes=set(item_codes), price_lists=set(price_lists),
+		item_prices={}, bins={}, cache={})
+
+	if item_codes:
+		variants = frappe.get_all("Item", filters={"name": ("in", item_codes), "variant_of": ("is", "set")},
+			pluck="variant_of")
+		batch.item_codes.update(variants)
+
+		for d in frappe.get_all("Bin", filters={"item_code": ("in", item_codes)},
+			fields=["item_code", "warehouse", "projected_qty", "actual_qty", "reserved_qty"]):
+			batch.bins[(d.item_code, d.warehouse)] = d
+
+	if batch.item_codes and price_lists:
+		for d in frappe.get_all("Item Price",
+			filters={"item_code": ("in", list(batch.item_codes)), "price_list": ("in", price_lists)},
+			fields=["name", "item_code", "price_list", "price_list_rate", "uom", "batch_no",
+				"customer", "supplier", "valid_from", "valid_upto"]):
+			batch.item_prices.setdefault((d.item_code, d.price_list), []).append(d)
+
+	frappe.flags.item_details_batch = batch
+
+def end_item_details_batch():
+	frappe.flags.item_details_batch = None
+
+def get_item_details_batch_value(key, method, *args):
+	"""Returns `method(*args)`, computed once per `key` within an item details batch"""
+	batch = frappe.flags.item_details_batch
+	if not batch:
+		return method(*args)
+
+	if key not in batch.cache:
+		batch.cache[key] = method(*args)
+
+	return batch.cache[key]
+
 def remove_standard_fields(details):
 	for key in child_table_fields + default_fields:
 		details.pop(key, None)
@@ -566,6 +639,13 @@ def is_within_valid_range(args, tax):
 
 @frappe.whitelist()
 def get_item_tax_map(company, item_tax_template, as_json=True):
+	if as_json and frappe.flags.item_details_batch:
+		return get_item_details_batch_value(("item_tax_map", company, item_tax_template),
+			_get_item_tax_map, company, item_tax_template, as_json)
+
+	return _get_item_tax_map(company, item_tax_template, as_json)
+
+def _get_item_tax_map(company, item_tax_template, as_json=True):
 	item_tax_map = {}
 	if item_tax_template:
 		template = frappe.get_cached_doc("Item Tax Template", item_tax_template)
@@ -744,6 +824,10 @@ def get_item_price(args, item_code, ignore_party=False):
 
 	args['item_code'] = item_code
 
+	batch = frappe.flags.item_details_batch
+	if batch and item_code in batch.item_codes and args.get("price_list") in batch.price_lists:
+		return get_item_price_from_batch(batch, args, ignore_party)
+
 	conditions = """where item_code=%(item_code)s
 		and price_list=%(price_list)s
 		and ifnull(uom, '') in ('', %(uom)s)"""
@@ -770,6 +854,37 @@ def get_item_price(args, item_code, ignore_party=False):
 		from `tabItem Price` {conditions}
 		order by valid_from desc, batch_no desc, uom desc """.format(conditions=conditions), args)
 
+def get_item_price_from_batch(batch, args, ignore_party=False):
+	"""Same as the query in `get_item_price`, on the Item Prices prefetched for the batch"""
+	def is_valid_on(item_price, date):
+		date = getdate(date)
+		return ((not item_price.valid_from or getdate(item_price.valid_from) <= date)
+			and (not item_price.valid_upto or getdate(item_price.valid_upto) >= date))
+
+	item_prices = []
+	for d in batch.item_prices.get((args.get("item_code"), args.get("price_list")), []):
+		if cstr(d.uom) not in ('', cstr(args.get("uom"))) or cstr(d.batch_no) not in ('', cstr(args.get("batch_no"))):
+			continue
+
+		if not ignore_party:
+			if args.get("customer"):
+				if d.customer != args.get("customer"): continue
+			elif args.get("supplier"):
+				if d.supplier != args.get("supplier"): continue
+			elif d.customer or d.supplier:
+				continue
+
+		if ((args.get("transaction_date") and not is_valid_on(d, args.get("transaction_date")))
+			or (args.get("posting_date") and not is_valid_on(d, args.get("posting_date")))):
+			continue
+
+		item_prices.append(d)
+
+	item_prices.sort(key=lambda d: (getdate(d.valid_from or "0001-01-01"), cstr(d.batch_no), cstr(d.uom)),
+		reverse=True)
+
+	return tuple((d.name, d.price_list_rate, d.uom) for d in item_prices)
+
 def get_price_list_rate_for(args, item_code):
 	"""
 		:param customer: link to Customer DocType
@@ -995,9 +1110,16 @@ def get_projected_qty(item_code, warehouse):
 
 @frappe.whitelist()
 def get_bin_details(item_code, warehouse, company=None):
-	bin_details = frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
-		["projected_qty", "actual_qty", "reserved_qty"], as_dict=True, cache=True) \
-			or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
+	batch = frappe.flags.item_details_batch
+	if batch and item_code in batch.item_codes:
+		bin_details = batch.bins.get((item_code, warehouse))
+		bin_details = (frappe._dict({"projected_qty": bin_details.projected_qty, "actual_qty": bin_details.actual_qty,
+			"reserved_qty": bin_details.reserved_qty}) if bin_details
+			else {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0})
+	else:
+		bin_details = frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
+			["projected_qty", "actual_qty", "reserved_qty"], as_dict=True, cache=True) \
+				or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
 	if company:
 		bin_details['company_total_stock'] = get_company_total_stock(item_code, company)
 	return bin_details
@@ -1133,8 +1255,10 @@ def get_price_list_currency_and_exchange_rate(args):
 	if (not plc_conversion_rate) or (price_list_currency and args.price_list_currency \
 		and price_list_currency != args.price_list_currency):
 			# cksgb 19/09/2016: added args.transaction_date as posting_date argument for get_exchange_rate
-			plc_conversion_rate = get_exchange_rate(price_list_currency, company_currency,
-				args.transaction_date, args.exchange_rate) or plc_conversion_rate
+			plc_conversion_rate = get_item_details_batch_value(
+				("exchange_rate", price_list_currency, company_currency, args.transaction_date, args.exchange_rate),
+				get_exchange_rate, price_list_currency, company_currency, args.transaction_date,
+				args.exchange_rate) or plc_conversion_rate
 
 	return frappe._dict({
 		"price_list_currency": price_list_currency,
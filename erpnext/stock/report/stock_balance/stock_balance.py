@@ -9,6 +9,9 @@ from frappe import _
 from frappe.utils import cint, date_diff, flt, getdate
 
 import erpnext
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import (
+	get_snapshot_date_before,
+)
 from erpnext.stock.report.stock_ageing.stock_ageing import FIFOSlots, get_average_age
 from erpnext.stock.report.stock_ledger.stock_ledger import get_item_group_condition
 from erpnext.stock.utils import add_additional_uom_columns, is_reposting_item_valuation_in_progress
@@ -28,18 +31,25 @@ def execute(filters=None):
 	include_uom = filters.get("include_uom")
 	columns = get_columns(filters)
 	items = get_items(filters)
-	sle = get_stock_ledger_entries(filters, items)
+
+	# start from the latest month end snapshot before from date, stock ageing needs all entries
+	snapshot_date = None
+	if not filters.get('show_stock_ageing_data'):
+		snapshot_date = get_snapshot_date_before(filters.get('from_date'))
+
+	sle = get_stock_ledger_entries(filters, items, snapshot_date)
+	opening_balances = get_snapshot_balances(filters, items, snapshot_date) if snapshot_date else []
 
 	if filters.get('show_stock_ageing_data'):
 		filters['show_warehouse_wise_stock'] = True
 		item_wise_fifo_queue = FIFOSlots(filters, sle).generate()
 
 	# if no stock ledger entry found return
-	if not sle:
+	if not (sle or opening_balances):
 		return columns, []
 
-	iwb_map = get_item_warehouse_map(filters, sle)
-	item_map = get_item_details(items, sle, filters)
+	iwb_map = get_item_warehouse_map(filters, sle, opening_balances)
+	item_map = get_item_details(items, sle + opening_balances, filters)
 	item_reorder_detail_map = get_item_reorder_details(item_map.keys())
 
 	data = []
@@ -135,6 +145,11 @@ def get_conditions(filters):
 	else:
 		frappe.throw(_("'To Date' is required"))
 
+	return conditions + get_item_warehouse_conditions(filters)
+
+def get_item_warehouse_conditions(filters):
+	"""Company and warehouse conditions on `sle`, shared by Stock Ledger Entry and Stock Balance Snapshot"""
+	conditions = ""
 	if filters.get("company"):
 		conditions += " and sle.company = %s" % frappe.db.escape(filters.get("company"))
 
@@ -152,13 +167,12 @@ def get_conditions(filters):
 
 	return conditions
 
-def get_stock_ledger_entries(filters, items):
-	item_conditions_sql = ''
-	if items:
-		item_conditions_sql = ' and sle.item_code in ({})'\
-			.format(', '.join(frappe.db.escape(i, percent=False) for i in items))
+def get_stock_ledger_entries(filters, items, after_date=None):
+	item_conditions_sql = get_item_conditions(items)
 
 	conditions = get_conditions(filters)
+	if after_date:
+		conditions += " and sle.posting_date > %s" % frappe.db.escape(str(after_date))
 
 	return frappe.db.sql("""
 		select
@@ -172,13 +186,42 @@ def get_stock_ledger_entries(filters, items):
 		order by sle.posting_date, sle.posting_time, sle.creation, sle.actual_qty""" % #nosec
 		(item_conditions_sql, conditions), as_dict=1)
 
-def get_item_warehouse_map(filters, sle):
+def get_item_conditions(items):
+	if not items:
+		return ''
+
+	return ' and sle.item_code in ({})'.format(', '.join(frappe.db.escape(i, percent=False) for i in items))
+
+def get_snapshot_balances(filters, items, period_end_date):
+	"""Qty, value and valuation rate per item and warehouse at the end of the snapshot period"""
+	return frappe.db.sql("""
+		select
+			sle.company, sle.item_code, sle.warehouse,
+			sum(sle.qty_after_transaction) as qty_after_transaction,
+			sum(sle.stock_value) as stock_value, max(sle.valuation_rate) as valuation_rate
+		from
+			`tabStock Balance Snapshot` sle
+		where sle.period_end_date = %s %s %s
+		group by sle.company, sle.item_code, sle.warehouse""" % #nosec
+		(frappe.db.escape(str(period_end_date)), get_item_conditions(items), get_item_warehouse_conditions(filters)),
+		as_dict=1)
+
+def get_item_warehouse_map(filters, sle, opening_balances=None):
 	iwb_map = {}
 	from_date = getdate(filters.get("from_date"))
 	to_date = getdate(filters.get("to_date"))
 
 	float_precision = cint(frappe.db.get_default("float_precision")) or 3
 
+	for d in opening_balances or []:
+		iwb_map[(d.company, d.item_code, d.warehouse)] = frappe._dict({
+			"opening_qty": flt(d.qty_after_transaction), "opening_val": flt(d.stock_value),
+			"in_qty": 0.0, "in_val": 0.0,
+			"out_qty": 0.0, "out_val": 0.0,
+			"bal_qty": flt(d.qty_after_transaction), "bal_val": flt(d.stock_value),
+			"val_rate": flt(d.valuation_rate)
+		})
+
 	for d in sle:
 		key = (d.company, d.item_code, d.warehouse)
 		if key not in iwb_map:
@@ -13,7 +13,10 @@ from frappe.utils import cint, cstr, flt, get_link_to_form, getdate, now, nowdat
 from pypika import CustomFunction
 
 import erpnext
-from erpnext.stock.doctype.bin.bin import update_qty as update_bin_qty
+from erpnext.stock.doctype.bin.bin import update_qty_for_bins
+from erpnext.stock.doctype.stock_balance_snapshot.stock_balance_snapshot import (
+	invalidate_stock_balance_snapshot,
+)
 from erpnext.stock.utils import (
 	get_incoming_outgoing_rate_for_cancel,
 	get_or_make_bin,
@@ -26,6 +29,20 @@ class NegativeStockError(frappe.ValidationError): pass
 class SerialNoExistsInFutureTransaction(frappe.ValidationError):
 	pass
 
+# number of Stock Ledger Entries written back per bulk UPDATE while reposting
+SLE_BULK_UPDATE_BATCH_SIZE = 500
+
+# fields recomputed by `update_entries_after.process_sle`
+SLE_REPOST_FIELDS = (
+	"qty_after_transaction",
+	"valuation_rate",
+	"stock_value",
+	"stock_queue",
+	"stock_value_difference",
+	"incoming_rate",
+	"outgoing_rate",
+)
+
 
 def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_voucher=False):
 	""" Create SL entries from SL entry dicts
@@ -48,6 +65,8 @@ def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_vouc
 		args = get_args_for_future_sle(sl_entries[0])
 		future_sle_exists(args, sl_entries)
 
+		# bins are updated once per document, after all its entries are posted
+		bin_args = {}
 		for sle in sl_entries:
 			if sle.serial_no and not via_landed_cost_voucher:
 				validate_serial_no(sle)
@@ -78,10 +97,12 @@ def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_vouc
 			if is_stock_item:
 				bin_name = get_or_make_bin(args.get("item_code"), args.get("warehouse"))
 				repost_current_voucher(args, allow_negative_stock, via_landed_cost_voucher)
-				update_bin_qty(bin_name, args)
+				bin_args.setdefault(bin_name, []).append(args)
 			else:
 				frappe.msgprint(_("Item {0} ignored since it is not a stock item").format(args.get("item_code")))
 
+		update_qty_for_bins(bin_args)
+
 def repost_current_voucher(args, allow_negative_stock=False, via_landed_cost_voucher=False):
 	if args.get("actual_qty") or args.get("voucher_type") == "Stock Reconciliation":
 		if not args.get("posting_date"):
@@ -294,8 +315,13 @@ class update_entries_after(object):
 		self.new_items_found = False
 		self.distinct_item_warehouses = args.get("distinct_item_warehouses", frappe._dict())
 
+		# computed values of processed SLEs, written back in bulk by `flush_sle_updates`
+		self.pending_sle_updates = {}
+
 		self.data = frappe._dict()
 		self.initialize_previous_data(self.args)
+
+		invalidate_stock_balance_snapshot(self.args.posting_date)
 		self.build()
 
 	def get_precision(self):
@@ -359,6 +385,8 @@ class update_entries_after(object):
 
 			self.update_bin()
 
+		self.flush_sle_updates()
+
 		if self.exceptions:
 			self.raise_exceptions()
 
@@ -394,6 +422,7 @@ class update_entries_after(object):
 		return list(self.get_sle_after_datetime(args))
 
 	def get_dependent_entries_to_fix(self, entries_to_fix, sle):
+		self.flush_sle_updates()
 		dependant_sle = get_sle_by_voucher_detail_no(sle.dependant_sle_voucher_detail_no,
 			excluded_sle=sle.name)
 
@@ -489,12 +518,31 @@ class update_entries_after(object):
 		sle.stock_value = self.wh_data.stock_value
 		sle.stock_queue = json.dumps(self.wh_data.stock_queue)
 		sle.stock_value_difference = stock_value_difference
-		sle.doctype="Stock Ledger Entry"
-		frappe.get_doc(sle).db_update()
+		self.queue_sle_update(sle)
 
 		if not self.args.get("sle_id"):
 			self.update_outgoing_rate_on_transaction(sle)
 
+	def queue_sle_update(self, sle):
+		"""Hold the recomputed values of `sle` in memory until the next bulk write"""
+		self.pending_sle_updates[sle.name] = {field: sle.get(field) for field in SLE_REPOST_FIELDS}
+
+		if len(self.pending_sle_updates) >= SLE_BULK_UPDATE_BATCH_SIZE:
+			self.flush_sle_updates()
+
+	def flush_sle_updates(self):
+		"""
+			Write pending SLE values to the database.
+
+			Called before any step that reads Stock Ledger Entries back from the database
+			(transaction rates, fallback rates, batch and serial no rates, dependant entries),
+			so that those reads see the same values as with row-by-row updates.
+		"""
+		if not self.pending_sle_updates:
+			return
+
+		bulk_update_stock_ledger_entries(self.pending_sle_updates)
+		self.pending_sle_updates = {}
 
 	def validate_negative_stock(self, sle):
 		"""
@@ -514,6 +562,7 @@ class update_entries_after(object):
 	def get_dynamic_incoming_outgoing_rate(self, sle):
 		# Get updated incoming/outgoing rate from transaction
 		if sle.recalculate_rate:
+			self.flush_sle_updates()
 			rate = self.get_incoming_outgoing_rate_from_transaction(sle)
 
 			if flt(sle.actual_qty) >= 0:
@@ -567,10 +616,12 @@ class update_entries_after(object):
 			outgoing_rate = abs(flt(sle.stock_value_difference)) / abs(sle.actual_qty)
 
 			if flt(sle.actual_qty) < 0 and sle.voucher_type == "Stock Entry":
+				self.flush_sle_updates()
 				self.update_rate_on_stock_entry(sle, outgoing_rate)
 			elif sle.voucher_type in ("Delivery Note", "Sales Invoice"):
 				self.update_rate_on_delivery_and_sales_return(sle, outgoing_rate)
 			elif flt(sle.actual_qty) < 0 and sle.voucher_type in ("Purchase Receipt", "Purchase Invoice"):
+				self.flush_sle_updates()
 				self.update_rate_on_purchase_receipt(sle, outgoing_rate)
 
 	def update_rate_on_stock_entry(self, sle, outgoing_rate):
@@ -647,6 +698,8 @@ class update_entries_after(object):
 				self.wh_data.valuation_rate = self.get_fallback_rate(sle)
 
 	def get_incoming_value_for_serial_nos(self, sle, serial_nos):
+		self.flush_sle_updates()
+
 		# get rate from serial nos within same company
 		all_serial_nos = frappe.get_all("Serial No",
 			fields=["purchase_rate", "name", "company"],
@@ -760,6 +813,7 @@ class update_entries_after(object):
 		if actual_qty > 0:
 			stock_value_difference = incoming_rate * actual_qty
 		else:
+			self.flush_sle_updates()
 			outgoing_rate = get_batch_incoming_rate(item_code=sle.item_code,
 					warehouse=sle.warehouse, batch_no=sle.batch_no, posting_date=sle.posting_date,
 					posting_time=sle.posting_time, creation=sle.creation)
@@ -791,6 +845,7 @@ class update_entries_after(object):
 	def get_fallback_rate(self, sle) -> float:
 		"""When exact incoming rate isn't available use any of other "average" rates as fallback.
 			This should only get used for negative stock."""
+		self.flush_sle_updates()
 		return get_valuation_rate(sle.item_code, sle.warehouse,
 			sle.voucher_type, sle.voucher_no, self.allow_zero_rate,
 			currency=erpnext.get_company_currency(sle.company), company=sle.company, batch_no=sle.batch_no)
@@ -803,6 +858,7 @@ class update_entries_after(object):
 
 	def get_sle_after_datetime(self, args):
 		"""get Stock Ledger Entries after a particular datetime, for reposting"""
+		self.flush_sle_updates()
 		return get_stock_ledger_entries(args, ">", "asc", for_update=True, check_serial_no=False)
 
 	def raise_exceptions(self):
@@ -845,6 +901,37 @@ class update_entries_after(object):
 			})
 
 
+def bulk_update_stock_ledger_entries(sle_values, batch_size=SLE_BULK_UPDATE_BATCH_SIZE):
+	"""
+		Write reposted values back to Stock Ledger Entries using
+		one `update ... set field = case name when ...` statement per batch.
+
+		:param sle_values: dict of SLE name -> dict of field values
+	"""
+	names = list(sle_values)
+
+	for start in range(0, len(names), batch_size):
+		batch = names[start:start + batch_size]
+		set_clauses, values = [], []
+
+		for field in SLE_REPOST_FIELDS:
+			when_clauses = []
+			for name in batch:
+				when_clauses.append("when %s then %s")
+				values.extend([name, sle_values[name].get(field)])
+
+			set_clauses.append("`{0}` = case name {1} else `{0}` end".format(field, " ".join(when_clauses)))
+
+		values.extend(batch)
+		frappe.db.sql("""
+			update `tabStock Ledger Entry`
+			set {set_clauses}
+			where name in ({names})
+		""".format(
+			set_clauses=", ".join(set_clauses),
+			names=", ".join(["%s"] * len(batch))
+		), tuple(values))
+
 def get_previous_sle_of_current_voucher(args, exclude_current_voucher=False):
 	"""get stock ledger entries filtered by specific posting datetime conditions"""
 